@@ -0,0 +1,216 @@
+"""
+Typed response models and payload encoding
+JSON is encoded with orjson (the app's default response class). Clients that
+send Accept: application/msgpack get MessagePack instead, and layout=columnar
+turns lists of objects into one array per field. Nested objects become
+dotted columns (evidence.sample_size), so repeated keys are sent once.
+"""
+
+from datetime import date, datetime
+from typing import Any, Dict, Generic, List, Optional, TypeVar
+import msgpack
+import numpy as np
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import Receive, Scope, Send
+
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+LAYOUT_PATTERN = "^(rows|columnar)$"
+
+T = TypeVar('T')
+
+
+# Response models
+
+class PatternEvidence(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    sample_size: int
+
+
+class FrequencyPattern(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    pattern_type: str
+    category: Optional[str] = None
+    activity: Optional[str] = None
+    frequency_per_week: float
+    regularity_score: float
+    confidence: float
+    description: str
+    evidence: PatternEvidence
+
+
+class TimePattern(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    pattern_type: str
+    category: Optional[str] = None
+    activity: Optional[str] = None
+    peak_hour: int
+    concentration: float
+    confidence: float
+    description: str
+    evidence: PatternEvidence
+
+
+class SequencePattern(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    pattern_type: str
+    category: Optional[str] = None
+    activity: str
+    activities: List[str]
+    categories: List[Optional[str]]
+    support: int
+    confidence: float
+    avg_gap_minutes: int
+    description: str
+    evidence: PatternEvidence
+
+
+class PatternSet(BaseModel):
+    frequency_patterns: List[FrequencyPattern]
+    time_patterns: List[TimePattern]
+
+
+class EngagementScore(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    engagement_score: int
+    trend: str
+    risk_level: str
+    is_at_risk: bool
+    components: Dict[str, int]
+    stats: Dict[str, int]
+
+
+class DataResponse(BaseModel, Generic[T]):
+    success: bool
+    data: T
+
+
+class ListResponse(BaseModel, Generic[T]):
+    success: bool
+    data: List[T]
+    count: int
+
+
+# Encoding
+
+def _default(value: Any) -> Any:
+    """Fallback for types msgpack can't pack natively (orjson handles these itself)"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class MsgPackResponse(Response):
+    media_type = 'application/msgpack'
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def _accept_ranges(accept: str) -> Dict[str, float]:
+    """Media range -> q from an Accept header (first occurrence wins)"""
+    ranges: Dict[str, float] = {}
+    for part in accept.split(','):
+        media_type, *params = (piece.strip() for piece in part.split(';'))
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges.setdefault(media_type.lower(), q)
+    return ranges
+
+
+def wants_msgpack(request: Request) -> bool:
+    """
+    msgpack only when one of its exact types is accepted (q > 0) at least as
+    strongly as JSON; wildcards alone keep the JSON default
+    """
+    ranges = _accept_ranges(request.headers.get('accept', ''))
+    msgpack_q = max(ranges.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    json_q = max(ranges.get(media_type, 0.0) for media_type in ('application/json', 'application/*', '*/*'))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def _flatten(record: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def to_columnar(value: Any) -> Any:
+    """Every list of objects becomes {field: [values...]}; missing fields are None"""
+    if isinstance(value, dict):
+        return {key: to_columnar(item) for key, item in value.items()}
+    if not (isinstance(value, list) and value and all(isinstance(item, dict) for item in value)):
+        return value
+
+    size = len(value)
+    columns: Dict[str, List[Any]] = {}
+
+    def put(field: str, index: int, cell: Any) -> None:
+        column = columns.get(field)
+        if column is None:
+            column = columns[field] = [None] * size
+        column[index] = cell
+
+    for index, item in enumerate(value):
+        for key, cell in item.items():
+            if isinstance(cell, dict):
+                for field, nested in _flatten(cell, key + '.').items():
+                    put(field, index, nested)
+            else:
+                put(key, index, cell)
+    return columns
+
+
+def negotiate(request: Request, content: Dict[str, Any], layout: str = 'rows',
+              validate: bool = True) -> Any:
+    """
+    Default (JSON, row layout) returns content untouched so FastAPI applies
+    the route's response_model and the orjson default class. Columnar or
+    MessagePack requests get a finished Response, as do validate=False
+    routes (large batches skip the per-field model pass)
+    """
+    if layout == 'columnar':
+        content = {**content, 'layout': 'columnar', 'data': to_columnar(content.get('data'))}
+    if wants_msgpack(request):
+        return MsgPackResponse(content)
+    if layout == 'columnar' or not validate:
+        return ORJSONResponse(content)
+    return content
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """gzip for regular responses; the SSE stream is skipped so each event flushes immediately"""
+
+    def __init__(self, app, minimum_size: int = 500, compresslevel: int = 9,
+                 exclude_paths: tuple = ()) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'http' and scope['path'].endswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,125 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Security
+from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from datetime import date
+from typing import List, Optional
+import os
+from app.db.connection import get_db
+from app.services.anomaly_detector import MetricAnomalyDetector
+from app.services.result_cache import result_cache
+from app.auth import get_current_user, verify_user_access, is_service_request, security
+
+router = APIRouter()
+
+
+class MetricEvent(BaseModel):
+    user_id: str
+    metric_type: str
+    numeric_value: Optional[float] = None
+    metric_id: Optional[str] = None
+    category: Optional[str] = None
+    metric_date: Optional[date] = None
+
+
+class MetricIngestRequest(BaseModel):
+    metrics: List[MetricEvent]
+
+
+@router.post("/anomalies/ingest")
+async def ingest_metrics(
+    body: MetricIngestRequest,
+    request: Request,
+    x_service_token: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(security),
+    db: Session = Depends(get_db)
+):
+    """
+    Feed newly stored metrics into the streaming detector
+    Returns any anomalies flagged for them; metrics already folded in are
+    skipped, so retries are safe. Events with a metric_id are scored from
+    the stored row (400 if its user_id/metric_type differ)
+    Requires X-Service-Token (backend, any users) or the user's own token
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        if not is_service_request(x_service_token):
+            current_user = await get_current_user(request, credentials)
+            for user_id in {m.user_id for m in body.metrics}:
+                verify_user_access(current_user, user_id, is_dev)
+        
+        detector = MetricAnomalyDetector(db)
+        flagged = detector.ingest([m.model_dump() for m in body.metrics])
+        # New metrics change engagement and streaks: drop the cached results
+        for user_id in {m.user_id for m in body.metrics}:
+            result_cache.invalidate(user_id)
+        
+        return {
+            'success': True,
+            'data': flagged,
+            'count': len(flagged)
+        }
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/anomalies/rebuild")
+async def rebuild_anomaly_state(
+    user_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Recompute anomaly state and history from all stored metrics
+    Without user_id rebuilds every series (development mode only)
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        if user_id:
+            verify_user_access(current_user, user_id, is_dev)
+        elif not is_dev:
+            raise HTTPException(status_code=403, detail="Full rebuild is not available via the API in production")
+        
+        detector = MetricAnomalyDetector(db)
+        summary = await run_in_threadpool(detector.rebuild, user_id)
+        
+        return {
+            'success': True,
+            'data': summary
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/anomalies/{user_id}")
+async def get_anomalies(
+    user_id: str,
+    metric_type: Optional[str] = None,
+    days: int = Query(30, ge=1, le=365),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Get flagged metric anomalies for a user (requires auth)"""
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        verify_user_access(current_user, user_id, is_dev)
+        
+        detector = MetricAnomalyDetector(db)
+        anomalies = detector.get_anomalies(user_id, metric_type, days, limit)
+        
+        return {
+            'success': True,
+            'data': anomalies,
+            'count': len(anomalies)
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Header, HTTPException
+from typing import Optional
+import os
+from app.auth import is_service_request
+from app.services.result_cache import result_cache
+from app.services.cache_prewarmer import cache_prewarmer
+from app.services.user_time import user_timezones
+
+router = APIRouter()
+
+@router.get("/cache/stats")
+async def get_cache_stats(x_service_token: Optional[str] = Header(None)):
+    """
+    Result cache hit rate and pre-warm effectiveness
+    Use prewarm.use_rate and minutes_to_first_use to tune PREWARM_LEAD_MINUTES
+    Service token (or development mode) required
+    """
+    is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+    if not (is_dev or is_service_request(x_service_token)):
+        raise HTTPException(status_code=403, detail="Cache stats require a service token")
+
+    return {
+        'success': True,
+        'data': {
+            **result_cache.stats(),
+            'last_prewarm_run': cache_prewarmer.last_run,
+            'timezones': user_timezones.stats()
+        }
+    }
@@ -0,0 +1,90 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import os
+from app.db.connection import get_db
+from app.services.cohort_clustering import CohortClusteringService
+from app.auth import get_current_user, verify_user_access
+
+router = APIRouter()
+
+@router.get("/cohorts")
+async def get_cohorts(
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """List behavioral cohorts with their labels, traits and sizes"""
+    try:
+        service = CohortClusteringService(db)
+        cohorts = service.get_cohorts()
+        
+        return {
+            'success': True,
+            'data': cohorts,
+            'count': len(cohorts)
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/cohorts/run")
+async def run_cohorts(
+    user_id: Optional[str] = None,
+    full: bool = False,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Update cohort assignments now (normally done by the background job)
+    With user_id only that user is refreshed; a full refit or an all-user
+    pass is development mode only
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        if user_id and not full:
+            verify_user_access(current_user, user_id, is_dev)
+        elif not is_dev:
+            raise HTTPException(status_code=403, detail="Full cohort run is not available via the API in production")
+        
+        service = CohortClusteringService(db)
+        summary = await run_in_threadpool(service.run, full, [user_id] if user_id else None)
+        
+        return {
+            'success': True,
+            'data': summary
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cohorts/{user_id}")
+async def get_user_cohort(
+    user_id: str,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Get the user's behavioral cohort (single primary-key lookup)
+    Requires authentication
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        verify_user_access(current_user, user_id, is_dev)
+        
+        service = CohortClusteringService(db)
+        cohort = service.get_user_cohort(user_id)
+        if cohort is None:
+            raise HTTPException(status_code=404, detail="User has no cohort assignment yet")
+        
+        return {
+            'success': True,
+            'data': cohort
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,16 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 import os
+from app.api.responses import DataResponse, EngagementScore, negotiate
 from app.db.connection import get_db
 from app.services.consistency_analyzer import ConsistencyAnalyzer
+from app.services.result_cache import result_cache
+from app.services.activity_sketches import WINDOW_PATTERN, parse_window
 from app.auth import get_current_user, verify_user_access
 from typing import Optional
 
 router = APIRouter()
 
-@router.get("/consistency/{user_id}")
+@router.get("/consistency/{user_id}", response_model=DataResponse[EngagementScore])
 async def get_user_consistency(
     user_id: str,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
@@ -20,12 +24,14 @@ async def get_user_consistency(
         verify_user_access(current_user, user_id, is_dev)
         
         analyzer = ConsistencyAnalyzer(db)
-        score = analyzer.calculate_engagement_score(user_id)
+        score = result_cache.get_or_compute(
+            'engagement', user_id, lambda: analyzer.calculate_engagement_score(user_id)
+        )
         
-        return {
+        return negotiate(request, {
             'success': True,
             'data': score
-        }
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -34,6 +40,7 @@ async def get_user_consistency(
 async def get_category_consistency(
     user_id: str,
     category: str,
+    window: Optional[str] = Query(None, pattern=WINDOW_PATTERN),
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
@@ -43,7 +50,12 @@ async def get_category_consistency(
         verify_user_access(current_user, user_id, is_dev)
         
         analyzer = ConsistencyAnalyzer(db)
-        score = analyzer.calculate_category_consistency(user_id, category)
+        window_days = parse_window(window)
+        score = result_cache.get_or_compute(
+            'category_consistency', user_id,
+            lambda: analyzer.calculate_category_consistency(user_id, category, window_days),
+            category, *([window_days] if window_days else [])
+        )
         
         return {
             'success': True,
@@ -57,6 +69,7 @@ async def get_category_consistency(
 async def get_activity_gaps(
     user_id: str,
     category: Optional[str] = None,
+    window: Optional[str] = Query(None, pattern=WINDOW_PATTERN),
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
@@ -66,7 +79,7 @@ async def get_activity_gaps(
         verify_user_access(current_user, user_id, is_dev)
         
         analyzer = ConsistencyAnalyzer(db)
-        gaps = analyzer.detect_gaps(user_id, category)
+        gaps = analyzer.detect_gaps(user_id, category, parse_window(window))
         
         return {
             'success': True,
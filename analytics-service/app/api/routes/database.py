@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Header, HTTPException
+from typing import Optional
+import os
+from app.auth import is_service_request
+from app.db.connection import database_stats
+
+router = APIRouter()
+
+@router.get("/db/stats")
+async def get_database_stats(x_service_token: Optional[str] = Header(None)):
+    """
+    Connection pool usage for the primary and read replica, plus replica lag
+    and how many reads fell back to the primary
+    Service token (or development mode) required
+    """
+    is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+    if not (is_dev or is_service_request(x_service_token)):
+        raise HTTPException(status_code=403, detail="Database stats require a service token")
+
+    return {
+        'success': True,
+        'data': database_stats()
+    }
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import os
+from app.db.connection import get_db
+from app.services.forecaster import ForecastService
+from app.auth import get_current_user, verify_user_access
+
+router = APIRouter()
+
+@router.get("/forecasts/{user_id}")
+async def get_forecasts(
+    user_id: str,
+    category: Optional[str] = None,
+    target: Optional[str] = Query(None, pattern="^(count|total)$"),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Next-7-day forecasts of activity counts and metric totals per category
+    Served from stored models - no fitting in the request
+    Requires authentication
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        verify_user_access(current_user, user_id, is_dev)
+        
+        service = ForecastService(db)
+        forecasts = service.get_forecasts(user_id, category, target)
+        
+        return {
+            'success': True,
+            'data': forecasts,
+            'count': len(forecasts)
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/forecasts/run")
+async def run_forecasts(
+    user_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Run a forecast batch now (normally done by the background job)
+    Without user_id processes every user (development mode only)
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        if user_id:
+            verify_user_access(current_user, user_id, is_dev)
+        elif not is_dev:
+            raise HTTPException(status_code=403, detail="Full forecast run is not available via the API in production")
+        
+        service = ForecastService(db)
+        summary = await run_in_threadpool(service.run, [user_id] if user_id else None)
+        
+        return {
+            'success': True,
+            'data': summary
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
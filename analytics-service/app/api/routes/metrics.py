@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+import os
+from app.db.connection import get_db
+from app.services.metric_aggregator import MetricAggregationService
+from app.auth import get_current_user, verify_user_access
+
+router = APIRouter()
+
+@router.get("/metrics/{user_id}/aggregate")
+async def get_metric_aggregates(
+    user_id: str,
+    bucket: str = Query("week", pattern="^(day|week|month)$"),
+    periods: int = Query(12, ge=1, le=366),
+    field: str = Query("value", pattern="^(value|duration)$"),
+    category: Optional[str] = None,
+    metric_type: Optional[str] = None,
+    unit: Optional[str] = None,
+    rolling: Optional[int] = Query(None, ge=2, le=52),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Bucketed sum/mean/min/max/count of metric values (or durations)
+    e.g. spend per week, workout minutes per month
+    Requires authentication
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        verify_user_access(current_user, user_id, is_dev)
+        
+        service = MetricAggregationService(db)
+        result = service.aggregate(
+            user_id,
+            bucket=bucket,
+            periods=periods,
+            field=field,
+            category=category,
+            metric_type=metric_type,
+            unit=unit,
+            rolling=rolling
+        )
+        
+        return {
+            'success': True,
+            'data': result
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
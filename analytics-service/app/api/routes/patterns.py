@@ -1,22 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 import os
+from app.api.responses import (
+    LAYOUT_PATTERN, DataResponse, ListResponse, PatternSet, FrequencyPattern,
+    TimePattern, SequencePattern, negotiate,
+)
 from app.db.connection import get_db
 from app.services.pattern_detector import PatternDetectionService
-from app.auth import get_current_user, verify_user_access
+from app.services.sequence_detector import SequencePatternDetector
+from app.services.result_cache import result_cache
+from app.services.activity_sketches import WINDOW_PATTERN, parse_window
+from app.auth import get_current_user, verify_user_access, is_service_request
+from config.settings import settings
 
 router = APIRouter()
 
-@router.get("/patterns/{user_id}")
+
+class PatternBatchRequest(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1)
+    window: Optional[str] = Field(None, pattern=WINDOW_PATTERN)
+
+
+@router.post("/patterns/batch")
+async def get_patterns_batch(
+    body: PatternBatchRequest,
+    request: Request,
+    layout: str = Query('rows', pattern=LAYOUT_PATTERN),
+    x_service_token: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Frequency + time patterns for many users as one flat list (each row
+    carries user_id); layout=columnar suits exports
+    Service token (or development mode) required
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        if not (is_dev or is_service_request(x_service_token)):
+            raise HTTPException(status_code=403, detail="Batch patterns require a service token")
+        if len(body.user_ids) > settings.pattern_batch_max_users:
+            raise HTTPException(status_code=400, detail=f"At most {settings.pattern_batch_max_users} users per batch")
+        
+        service = PatternDetectionService(db)
+        window_days = parse_window(body.window)
+        
+        def collect():
+            rows = []
+            for user_id in dict.fromkeys(body.user_ids):
+                patterns = result_cache.get_or_compute(
+                    'patterns', user_id, lambda: service.detect_all_patterns(user_id, window_days),
+                    *([window_days] if window_days else [])
+                )
+                rows += [{'user_id': user_id, **p}
+                         for p in patterns['frequency_patterns'] + patterns['time_patterns']]
+            return rows
+        
+        rows = await run_in_threadpool(collect)
+        
+        return negotiate(request, {
+            'success': True,
+            'data': rows,
+            'count': len(rows)
+        }, layout, validate=False)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/patterns/{user_id}", response_model=DataResponse[PatternSet])
 async def get_patterns(
     user_id: str,
+    request: Request,
     category: Optional[str] = None,
+    window: Optional[str] = Query(None, pattern=WINDOW_PATTERN),
+    layout: str = Query('rows', pattern=LAYOUT_PATTERN),
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
     """
     Get all detected patterns for a user
+    Optional window (e.g. 90d, 365d) is served from weekly sketches
+    layout=columnar returns arrays per field; Accept: application/msgpack for MessagePack
     Requires authentication - users can only access their own patterns
     """
     try:
@@ -25,27 +93,34 @@ async def get_patterns(
         verify_user_access(current_user, user_id, is_dev)
         
         service = PatternDetectionService(db)
+        window_days = parse_window(window)
         
         if category:
             patterns = {
-                'frequency_patterns': service.detect_frequency_patterns(user_id, category),
+                'frequency_patterns': service.detect_frequency_patterns(user_id, category, window_days),
                 'time_patterns': [] 
             }
         else:
-            patterns = service.detect_all_patterns(user_id)
+            patterns = result_cache.get_or_compute(
+                'patterns', user_id, lambda: service.detect_all_patterns(user_id, window_days),
+                *([window_days] if window_days else [])
+            )
         
-        return {
+        return negotiate(request, {
             'success': True,
             'data': patterns
-        }
+        }, layout)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/patterns/{user_id}/frequency")
+@router.get("/patterns/{user_id}/frequency", response_model=ListResponse[FrequencyPattern])
 async def get_frequency_patterns(
     user_id: str,
+    request: Request,
     category: Optional[str] = None,
+    window: Optional[str] = Query(None, pattern=WINDOW_PATTERN),
+    layout: str = Query('rows', pattern=LAYOUT_PATTERN),
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
@@ -59,20 +134,23 @@ async def get_frequency_patterns(
         verify_user_access(current_user, user_id, is_dev)
         
         service = PatternDetectionService(db)
-        patterns = service.detect_frequency_patterns(user_id, category)
+        patterns = service.detect_frequency_patterns(user_id, category, parse_window(window))
         
-        return {
+        return negotiate(request, {
             'success': True,
             'data': patterns,
             'count': len(patterns)
-        }
+        }, layout)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/patterns/{user_id}/time")
+@router.get("/patterns/{user_id}/time", response_model=ListResponse[TimePattern])
 async def get_time_patterns(
     user_id: str,
+    request: Request,
+    window: Optional[str] = Query(None, pattern=WINDOW_PATTERN),
+    layout: str = Query('rows', pattern=LAYOUT_PATTERN),
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
@@ -86,13 +164,43 @@ async def get_time_patterns(
         verify_user_access(current_user, user_id, is_dev)
         
         service = PatternDetectionService(db)
-        patterns = service.detect_time_patterns(user_id)
+        patterns = service.detect_time_patterns(user_id, parse_window(window))
+        
+        return negotiate(request, {
+            'success': True,
+            'data': patterns,
+            'count': len(patterns)
+        }, layout)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/patterns/{user_id}/sequences", response_model=ListResponse[SequencePattern])
+async def get_sequence_patterns(
+    user_id: str,
+    request: Request,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    layout: str = Query('rows', pattern=LAYOUT_PATTERN),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Get ordered activity routines (A then B within N minutes)
+    Requires authentication
+    """
+    try:
+        # Verify user access
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        verify_user_access(current_user, user_id, is_dev)
+        
+        detector = SequencePatternDetector(db)
+        patterns = detector.detect_sequence_patterns(user_id, min_confidence)
         
-        return {
+        return negotiate(request, {
             'success': True,
             'data': patterns,
             'count': len(patterns)
-        }
+        }, layout)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Security
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import json
+import os
+from app.db.connection import SessionLocal
+from app.services.change_feed import PatternChangeTracker, change_feed, coalesce
+from app.auth import security, get_current_user, verify_user_access, is_service_request
+from config.settings import settings
+
+router = APIRouter()
+
+
+def _sse(event: str, data, event_id: Optional[int] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, default=str)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+# Short-lived sessions per read so an open stream doesn't pin a pooled connection
+
+def _read_events(after_id: int, user_id: Optional[str], limit: int):
+    db = SessionLocal()
+    try:
+        return PatternChangeTracker(db).read_events(after_id, user_id, limit)
+    finally:
+        db.close()
+
+
+def _log_bounds():
+    db = SessionLocal()
+    try:
+        return PatternChangeTracker(db).log_bounds()
+    finally:
+        db.close()
+
+
+@router.get("/stream/changes")
+async def stream_changes(
+    request: Request,
+    user_id: Optional[str] = None,
+    last_event_id: Optional[int] = Query(None, ge=0),
+    batch_size: int = Query(100, ge=1, le=1000),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    x_service_token: Optional[str] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(security)
+):
+    """
+    Server-sent events stream of pattern, risk level and streak changes
+    Subscribe once instead of polling /patterns. Each 'changes' message is a
+    batch of events coalesced per user; its id resumes the stream
+    (Last-Event-ID header or last_event_id query). Without user_id the stream
+    covers all users and needs X-Service-Token (or development mode).
+    """
+    is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+    if not is_service_request(x_service_token):
+        current_user = await get_current_user(request, credentials)
+        if user_id:
+            verify_user_access(current_user, user_id, is_dev)
+        elif not is_dev:
+            raise HTTPException(status_code=403, detail="All-user change stream requires a service token")
+
+    resume_from = last_event_id
+    if resume_from is None and last_event_id_header and last_event_id_header.isdigit():
+        resume_from = int(last_event_id_header)
+
+    async def events():
+        yield f"retry: {settings.stream_retry_ms}\n\n"
+
+        bounds = await run_in_threadpool(_log_bounds)
+        cursor = bounds['latest'] if resume_from is None else resume_from
+        if resume_from is not None and bounds['oldest'] and resume_from < bounds['oldest'] - 1:
+            # Events between the client's cursor and the oldest retained one
+            # are gone; tell it to resync from the pull endpoints
+            yield _sse('reset', {'requested': resume_from, **bounds}, cursor)
+
+        while not await request.is_disconnected():
+            # Read one batch at a time; the next read only happens after the
+            # client has taken this one, so a slow reader slows the reads
+            # instead of growing a buffer
+            batch = await run_in_threadpool(_read_events, cursor, user_id, batch_size)
+            if batch:
+                cursor = batch[-1]['id']
+                changes = coalesce(batch)
+                if changes:
+                    yield _sse('changes', {'events': changes, 'count': len(changes)}, cursor)
+                continue
+
+            if not await change_feed.wait(settings.stream_heartbeat_seconds):
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@router.get("/stream/status")
+async def get_stream_status(x_service_token: Optional[str] = Header(None)):
+    """
+    Latest change-feed scan summary and event log bounds
+    Service token (or development mode) required
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        if not (is_dev or is_service_request(x_service_token)):
+            raise HTTPException(status_code=403, detail="Stream status requires a service token")
+        
+        bounds = await run_in_threadpool(_log_bounds)
+        return {
+            'success': True,
+            'data': {
+                'last_scan': change_feed.last_scan,
+                'log': bounds
+            }
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import os
+from app.db.connection import get_db
+from app.services.timeline_backfill import TimelineBackfillService
+from app.auth import get_current_user, verify_user_access
+
+router = APIRouter()
+
+@router.post("/timeline/backfill")
+async def run_backfill(
+    user_id: Optional[str] = None,
+    rebuild: bool = False,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Extend timelines up to yesterday now (normally done by the background job)
+    rebuild=true drops the checkpoint and replays from the first activity.
+    An all-user pass is development mode only
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        if user_id:
+            verify_user_access(current_user, user_id, is_dev)
+        elif not is_dev:
+            raise HTTPException(status_code=403, detail="All-user backfill is not available via the API in production")
+        
+        service = TimelineBackfillService(db)
+        summary = await run_in_threadpool(service.run, [user_id] if user_id else None, rebuild)
+        
+        return {
+            'success': True,
+            'data': summary
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/timeline/{user_id}")
+async def get_timeline(
+    user_id: str,
+    days: int = Query(90, ge=1, le=730),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Daily engagement score, components, risk, streak and pattern keys
+    Requires authentication
+    """
+    try:
+        is_dev = os.getenv('ENVIRONMENT', 'development') == 'development'
+        verify_user_access(current_user, user_id, is_dev)
+        
+        service = TimelineBackfillService(db)
+        timeline = service.get_timeline(user_id, days)
+        
+        return {
+            'success': True,
+            'data': timeline,
+            'count': len(timeline)
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
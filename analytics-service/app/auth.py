@@ -1,12 +1,15 @@
 """
 Firebase Authentication Middleware for Analytics Service
 """
+import hmac
 import os
+from typing import Optional
 import firebase_admin
 from firebase_admin import credentials, auth
 from fastapi import HTTPException, Security, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from functools import lru_cache
+from config.settings import settings
 
 # Security scheme
 security = HTTPBearer(auto_error=False)
@@ -122,3 +125,9 @@ def verify_user_access(user_id: str, requested_user_id: str, is_dev: bool = True
         )
     
     return True
+
+
+def is_service_request(token: Optional[str]) -> bool:
+    """True when the caller presented the shared SERVICE_TOKEN (backend-to-service calls)"""
+    service_token = settings.service_token
+    return bool(service_token) and token is not None and hmac.compare_digest(token, service_token)
@@ -1,17 +1,178 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Dict, Any, Optional
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from config.settings import settings
 
-# Create SQLAlchemy engine
-engine = create_engine(
+
+def _create_engine(url: str, pool_size: int, max_overflow: int,
+                   statement_timeout_ms: int, application_name: str) -> Engine:
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        # Compiled SQL is cached and reused per statement; psycopg2 has no
+        # server-side prepared statements to share beyond that
+        query_cache_size=settings.db_query_cache_size,
+        connect_args={
+            'application_name': application_name,
+            'connect_timeout': settings.db_connect_timeout_seconds,
+            'options': f'-c statement_timeout={statement_timeout_ms}',
+        },
+    )
+
+
+# Create SQLAlchemy engines: primary for writes, optional replica for scans
+engine = _create_engine(
     settings.database_url,
-    pool_pre_ping=True,
-    pool_recycle=3600,
+    settings.db_pool_size,
+    settings.db_max_overflow,
+    settings.db_statement_timeout_ms,
+    'analytics-service',
 )
 
+# Scans that fall back to the primary (no replica, or an unhealthy one) still
+# get the analytical statement timeout, not the OLTP one
+primary_scan_engine = _create_engine(
+    settings.database_url,
+    settings.db_read_pool_size,
+    settings.db_read_max_overflow,
+    settings.db_read_statement_timeout_ms,
+    'analytics-service-scan',
+)
+
+read_engine: Optional[Engine] = None
+if settings.database_read_url:
+    read_engine = _create_engine(
+        settings.database_read_url,
+        settings.db_read_pool_size,
+        settings.db_read_max_overflow,
+        settings.db_read_statement_timeout_ms,
+        'analytics-service-read',
+    )
+
+
+class ReplicaMonitor:
+    """
+    Decides where analytical reads go. The replica is used while it answers,
+    its WAL receiver is streaming and its replay lag stays under
+    DB_REPLICA_MAX_LAG_SECONDS; otherwise reads fall back to the primary.
+    The replica is re-probed at most once per interval, by one caller, outside
+    the lock: everyone else keeps using the last published state meanwhile.
+    """
+
+    def __init__(self, replica: Optional[Engine]):
+        self.replica = replica
+        self.lag_seconds: Optional[float] = None
+        self.receiver_status: Optional[str] = None
+        self.healthy = False
+        self.last_error: Optional[str] = None
+        self.checked_at = 0.0
+        self.replica_reads = 0
+        self.fallback_reads = 0
+        self._checking = False
+        self._lock = threading.Lock()
+
+    def read_engine(self) -> Engine:
+        if self.replica is None:
+            return primary_scan_engine
+
+        with self._lock:
+            probe = (not self._checking
+                     and time.time() - self.checked_at >= settings.db_replica_check_interval_seconds)
+            if probe:
+                self._checking = True
+        if probe:
+            self._check()
+
+        with self._lock:
+            if self.healthy:
+                self.replica_reads += 1
+                return self.replica
+            self.fallback_reads += 1
+            return primary_scan_engine
+
+    def stats(self) -> Dict[str, Any]:
+        if self.replica is None:
+            return {'configured': False}
+        with self._lock:
+            return {
+                'configured': True,
+                'healthy': self.healthy,
+                'lag_seconds': self.lag_seconds,
+                'receiver_status': self.receiver_status,
+                'max_lag_seconds': settings.db_replica_max_lag_seconds,
+                'last_error': self.last_error,
+                'checked_seconds_ago': round(time.time() - self.checked_at, 1) if self.checked_at else None,
+                'replica_reads': self.replica_reads,
+                'fallback_reads': self.fallback_reads,
+            }
+
+    # Helper methods
+
+    def _check(self) -> None:
+        lag, receiver_status, error = None, None, None
+        try:
+            with self.replica.connect() as conn:
+                # A replica whose receiver stopped has nothing left to replay,
+                # so its lag reads 0 however far behind it is: the receiver
+                # must also be streaming. Without pg_read_all_stats the row is
+                # there but status is NULL, which is taken as running.
+                row = conn.execute(text("""
+                    SELECT
+                        pg_is_in_recovery() AS in_recovery,
+                        EXISTS (SELECT 1 FROM pg_stat_wal_receiver) AS receiver_running,
+                        (SELECT status FROM pg_stat_wal_receiver) AS receiver_status,
+                        CASE
+                            WHEN NOT pg_is_in_recovery() THEN 0
+                            -- Nothing left to replay means caught up, however old the last commit
+                            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                            ELSE EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+                        END AS lag
+                """)).mappings().one()
+            lag = round(float(row['lag']), 2) if row['lag'] is not None else None
+            if row['in_recovery']:
+                receiver_status = row['receiver_status'] if row['receiver_running'] else 'stopped'
+                if receiver_status not in (None, 'streaming'):
+                    error = f"WAL receiver {receiver_status}"
+        except Exception as e:
+            error = str(e)
+
+        healthy = error is None and lag is not None and lag <= settings.db_replica_max_lag_seconds
+        with self._lock:
+            self.lag_seconds = lag
+            self.receiver_status = receiver_status
+            self.healthy = healthy
+            self.last_error = error
+            self.checked_at = time.time()
+            self._checking = False
+        if error:
+            print(f"⚠️  Read replica unavailable, using primary: {error}")
+
+
+replica_monitor = ReplicaMonitor(read_engine)
+
+
+class RoutingSession(Session):
+    """
+    Session bound to the primary. execute()/commit() (writes, state lookups
+    and anything that must see its own writes) stay there; bulk analytical
+    scans pass read_bind to pd.read_sql instead of bind.
+    """
+
+    @property
+    def read_bind(self) -> Engine:
+        return replica_monitor.read_engine()
+
+
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 
 # Base class for models
 Base = declarative_base()
@@ -23,3 +184,23 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _pool_stats(pool_engine: Engine) -> Dict[str, Any]:
+    pool = pool_engine.pool
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+    }
+
+
+def database_stats() -> Dict[str, Any]:
+    stats = {
+        'primary': {'pool': _pool_stats(engine), 'scan_pool': _pool_stats(primary_scan_engine)},
+        'replica': replica_monitor.stats(),
+    }
+    if read_engine is not None:
+        stats['replica']['pool'] = _pool_stats(read_engine)
+    return stats
@@ -0,0 +1,500 @@
+"""
+Analytics Schema
+Tables owned by the analytics service, created on startup if missing
+(same approach as the backend's autoMigrate.js)
+"""
+
+import logging
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Daily per-user aggregates of metrics.numeric_value / duration_minutes,
+# maintained by trigger so bucketed reads never scan raw metrics rows
+METRIC_DAILY_AGGREGATES = """
+CREATE TABLE IF NOT EXISTS metric_daily_aggregates (
+    user_id UUID NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    metric_type VARCHAR(50) NOT NULL,
+    unit VARCHAR(20) NOT NULL DEFAULT '',
+    bucket_date DATE NOT NULL,
+
+    event_count INT NOT NULL DEFAULT 0,
+    value_count INT NOT NULL DEFAULT 0,
+    value_sum NUMERIC NOT NULL DEFAULT 0,
+    value_min NUMERIC,
+    value_max NUMERIC,
+    duration_count INT NOT NULL DEFAULT 0,
+    duration_sum BIGINT NOT NULL DEFAULT 0,
+    duration_min INT,
+    duration_max INT,
+
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, category, metric_type, unit, bucket_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_metric_daily_agg_user_date
+    ON metric_daily_aggregates(user_id, bucket_date DESC);
+
+CREATE OR REPLACE FUNCTION refresh_metric_daily_aggregate(
+    p_user_id UUID, p_category VARCHAR, p_metric_type VARCHAR,
+    p_unit VARCHAR, p_date DATE
+) RETURNS VOID AS $$
+BEGIN
+  DELETE FROM metric_daily_aggregates
+  WHERE user_id = p_user_id AND category = p_category
+    AND metric_type = p_metric_type AND unit = p_unit AND bucket_date = p_date;
+
+  INSERT INTO metric_daily_aggregates (
+    user_id, category, metric_type, unit, bucket_date,
+    event_count, value_count, value_sum, value_min, value_max,
+    duration_count, duration_sum, duration_min, duration_max
+  )
+  SELECT user_id, category, metric_type, COALESCE(unit, ''), metric_date,
+         COUNT(*), COUNT(numeric_value), COALESCE(SUM(numeric_value), 0),
+         MIN(numeric_value), MAX(numeric_value),
+         COUNT(duration_minutes), COALESCE(SUM(duration_minutes), 0),
+         MIN(duration_minutes), MAX(duration_minutes)
+  FROM metrics
+  WHERE user_id = p_user_id AND category = p_category
+    AND metric_type = p_metric_type AND COALESCE(unit, '') = p_unit
+    AND metric_date = p_date
+  GROUP BY user_id, category, metric_type, COALESCE(unit, ''), metric_date;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_metric_daily_aggregates()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    IF NEW.user_id IS NULL THEN
+      RETURN NEW;
+    END IF;
+
+    INSERT INTO metric_daily_aggregates AS a (
+      user_id, category, metric_type, unit, bucket_date,
+      event_count, value_count, value_sum, value_min, value_max,
+      duration_count, duration_sum, duration_min, duration_max
+    ) VALUES (
+      NEW.user_id, NEW.category, NEW.metric_type, COALESCE(NEW.unit, ''), NEW.metric_date,
+      1, (NEW.numeric_value IS NOT NULL)::int, COALESCE(NEW.numeric_value, 0),
+      NEW.numeric_value, NEW.numeric_value,
+      (NEW.duration_minutes IS NOT NULL)::int, COALESCE(NEW.duration_minutes, 0),
+      NEW.duration_minutes, NEW.duration_minutes
+    )
+    ON CONFLICT (user_id, category, metric_type, unit, bucket_date)
+    DO UPDATE SET
+      event_count = a.event_count + 1,
+      value_count = a.value_count + EXCLUDED.value_count,
+      value_sum = a.value_sum + EXCLUDED.value_sum,
+      value_min = LEAST(a.value_min, EXCLUDED.value_min),
+      value_max = GREATEST(a.value_max, EXCLUDED.value_max),
+      duration_count = a.duration_count + EXCLUDED.duration_count,
+      duration_sum = a.duration_sum + EXCLUDED.duration_sum,
+      duration_min = LEAST(a.duration_min, EXCLUDED.duration_min),
+      duration_max = GREATEST(a.duration_max, EXCLUDED.duration_max),
+      updated_at = NOW();
+    RETURN NEW;
+  END IF;
+
+  -- UPDATE / DELETE: min/max can't be reversed, so rebuild the affected day(s)
+  IF OLD.user_id IS NOT NULL THEN
+    PERFORM refresh_metric_daily_aggregate(
+      OLD.user_id, OLD.category, OLD.metric_type, COALESCE(OLD.unit, ''), OLD.metric_date);
+  END IF;
+  IF TG_OP = 'UPDATE' AND NEW.user_id IS NOT NULL THEN
+    PERFORM refresh_metric_daily_aggregate(
+      NEW.user_id, NEW.category, NEW.metric_type, COALESCE(NEW.unit, ''), NEW.metric_date);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_metric_daily_aggregates ON metrics;
+CREATE TRIGGER trigger_metric_daily_aggregates
+  AFTER INSERT OR UPDATE OR DELETE ON metrics
+  FOR EACH ROW EXECUTE FUNCTION update_metric_daily_aggregates();
+"""
+
+# One-off backfill, only run when the aggregate table was just created
+METRIC_DAILY_AGGREGATES_BACKFILL = """
+INSERT INTO metric_daily_aggregates (
+    user_id, category, metric_type, unit, bucket_date,
+    event_count, value_count, value_sum, value_min, value_max,
+    duration_count, duration_sum, duration_min, duration_max
+)
+SELECT user_id, category, metric_type, COALESCE(unit, ''), metric_date,
+       COUNT(*), COUNT(numeric_value), COALESCE(SUM(numeric_value), 0),
+       MIN(numeric_value), MAX(numeric_value),
+       COUNT(duration_minutes), COALESCE(SUM(duration_minutes), 0),
+       MIN(duration_minutes), MAX(duration_minutes)
+FROM metrics
+WHERE user_id IS NOT NULL
+GROUP BY user_id, category, metric_type, COALESCE(unit, ''), metric_date
+ON CONFLICT DO NOTHING
+"""
+
+# Weekly per-user sketches backing long analysis windows. Closed weeks are
+# built lazily by ActivitySketchStore; weekly_sketch_weeks records which weeks
+# are built (including empty ones) and triggers drop that marker when a late
+# row lands in an already-built week, so it gets rebuilt on next read
+WEEKLY_ACTIVITY_SKETCHES = """
+CREATE TABLE IF NOT EXISTS weekly_activity_sketches (
+    user_id UUID NOT NULL,
+    source VARCHAR(10) NOT NULL,            -- 'memory' | 'metric'
+    week_start DATE NOT NULL,               -- Monday
+    category VARCHAR(100) NOT NULL DEFAULT '',
+    item VARCHAR(255) NOT NULL DEFAULT '',  -- activity or metric_type
+
+    event_count INT NOT NULL DEFAULT 0,
+    cells JSONB NOT NULL DEFAULT '{}',      -- {"day*25 + hour": count}, hour 24 = unknown
+
+    value_count INT NOT NULL DEFAULT 0,
+    value_sum NUMERIC NOT NULL DEFAULT 0,
+    value_min NUMERIC,
+    value_max NUMERIC,
+    value_sketch JSONB NOT NULL DEFAULT '{}',
+
+    PRIMARY KEY (user_id, source, week_start, category, item)
+);
+
+CREATE TABLE IF NOT EXISTS weekly_sketch_weeks (
+    user_id UUID NOT NULL,
+    source VARCHAR(10) NOT NULL,
+    week_start DATE NOT NULL,
+    built_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, source, week_start)
+);
+
+-- Zone the week was bucketed in; NULL (built before local bucketing) or a
+-- different zone than the user's current one means rebuild
+ALTER TABLE weekly_sketch_weeks ADD COLUMN IF NOT EXISTS timezone VARCHAR(50);
+
+-- p_date is a UTC date; the user's local date is at most a day either side,
+-- so both neighbouring weeks are dropped when the day sits on a boundary
+CREATE OR REPLACE FUNCTION drop_weekly_sketch_marker(
+    p_user_id UUID, p_source VARCHAR, p_date DATE
+) RETURNS VOID AS $$
+BEGIN
+  DELETE FROM weekly_sketch_weeks
+  WHERE user_id = p_user_id AND source = p_source
+    AND week_start IN (DATE_TRUNC('week', p_date - 1)::date,
+                       DATE_TRUNC('week', p_date + 1)::date);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION invalidate_metric_sketch()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    PERFORM drop_weekly_sketch_marker(OLD.user_id, 'metric', OLD.metric_date);
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    PERFORM drop_weekly_sketch_marker(NEW.user_id, 'metric', NEW.metric_date);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION invalidate_memory_sketch()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM drop_weekly_sketch_marker(OLD.user_id, 'memory', DATE(OLD.created_at));
+  ELSE
+    PERFORM drop_weekly_sketch_marker(NEW.user_id, 'memory', DATE(NEW.created_at));
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_invalidate_metric_sketch ON metrics;
+CREATE TRIGGER trigger_invalidate_metric_sketch
+  AFTER INSERT OR UPDATE OR DELETE ON metrics
+  FOR EACH ROW EXECUTE FUNCTION invalidate_metric_sketch();
+
+DROP TRIGGER IF EXISTS trigger_invalidate_memory_sketch ON memory_units;
+CREATE TRIGGER trigger_invalidate_memory_sketch
+  AFTER UPDATE OF status OR DELETE ON memory_units
+  FOR EACH ROW EXECUTE FUNCTION invalidate_memory_sketch();
+"""
+
+# Constant-size per-series anomaly state and the flagged anomalies
+METRIC_ANOMALIES = """
+CREATE TABLE IF NOT EXISTS metric_anomaly_state (
+    user_id UUID NOT NULL,
+    metric_type VARCHAR(50) NOT NULL,
+    n INT NOT NULL DEFAULT 0,
+    ewma_mean DOUBLE PRECISION NOT NULL DEFAULT 0,
+    ewma_var DOUBLE PRECISION NOT NULL DEFAULT 0,
+    recent_values DOUBLE PRECISION[] NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, metric_type)
+);
+
+-- Position (created_at, id) of the last metric folded in; ingest skips
+-- anything at or before it
+ALTER TABLE metric_anomaly_state ADD COLUMN IF NOT EXISTS last_created_at TIMESTAMPTZ;
+ALTER TABLE metric_anomaly_state ADD COLUMN IF NOT EXISTS last_metric_id UUID;
+
+CREATE TABLE IF NOT EXISTS metric_anomalies (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL,
+    metric_id UUID,
+    category VARCHAR(50),
+    metric_type VARCHAR(50) NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    expected DOUBLE PRECISION,
+    z_score DOUBLE PRECISION,
+    robust_score DOUBLE PRECISION,
+    direction VARCHAR(4),           -- 'high' | 'low'
+    severity VARCHAR(10),           -- 'medium' | 'high'
+    metric_date DATE,
+    detected_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_metric_anomalies_user_time
+    ON metric_anomalies(user_id, detected_at DESC);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_metric_anomalies_metric
+    ON metric_anomalies(metric_id);
+"""
+
+# Persisted forecast models: fitted parameters, smoothing state and the
+# precomputed next-days forecast served to requests
+FORECAST_MODELS = """
+CREATE TABLE IF NOT EXISTS forecast_models (
+    user_id UUID NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    target VARCHAR(10) NOT NULL,            -- 'count' | 'total'
+    unit VARCHAR(20) NOT NULL DEFAULT '',
+    method VARCHAR(50) NOT NULL,
+    params JSONB NOT NULL,
+    state JSONB NOT NULL,
+    sigma2 DOUBLE PRECISION NOT NULL DEFAULT 0,
+    n_obs INT NOT NULL DEFAULT 0,
+    last_date DATE NOT NULL,
+    forecast JSONB NOT NULL DEFAULT '[]',
+    fitted_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, category, target, unit)
+);
+"""
+
+SEQUENCE_MINING_STATE = """
+CREATE TABLE IF NOT EXISTS sequence_mining_state (
+    user_id UUID PRIMARY KEY,
+    watermark TIMESTAMPTZ,                  -- newest memory already counted
+    activity_counts JSONB NOT NULL DEFAULT '{}',
+    activity_categories JSONB NOT NULL DEFAULT '{}',
+    chains JSONB NOT NULL DEFAULT '[]',     -- [[activities], support, span_sum_seconds]
+    tail JSONB NOT NULL DEFAULT '[]',       -- [[epoch, activity]] that can still start a chain
+    built_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Tiebreak for memories sharing the watermark's created_at
+ALTER TABLE sequence_mining_state ADD COLUMN IF NOT EXISTS watermark_id UUID;
+
+-- Memories start tentative and are validated later, so one can become
+-- validated behind the watermark where the incremental miner never looks.
+-- Any change to the validated set at or before the watermark drops the
+-- state; the next request does a full build.
+CREATE OR REPLACE FUNCTION invalidate_sequence_state()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    IF NEW.status IS DISTINCT FROM 'validated' THEN RETURN NULL; END IF;
+  ELSIF TG_OP = 'UPDATE' THEN
+    IF (OLD.status = 'validated') IS NOT DISTINCT FROM (NEW.status = 'validated') THEN RETURN NULL; END IF;
+  ELSIF OLD.status IS DISTINCT FROM 'validated' THEN
+    RETURN NULL;
+  END IF;
+
+  DELETE FROM sequence_mining_state
+  WHERE user_id = COALESCE(NEW.user_id, OLD.user_id)
+    AND watermark >= COALESCE(NEW.created_at, OLD.created_at);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_invalidate_sequence_state ON memory_units;
+CREATE TRIGGER trigger_invalidate_sequence_state
+  AFTER INSERT OR UPDATE OF status OR DELETE ON memory_units
+  FOR EACH ROW EXECUTE FUNCTION invalidate_sequence_state();
+"""
+
+USER_COHORTS = """
+CREATE TABLE IF NOT EXISTS cohort_model (
+    model_key VARCHAR(50) PRIMARY KEY,
+    model BYTEA NOT NULL,                   -- pickled MiniBatchKMeans (partial_fit state)
+    feature_names JSONB NOT NULL,
+    n_samples BIGINT NOT NULL DEFAULT 0,
+    watermark TIMESTAMPTZ NOT NULL,         -- activity before this is already folded in
+    fitted_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS cohort_clusters (
+    cluster_id INT PRIMARY KEY,
+    label VARCHAR(100) NOT NULL,
+    traits JSONB NOT NULL DEFAULT '{}',
+    center JSONB NOT NULL,
+    size INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS user_cohorts (
+    user_id UUID PRIMARY KEY,
+    cluster_id INT NOT NULL,
+    distance DOUBLE PRECISION NOT NULL,
+    features JSONB NOT NULL,
+    assigned_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_cohorts_cluster ON user_cohorts(cluster_id);
+CREATE INDEX IF NOT EXISTS idx_user_cohorts_assigned ON user_cohorts(assigned_at);
+"""
+
+PATTERN_CHANGE_EVENTS = """
+CREATE TABLE IF NOT EXISTS pattern_snapshots (
+    user_id UUID PRIMARY KEY,
+    pattern_keys JSONB NOT NULL DEFAULT '[]',
+    risk_level VARCHAR(20),
+    streak INT NOT NULL DEFAULT 0,
+    checked_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_pattern_snapshots_checked ON pattern_snapshots(checked_at);
+
+CREATE TABLE IF NOT EXISTS pattern_change_events (
+    id BIGSERIAL PRIMARY KEY,               -- SSE event id / resume cursor
+    user_id UUID NOT NULL,
+    changes JSONB NOT NULL,                 -- {patterns: {added, removed}, risk_level: {from, to}, streak: {from, to}}
+    summary JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_pattern_change_events_user ON pattern_change_events(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_pattern_change_events_created ON pattern_change_events(created_at);
+
+CREATE TABLE IF NOT EXISTS change_feed_state (
+    feed_key VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMPTZ NOT NULL,         -- last completed scan
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- One row per user with activity the scanner hasn't looked at yet. Memories
+-- are validated after insert, so a created_at cursor never sees them, and a
+-- timestamp cursor also skips rows that commit late with an earlier time.
+-- The trigger fires on the status change itself; version lets the scanner
+-- drop only the entry it read, never one bumped while it was working.
+CREATE TABLE IF NOT EXISTS change_feed_queue (
+    user_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    queued_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION queue_pattern_change()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_TABLE_NAME = 'memory_units' THEN
+    IF TG_OP = 'INSERT' THEN
+      IF NEW.status IS DISTINCT FROM 'validated' THEN RETURN NULL; END IF;
+    ELSIF TG_OP = 'UPDATE' THEN
+      IF (OLD.status = 'validated') IS NOT DISTINCT FROM (NEW.status = 'validated') THEN RETURN NULL; END IF;
+    ELSIF OLD.status IS DISTINCT FROM 'validated' THEN
+      RETURN NULL;
+    END IF;
+  END IF;
+
+  IF COALESCE(NEW.user_id, OLD.user_id) IS NOT NULL THEN
+    INSERT INTO change_feed_queue (user_id) VALUES (COALESCE(NEW.user_id, OLD.user_id))
+    ON CONFLICT (user_id) DO UPDATE SET
+      version = change_feed_queue.version + 1,
+      queued_at = NOW();
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_queue_pattern_change ON memory_units;
+CREATE TRIGGER trigger_queue_pattern_change
+  AFTER INSERT OR UPDATE OF status OR DELETE ON memory_units
+  FOR EACH ROW EXECUTE FUNCTION queue_pattern_change();
+
+DROP TRIGGER IF EXISTS trigger_queue_pattern_change ON metrics;
+CREATE TRIGGER trigger_queue_pattern_change
+  AFTER INSERT OR UPDATE OR DELETE ON metrics
+  FOR EACH ROW EXECUTE FUNCTION queue_pattern_change();
+"""
+
+ENGAGEMENT_TIMELINE = """
+CREATE TABLE IF NOT EXISTS engagement_timeline (
+    user_id UUID NOT NULL,
+    snapshot_date DATE NOT NULL,            -- state as of the end of this day
+    engagement_score INT NOT NULL,
+    trend VARCHAR(20) NOT NULL,
+    risk_level VARCHAR(20) NOT NULL,
+    recency INT NOT NULL,
+    frequency INT NOT NULL,
+    streak INT NOT NULL,
+    growth INT NOT NULL,
+    days_since_last INT NOT NULL,
+    events_7d INT NOT NULL,
+    events_30d INT NOT NULL,
+    current_streak INT NOT NULL,
+    pattern_keys JSONB NOT NULL DEFAULT '[]',
+    PRIMARY KEY (user_id, snapshot_date)
+);
+
+CREATE TABLE IF NOT EXISTS timeline_backfill_progress (
+    user_id UUID PRIMARY KEY,
+    last_date DATE NOT NULL,                -- resume checkpoint: last snapshot written
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Zone the snapshots were bucketed in; a change means replaying the user
+ALTER TABLE timeline_backfill_progress ADD COLUMN IF NOT EXISTS timezone VARCHAR(50);
+"""
+
+# (table, DDL, backfill run only on first creation)
+MIGRATIONS = [
+    ('metric_daily_aggregates', METRIC_DAILY_AGGREGATES, METRIC_DAILY_AGGREGATES_BACKFILL),
+    ('weekly_activity_sketches', WEEKLY_ACTIVITY_SKETCHES, None),
+    ('metric_anomalies', METRIC_ANOMALIES, None),
+    ('forecast_models', FORECAST_MODELS, None),
+    ('sequence_mining_state', SEQUENCE_MINING_STATE, None),
+    ('user_cohorts', USER_COHORTS, None),
+    ('pattern_change_events', PATTERN_CHANGE_EVENTS, None),
+    ('engagement_timeline', ENGAGEMENT_TIMELINE, None),
+]
+
+
+def ensure_schema(engine: Engine) -> None:
+    """
+    Create analytics tables/triggers if missing; never kills the process.
+    Each migration (DDL plus its one-off backfill) commits on its own, so a
+    failing step is logged and skipped without rolling back the others.
+    """
+    print("🛡️  Ensuring analytics schema...")
+    failed = []
+    for table, ddl, backfill in MIGRATIONS:
+        try:
+            with engine.begin() as conn:
+                # Backfills can outlast the per-statement timeout used for requests
+                conn.exec_driver_sql("SET LOCAL statement_timeout = 0")
+                existed = conn.execute(
+                    text("SELECT to_regclass(:name) IS NOT NULL"), {'name': table}
+                ).scalar()
+                conn.exec_driver_sql(ddl)
+                if backfill and not existed:
+                    conn.exec_driver_sql(backfill)
+        except Exception:
+            logger.exception("Analytics schema migration for %s failed", table)
+            failed.append(table)
+
+    if failed:
+        print(f"❌ Analytics schema migration failed for: {', '.join(failed)}")
+    else:
+        print("✅ Analytics schema is up to date")
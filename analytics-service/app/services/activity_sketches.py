@@ -0,0 +1,401 @@
+"""
+Weekly Activity Sketches
+Small per-user, per-week summaries (day x hour counts and mergeable value
+quantile sketches) that long analysis windows are served from, so a year-long
+query merges ~52 rows per item instead of scanning every raw event
+"""
+
+import json
+import math
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services.user_time import user_timezones, local_today
+from config.settings import settings
+
+# Query-param format for analysis windows, e.g. 7d / 30d / 90d / 365d
+WINDOW_PATTERN = r"^[1-9][0-9]{0,2}d$"
+
+SOURCES = ('memory', 'metric')
+
+# Hour slot used for metrics without a timestamp
+UNKNOWN_HOUR = 24
+_CELLS_PER_DAY = 25
+
+
+def parse_window(window: Optional[str]) -> Optional[int]:
+    """'90d' -> 90; None stays None (use the analyzer's default path)"""
+    if not window:
+        return None
+    return int(window.rstrip('d'))
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch with bounded relative error.
+    Values land in bucket ceil(log_gamma(v)); merging is bucket-wise addition,
+    so weekly sketches combine into any window without the raw values.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.zero_count = 0
+        self.buckets: Dict[int, int] = {}
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.buckets.values())
+
+    def add_many(self, values: np.ndarray) -> 'QuantileSketch':
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.zero_count += int((values <= 0).sum())
+        positive = values[values > 0]
+        if positive.size:
+            idx, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(int),
+                                    return_counts=True)
+            for i, c in zip(idx.tolist(), counts.tolist()):
+                self.buckets[i] = self.buckets.get(i, 0) + c
+        return self
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        self.zero_count += other.zero_count
+        for i, c in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + c
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen > rank:
+                return 2 * self.gamma ** i / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'z': self.zero_count, 'b': {str(i): c for i, c in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'QuantileSketch':
+        sketch = cls()
+        if data:
+            sketch.zero_count = int(data.get('z', 0))
+            sketch.buckets = {int(i): int(c) for i, c in data.get('b', {}).items()}
+        return sketch
+
+
+class ActivitySketchStore:
+    """
+    Builds, persists and merges weekly sketches.
+    Closed weeks are built once (and rebuilt only if a trigger invalidates
+    them or the user's timezone changes); the still-open current week is
+    summarized live from raw rows. Days and hours are the user's local ones.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load_cells(self, user_id: str, source: str, days: int,
+                   category: Optional[str] = None) -> pd.DataFrame:
+        """
+        Per (category, item, date, hour) event counts for the last `days` days.
+        Same shape as the GROUP BY frames the analyzers build from raw SQL;
+        item is the activity (memory) or metric_type (metric).
+        """
+        rows, start = self._load_rows(user_id, source, days, category)
+        frames = []
+        for row in rows:
+            cells = row['cells']
+            if not cells:
+                continue
+            idx = np.fromiter((int(k) for k in cells.keys()), dtype=int, count=len(cells))
+            counts = np.fromiter(cells.values(), dtype=int, count=len(cells))
+            frames.append(pd.DataFrame({
+                'category': row['category'] or None,
+                'item': row['item'] or None,
+                'date': pd.to_datetime(row['week_start']) + pd.to_timedelta(idx // _CELLS_PER_DAY, unit='D'),
+                'hour': idx % _CELLS_PER_DAY,
+                'count': counts,
+            }))
+
+        if not frames:
+            return pd.DataFrame({
+                'category': pd.Series(dtype=object),
+                'item': pd.Series(dtype=object),
+                'date': pd.Series(dtype='datetime64[ns]'),
+                'hour': pd.Series(dtype=int),
+                'count': pd.Series(dtype=int),
+            })
+
+        df = pd.concat(frames, ignore_index=True)
+        return df[df['date'] >= pd.Timestamp(start)].reset_index(drop=True)
+
+    def value_stats(self, user_id: str, days: int,
+                    category: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Merged numeric_value stats per metric_type over whole weeks touching
+        the window: count, sum, mean, min, max and p50/p90 from the sketch
+        """
+        rows, _ = self._load_rows(user_id, 'metric', days, category)
+        merged: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            if not row['value_count']:
+                continue
+            key = row['item']
+            acc = merged.setdefault(key, {'count': 0, 'sum': 0.0, 'min': None, 'max': None,
+                                          'sketch': QuantileSketch()})
+            acc['count'] += int(row['value_count'])
+            acc['sum'] += float(row['value_sum'])
+            vmin, vmax = float(row['value_min']), float(row['value_max'])
+            acc['min'] = vmin if acc['min'] is None else min(acc['min'], vmin)
+            acc['max'] = vmax if acc['max'] is None else max(acc['max'], vmax)
+            acc['sketch'].merge(QuantileSketch.from_dict(row['value_sketch']))
+
+        result = {}
+        for key, acc in merged.items():
+            sketch = acc.pop('sketch')
+            result[key] = {
+                'count': acc['count'],
+                'sum': round(acc['sum'], 2),
+                'mean': round(acc['sum'] / acc['count'], 2),
+                'min': acc['min'],
+                'max': acc['max'],
+                'p50': round(sketch.quantile(0.5), 2),
+                'p90': round(sketch.quantile(0.9), 2),
+            }
+        return result
+
+    # Helper methods
+
+    def _window_bounds(self, days: int, timezone: str) -> Tuple[date, date]:
+        today = local_today(timezone)
+        # `days` local dates, today included
+        return today - timedelta(days=days - 1), today
+
+    @staticmethod
+    def _week_start(d: date) -> date:
+        return d - timedelta(days=d.weekday())
+
+    def _load_rows(self, user_id: str, source: str, days: int,
+                   category: Optional[str]) -> Tuple[List[Dict[str, Any]], date]:
+        if source not in SOURCES:
+            raise ValueError(f"source must be one of {SOURCES}")
+
+        timezone = user_timezones.get(self.db, user_id)
+        start, today = self._window_bounds(days, timezone)
+        first_week = self._week_start(start)
+        current_week = self._week_start(today)
+
+        if first_week < current_week:
+            self._build_missing_weeks(user_id, source, first_week, current_week, timezone)
+
+        query = """
+            SELECT week_start, category, item, cells,
+                   value_count, value_sum, value_min, value_max, value_sketch
+            FROM weekly_activity_sketches
+            WHERE user_id = :user_id
+              AND source = :source
+              AND week_start >= :first_week
+              AND week_start < :current_week
+        """
+        params = {'user_id': user_id, 'source': source,
+                  'first_week': first_week, 'current_week': current_week}
+        if category:
+            query += " AND category = :category"
+            params['category'] = category
+
+        rows = [dict(r._mapping) for r in self.db.execute(text(query), params)]
+
+        # Open week: summarize live, it is at most 7 days of raw rows
+        live = self._summarize(user_id, source, current_week, today + timedelta(days=1), timezone)
+        rows.extend(r for r in live if not category or r['category'] == category)
+        return rows, start
+
+    def _build_missing_weeks(self, user_id: str, source: str, first_week: date,
+                             current_week: date, timezone: str) -> None:
+        params = {'user_id': user_id, 'source': source, 'timezone': timezone,
+                  'first_week': first_week, 'current_week': current_week}
+        if not self._unbuilt_weeks(params):
+            return
+
+        # Concurrent requests for the same user/source queue here instead of
+        # racing on the primary key; whoever waited only builds what is still
+        # missing once the lock holder has committed
+        self.db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:user_id), hashtext(:source))"), params)
+        wanted = self._unbuilt_weeks(params)
+        if not wanted:
+            self.db.commit()
+            return
+        # The build scans up to a year of raw rows on the primary connection:
+        # give this transaction the analytical timeout, not the OLTP one
+        self.db.execute(text("SELECT set_config('statement_timeout', :timeout, true)"),
+                        {'timeout': str(settings.db_read_statement_timeout_ms)})
+
+        # One scan over the span of missing weeks, keep only the missing ones.
+        # Persisted weeks are read from the primary: a lagging replica would
+        # freeze a week with rows missing until the next invalidation.
+        wanted_set = set(wanted)
+        rows = [r for r in self._summarize(user_id, source, wanted[0], wanted[-1] + timedelta(days=7),
+                                           timezone, bind=self.db.connection())
+                if r['week_start'] in wanted_set]
+
+        params['weeks'] = wanted
+        if rows:
+            self.db.execute(text("""
+                INSERT INTO weekly_activity_sketches (
+                    user_id, source, week_start, category, item, event_count, cells,
+                    value_count, value_sum, value_min, value_max, value_sketch
+                ) VALUES (
+                    :user_id, :source, :week_start, :category, :item, :event_count,
+                    CAST(:cells AS JSONB), :value_count, :value_sum, :value_min,
+                    :value_max, CAST(:value_sketch AS JSONB)
+                )
+                ON CONFLICT (user_id, source, week_start, category, item) DO UPDATE SET
+                    event_count = EXCLUDED.event_count,
+                    cells = EXCLUDED.cells,
+                    value_count = EXCLUDED.value_count,
+                    value_sum = EXCLUDED.value_sum,
+                    value_min = EXCLUDED.value_min,
+                    value_max = EXCLUDED.value_max,
+                    value_sketch = EXCLUDED.value_sketch
+            """), [{**r, 'user_id': user_id, 'source': source,
+                    'cells': json.dumps(r['cells']),
+                    'value_sketch': json.dumps(r['value_sketch'])} for r in rows])
+        # Items that no longer occur in a rebuilt week
+        self.db.execute(text("""
+            DELETE FROM weekly_activity_sketches
+            WHERE user_id = :user_id AND source = :source
+              AND week_start = ANY(CAST(:weeks AS DATE[]))
+              AND (week_start, category, item) NOT IN (
+                  SELECT * FROM UNNEST(CAST(:kept_weeks AS DATE[]),
+                                       CAST(:kept_categories AS TEXT[]),
+                                       CAST(:kept_items AS TEXT[]))
+              )
+        """), {**params,
+               'kept_weeks': [r['week_start'] for r in rows],
+               'kept_categories': [r['category'] for r in rows],
+               'kept_items': [r['item'] for r in rows]})
+        self.db.execute(text("""
+            INSERT INTO weekly_sketch_weeks (user_id, source, week_start, timezone)
+            SELECT :user_id, :source, UNNEST(CAST(:weeks AS DATE[])), :timezone
+            ON CONFLICT (user_id, source, week_start)
+            DO UPDATE SET built_at = NOW(), timezone = EXCLUDED.timezone
+        """), params)
+        self.db.commit()
+
+    def _unbuilt_weeks(self, params: Dict[str, Any]) -> List[date]:
+        # Weeks bucketed under another timezone count as missing
+        built = {
+            r[0] for r in self.db.execute(text("""
+                SELECT week_start FROM weekly_sketch_weeks
+                WHERE user_id = :user_id AND source = :source
+                  AND week_start >= :first_week AND week_start < :current_week
+                  AND timezone = :timezone
+            """), params)
+        }
+
+        wanted = []
+        week = params['first_week']
+        while week < params['current_week']:
+            if week not in built:
+                wanted.append(week)
+            week += timedelta(days=7)
+        return wanted
+
+    def _summarize(self, user_id: str, source: str, start: date, end: date,
+                   timezone: str, bind=None) -> List[Dict[str, Any]]:
+        """
+        Build sketch rows for local days [start, end) from raw rows, one per
+        (week, category, item). Events are bucketed by created_at in the
+        user's timezone; for metrics that replaces metric_date (a UTC date)
+        and metric_time (the backend server's clock). Reads go to `bind`,
+        the replica by default
+        """
+        bind = bind if bind is not None else self.db.read_bind
+        params = {'user_id': user_id, 'start': start, 'end': end, 'tz': timezone}
+
+        if source == 'memory':
+            counts = pd.read_sql(text("""
+                SELECT
+                    DATE(created_at AT TIME ZONE :tz) AS day,
+                    COALESCE(category, '') AS category,
+                    COALESCE(normalized_data->>'activity', '') AS item,
+                    EXTRACT(HOUR FROM created_at AT TIME ZONE :tz)::int AS hour,
+                    COUNT(*) AS count
+                FROM memory_units
+                WHERE user_id = :user_id
+                  AND status = 'validated'
+                  AND created_at >= CAST(:start AS TIMESTAMP) AT TIME ZONE :tz
+                  AND created_at < CAST(:end AS TIMESTAMP) AT TIME ZONE :tz
+                GROUP BY 1, 2, 3, 4
+            """), bind, params=params)
+            values = pd.DataFrame(columns=['day', 'category', 'item', 'numeric_value'])
+        else:
+            # metric_date (UTC) is within a day of the local date: it only
+            # narrows the index range, created_at decides the bucket
+            counts = pd.read_sql(text(f"""
+                SELECT
+                    DATE(created_at AT TIME ZONE :tz) AS day,
+                    category,
+                    metric_type AS item,
+                    COALESCE(EXTRACT(HOUR FROM created_at AT TIME ZONE :tz)::int, {UNKNOWN_HOUR}) AS hour,
+                    COUNT(*) AS count
+                FROM metrics
+                WHERE user_id = :user_id
+                  AND metric_date BETWEEN CAST(:start AS DATE) - 1 AND CAST(:end AS DATE)
+                  AND created_at >= CAST(:start AS TIMESTAMP) AT TIME ZONE :tz
+                  AND created_at < CAST(:end AS TIMESTAMP) AT TIME ZONE :tz
+                GROUP BY 1, 2, 3, 4
+            """), bind, params=params)
+            values = pd.read_sql(text("""
+                SELECT DATE(created_at AT TIME ZONE :tz) AS day, category, metric_type AS item, numeric_value
+                FROM metrics
+                WHERE user_id = :user_id
+                  AND metric_date BETWEEN CAST(:start AS DATE) - 1 AND CAST(:end AS DATE)
+                  AND created_at >= CAST(:start AS TIMESTAMP) AT TIME ZONE :tz
+                  AND created_at < CAST(:end AS TIMESTAMP) AT TIME ZONE :tz
+                  AND numeric_value IS NOT NULL
+            """), bind, params=params)
+
+        if counts.empty:
+            return []
+
+        counts['day'] = pd.to_datetime(counts['day'])
+        counts['week_start'] = counts['day'] - pd.to_timedelta(counts['day'].dt.weekday, unit='D')
+        counts['cell'] = (counts['day'] - counts['week_start']).dt.days * _CELLS_PER_DAY + counts['hour']
+
+        value_groups = {}
+        if not values.empty:
+            values['day'] = pd.to_datetime(values['day'])
+            values['week_start'] = values['day'] - pd.to_timedelta(values['day'].dt.weekday, unit='D')
+            values['numeric_value'] = values['numeric_value'].astype(float)
+            value_groups = {k: g['numeric_value'].to_numpy()
+                            for k, g in values.groupby(['week_start', 'category', 'item'])}
+
+        rows = []
+        for (week_start, cat, item), group in counts.groupby(['week_start', 'category', 'item']):
+            vals = value_groups.get((week_start, cat, item), np.array([]))
+            rows.append({
+                'week_start': week_start.date(),
+                'category': cat,
+                'item': item,
+                'event_count': int(group['count'].sum()),
+                'cells': {str(int(c)): int(n) for c, n in zip(group['cell'], group['count'])},
+                'value_count': int(vals.size),
+                'value_sum': float(vals.sum()) if vals.size else 0.0,
+                'value_min': float(vals.min()) if vals.size else None,
+                'value_max': float(vals.max()) if vals.size else None,
+                'value_sketch': QuantileSketch().add_many(vals).to_dict(),
+            })
+        return rows
@@ -0,0 +1,343 @@
+"""
+Metric Anomaly Detection Service
+Flags unusual metric values per user x metric_type using constant-size
+incremental state: EWMA mean/variance plus median/IQR over a short ring of
+recent values. The batch rebuild computes the same recursions vectorized.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from config.settings import settings
+
+# Robust scale never drops below this fraction of the center, so a perfectly
+# flat history doesn't turn every small change into an infinite score
+_MIN_RELATIVE_SCALE = 0.05
+_IQR_TO_SIGMA = 1.349
+
+
+class MetricAnomalyDetector:
+    """Streaming + batch anomaly detection over metrics.numeric_value"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.alpha = settings.anomaly_alpha
+        self.window = settings.anomaly_recent_window
+
+    def ingest(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Score each new metric against its series state, then fold it in.
+        Events: user_id, metric_type, numeric_value, optional metric_id,
+        category and metric_date. Returns the anomalies flagged.
+
+        An event with a metric_id is scored from the stored row, not from
+        the values sent with it; one whose user_id or metric_type disagree
+        with that row fails the whole batch with a ValueError.
+
+        Stored metrics are folded in (created_at, id) order, the order the
+        rebuild replays them in, and each series keeps the last position it
+        folded in: a retried or overlapping batch is skipped instead of
+        being counted twice. Events without a metric_id can't be checked
+        and are folded in after the rest, in the order given.
+        """
+        stored = self._stored_metrics([e['metric_id'] for e in events if e.get('metric_id')])
+
+        ordered = []
+        for i, event in enumerate(events):
+            position = None
+            if event.get('metric_id'):
+                row = stored.get(str(event['metric_id']).lower())
+                if row is None:
+                    continue  # not stored (any more): the rebuild wouldn't see it either
+                if (str(event['user_id']).lower(), event['metric_type']) != (row['user_id'], row['metric_type']):
+                    raise ValueError(f"metric {event['metric_id']} does not match its user_id/metric_type")
+                position = (row['created_at'], row['metric_id'])
+                event = {**event, **row}
+            if event.get('numeric_value') is None:
+                continue
+            ordered.append((position is None, position or (), i, event))
+        ordered.sort(key=lambda item: item[:3])
+
+        flagged = []
+        states: Dict[tuple, Dict[str, Any]] = {}
+        for _, position, _, event in ordered:
+            key = (str(event['user_id']), event['metric_type'])
+            if key not in states:
+                states[key] = self._load_state(*key)
+
+            state = states[key]
+            last = self._last_position(state)
+            if position and last and position <= last:
+                continue
+
+            value = float(event['numeric_value'])
+            anomaly = self._score(state, value)
+            if anomaly:
+                flagged.append({**anomaly, **self._event_fields(event)})
+            states[key] = self._update(state, value)
+            previous = state or {}
+            states[key]['last_created_at'] = position[0] if position else previous.get('last_created_at')
+            states[key]['last_metric_id'] = position[1] if position else previous.get('last_metric_id')
+
+        for (user_id, metric_type), state in states.items():
+            if state is not None:
+                self._save_state(user_id, metric_type, state)
+        self._save_anomalies(flagged)
+        self.db.commit()
+        return flagged
+
+    def rebuild(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Recompute state and anomaly history for every series from scratch,
+        vectorized per chunk of users
+        """
+        if user_id:
+            user_ids = [user_id]
+        else:
+            user_ids = [r[0] for r in self.db.execute(text("""
+                SELECT DISTINCT user_id::text FROM metrics
+                WHERE numeric_value IS NOT NULL AND user_id IS NOT NULL
+            """))]
+
+        summary = {'users': len(user_ids), 'series': 0, 'metrics': 0, 'anomalies': 0}
+        chunk = settings.anomaly_rebuild_chunk_users
+        for start in range(0, len(user_ids), chunk):
+            batch = user_ids[start:start + chunk]
+            # Same order ingest folds metrics in: when they were stored
+            df = pd.read_sql(text("""
+                SELECT id::text AS metric_id, user_id::text AS user_id, category,
+                       metric_type, numeric_value::float AS value, metric_date, created_at
+                FROM metrics
+                WHERE user_id = ANY(CAST(:user_ids AS UUID[]))
+                  AND numeric_value IS NOT NULL
+                ORDER BY user_id, metric_type, created_at, id
+            """), self.db.read_bind, params={'user_ids': batch})
+
+            states, anomalies = self._replay(df)
+
+            self.db.execute(text("DELETE FROM metric_anomaly_state WHERE user_id = ANY(CAST(:user_ids AS UUID[]))"),
+                            {'user_ids': batch})
+            self.db.execute(text("DELETE FROM metric_anomalies WHERE user_id = ANY(CAST(:user_ids AS UUID[]))"),
+                            {'user_ids': batch})
+            for state in states:
+                self._save_state(state.pop('user_id'), state.pop('metric_type'), state)
+            self._save_anomalies(anomalies)
+            self.db.commit()
+
+            summary['series'] += len(states)
+            summary['metrics'] += len(df)
+            summary['anomalies'] += len(anomalies)
+
+        return summary
+
+    def get_anomalies(self, user_id: str, metric_type: Optional[str] = None,
+                      days: int = 30, limit: int = 50) -> List[Dict[str, Any]]:
+        query = """
+            SELECT metric_id::text AS metric_id, category, metric_type, value, expected,
+                   z_score, robust_score, direction, severity, metric_date, detected_at
+            FROM metric_anomalies
+            WHERE user_id = :user_id
+              AND detected_at >= NOW() - make_interval(days => :days)
+        """
+        params = {'user_id': user_id, 'days': days, 'limit': limit}
+        if metric_type:
+            query += " AND metric_type = :metric_type"
+            params['metric_type'] = metric_type
+        query += " ORDER BY detected_at DESC LIMIT :limit"
+
+        rows = self.db.execute(text(query), params).mappings().all()
+        return [
+            {**row,
+             'metric_date': str(row['metric_date']) if row['metric_date'] else None,
+             'detected_at': row['detected_at'].isoformat()}
+            for row in rows
+        ]
+
+    # Helper methods
+
+    def _score(self, state: Optional[Dict[str, Any]], value: float) -> Optional[Dict[str, Any]]:
+        """Compare a value with the state *before* it is folded in"""
+        if not state or state['n'] < settings.anomaly_min_samples:
+            return None
+
+        mean = state['ewma_mean']
+        recent = np.asarray(state['recent_values'], dtype=float)
+        median, q25, q75 = np.quantile(recent, [0.5, 0.25, 0.75])
+        return self._classify(value, mean, state['ewma_var'], median, q75 - q25)
+
+    @staticmethod
+    def _scores(value, mean, var, median, iqr):
+        """z and robust scores; works on scalars and numpy arrays alike"""
+        z_scale = np.maximum.reduce([np.sqrt(np.maximum(var, 0.0)),
+                                     _MIN_RELATIVE_SCALE * np.abs(mean),
+                                     np.full_like(np.asarray(mean, dtype=float), 1e-9)])
+        r_scale = np.maximum.reduce([np.asarray(iqr, dtype=float) / _IQR_TO_SIGMA,
+                                     _MIN_RELATIVE_SCALE * np.abs(median),
+                                     np.full_like(np.asarray(median, dtype=float), 1e-9)])
+        z_score = (value - mean) / z_scale
+        robust_score = (value - median) / r_scale
+        flagged = ((np.abs(z_score) >= settings.anomaly_z_threshold) &
+                   (np.abs(robust_score) >= settings.anomaly_robust_threshold))
+        return z_score, robust_score, flagged
+
+    def _classify(self, value: float, mean: float, var: float,
+                  median: float, iqr: float) -> Optional[Dict[str, Any]]:
+        z_score, robust_score, flagged = self._scores(value, mean, var, median, iqr)
+        if not flagged:
+            return None
+
+        z_score, robust_score = float(z_score), float(robust_score)
+        strength = min(abs(z_score), abs(robust_score))
+        return {
+            'value': round(value, 2),
+            'expected': round(mean, 2),
+            'z_score': round(z_score, 2),
+            'robust_score': round(robust_score, 2),
+            'direction': 'high' if value > mean else 'low',
+            'severity': 'high' if strength >= 2 * settings.anomaly_z_threshold else 'medium',
+        }
+
+    def _update(self, state: Optional[Dict[str, Any]], value: float) -> Dict[str, Any]:
+        """EWMA recursion (West 1979) + bounded ring of recent values"""
+        if not state:
+            return {'n': 1, 'ewma_mean': value, 'ewma_var': 0.0, 'recent_values': [value]}
+
+        diff = value - state['ewma_mean']
+        incr = self.alpha * diff
+        return {
+            'n': state['n'] + 1,
+            'ewma_mean': state['ewma_mean'] + incr,
+            'ewma_var': (1 - self.alpha) * (state['ewma_var'] + diff * incr),
+            'recent_values': (list(state['recent_values']) + [value])[-self.window:],
+        }
+
+    def _replay(self, df: pd.DataFrame):
+        """
+        Vectorized equivalent of calling _score/_update row by row:
+        mean_t = ewm(x), var_t = ewm((1 - a) * (x_t - mean_{t-1})^2)
+        """
+        if df.empty:
+            return [], []
+
+        a = self.alpha
+        keys = ['user_id', 'metric_type']
+        df = df.reset_index(drop=True)
+        g = df.groupby(keys, sort=False)
+
+        def per_group(series: pd.Series) -> pd.Series:
+            return series.reset_index(level=[0, 1], drop=True).sort_index()
+
+        mean_after = per_group(g['value'].ewm(alpha=a, adjust=False).mean())
+        mean_before = mean_after.groupby([df['user_id'], df['metric_type']]).shift(1)
+        var_input = ((1 - a) * (df['value'] - mean_before) ** 2).fillna(0.0)
+        var_after = per_group(var_input.groupby([df['user_id'], df['metric_type']])
+                              .ewm(alpha=a, adjust=False).mean())
+        var_before = var_after.groupby([df['user_id'], df['metric_type']]).shift(1)
+
+        rolling = g['value'].rolling(self.window, min_periods=1)
+        stats = pd.DataFrame({
+            'median': per_group(rolling.quantile(0.5)),
+            'q25': per_group(rolling.quantile(0.25)),
+            'q75': per_group(rolling.quantile(0.75)),
+        }).groupby([df['user_id'], df['metric_type']]).shift(1)
+
+        warm = (g.cumcount() >= settings.anomaly_min_samples).to_numpy()
+        _, _, flagged = self._scores(df['value'].to_numpy(), mean_before.to_numpy(),
+                                     var_before.to_numpy(), stats['median'].to_numpy(),
+                                     (stats['q75'] - stats['q25']).to_numpy())
+
+        # Only the (few) flagged rows are materialized individually
+        anomalies = []
+        for i in df.index[warm & flagged]:
+            anomaly = self._classify(df.at[i, 'value'], mean_before[i], var_before[i],
+                                     stats.at[i, 'median'], stats.at[i, 'q75'] - stats.at[i, 'q25'])
+            anomalies.append({**anomaly, **self._event_fields(df.loc[i].to_dict())})
+
+        last = df.assign(mean=mean_after, var=var_after).groupby(keys, sort=False)
+        tails = g['value'].apply(lambda s: s.tail(self.window).tolist())
+        sizes = g.size()
+        states = []
+        for key, row in last.tail(1).set_index(keys).iterrows():
+            states.append({
+                'user_id': key[0],
+                'metric_type': key[1],
+                'n': int(sizes[key]),
+                'ewma_mean': float(row['mean']),
+                'ewma_var': float(row['var']),
+                'recent_values': tails[key],
+                'last_created_at': row['created_at'],
+                'last_metric_id': row['metric_id'],
+            })
+        return states, anomalies
+
+    @staticmethod
+    def _event_fields(event: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'user_id': str(event['user_id']),
+            'metric_id': event.get('metric_id'),
+            'category': event.get('category'),
+            'metric_type': event['metric_type'],
+            'metric_date': event.get('metric_date'),
+        }
+
+    @staticmethod
+    def _last_position(state: Optional[Dict[str, Any]]) -> Optional[tuple]:
+        if not state or state.get('last_created_at') is None:
+            return None
+        return state['last_created_at'], state['last_metric_id'] or ''
+
+    def _stored_metrics(self, metric_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """metric_id -> the stored row's event fields plus created_at"""
+        if not metric_ids:
+            return {}
+        rows = self.db.execute(text("""
+            SELECT id::text AS metric_id, user_id::text AS user_id, metric_type,
+                   numeric_value::float AS numeric_value, category, metric_date, created_at
+            FROM metrics
+            WHERE id = ANY(CAST(:metric_ids AS UUID[]))
+        """), {'metric_ids': sorted(set(map(str, metric_ids)))}).mappings()
+        return {row['metric_id']: dict(row) for row in rows}
+
+    def _load_state(self, user_id: str, metric_type: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(text("""
+            SELECT n, ewma_mean, ewma_var, recent_values, last_created_at, last_metric_id::text AS last_metric_id
+            FROM metric_anomaly_state
+            WHERE user_id = :user_id AND metric_type = :metric_type
+            FOR UPDATE
+        """), {'user_id': user_id, 'metric_type': metric_type}).mappings().first()
+        return dict(row) if row else None
+
+    def _save_state(self, user_id: str, metric_type: str, state: Dict[str, Any]) -> None:
+        self.db.execute(text("""
+            INSERT INTO metric_anomaly_state (
+                user_id, metric_type, n, ewma_mean, ewma_var, recent_values, last_created_at, last_metric_id
+            ) VALUES (
+                :user_id, :metric_type, :n, :ewma_mean, :ewma_var, :recent_values,
+                :last_created_at, CAST(:last_metric_id AS UUID)
+            )
+            ON CONFLICT (user_id, metric_type) DO UPDATE SET
+                n = EXCLUDED.n,
+                ewma_mean = EXCLUDED.ewma_mean,
+                ewma_var = EXCLUDED.ewma_var,
+                recent_values = EXCLUDED.recent_values,
+                last_created_at = EXCLUDED.last_created_at,
+                last_metric_id = EXCLUDED.last_metric_id,
+                updated_at = NOW()
+        """), {'user_id': user_id, 'metric_type': metric_type, **state,
+               'recent_values': [float(v) for v in state['recent_values']]})
+
+    def _save_anomalies(self, anomalies: List[Dict[str, Any]]) -> None:
+        if not anomalies:
+            return
+        self.db.execute(text("""
+            INSERT INTO metric_anomalies (
+                user_id, metric_id, category, metric_type, value, expected,
+                z_score, robust_score, direction, severity, metric_date
+            ) VALUES (
+                :user_id, :metric_id, :category, :metric_type, :value, :expected,
+                :z_score, :robust_score, :direction, :severity, :metric_date
+            )
+            ON CONFLICT DO NOTHING
+        """), anomalies)
@@ -0,0 +1,136 @@
+"""
+Cache Pre-warming Service
+Precomputes patterns, engagement and category consistency shortly before
+each user's predicted active hour so the first request of the day is warm
+"""
+
+import time
+from typing import Any, Dict, List
+
+import pandas as pd
+from sqlalchemy import text
+
+from app.services.consistency_analyzer import ConsistencyAnalyzer
+from app.services.pattern_detector import PatternDetectionService
+from app.services.periodic_job import PeriodicJob
+from app.services.result_cache import result_cache
+from config.settings import settings
+
+
+class RequestLoad:
+    """Tracks in-flight API requests so pre-warming only runs off-peak"""
+
+    def __init__(self):
+        self.in_flight = 0
+
+    def is_busy(self) -> bool:
+        return self.in_flight > settings.prewarm_max_inflight_requests
+
+
+request_load = RequestLoad()
+
+
+class CachePrewarmer:
+    """Finds users about to become active and warms their cached results"""
+
+    def find_due_users(self, db) -> pd.DataFrame:
+        """
+        Users whose most common activity hour (last 30 days) falls inside the
+        lead window, together with the categories they logged metrics for
+        """
+        query = text("""
+            WITH hourly AS (
+                SELECT user_id,
+                       EXTRACT(HOUR FROM created_at)::int AS hour,
+                       COUNT(*) AS cnt
+                FROM memory_units
+                WHERE status = 'validated'
+                  AND created_at >= NOW() - INTERVAL '30 days'
+                GROUP BY user_id, EXTRACT(HOUR FROM created_at)
+            ),
+            peaks AS (
+                SELECT DISTINCT ON (user_id) user_id, hour AS peak_hour
+                FROM hourly
+                ORDER BY user_id, cnt DESC, hour
+            ),
+            window_hours AS (
+                SELECT DISTINCT EXTRACT(HOUR FROM NOW() + make_interval(mins => m))::int AS hour
+                FROM generate_series(0, :lead_minutes, 15) AS m
+            )
+            SELECT p.user_id::text AS user_id,
+                   p.peak_hour,
+                   COALESCE(
+                       (SELECT array_agg(DISTINCT m.category)
+                        FROM metrics m
+                        WHERE m.user_id = p.user_id
+                          AND m.metric_date >= NOW() - INTERVAL '30 days'),
+                       ARRAY[]::varchar[]
+                   ) AS categories
+            FROM peaks p
+            WHERE p.peak_hour IN (SELECT hour FROM window_hours)
+        """)
+        return pd.read_sql(query, db.read_bind, params={'lead_minutes': settings.prewarm_lead_minutes})
+
+    def warm_user(self, db, user_id: str, categories: List[str]) -> int:
+        """Compute and store every cached result for one user"""
+        patterns = PatternDetectionService(db)
+        analyzer = ConsistencyAnalyzer(db)
+
+        warmed = {
+            result_cache.make_key('patterns', user_id): lambda: patterns.detect_all_patterns(user_id),
+            result_cache.make_key('engagement', user_id): lambda: analyzer.calculate_engagement_score(user_id),
+        }
+        for category in categories or []:
+            warmed[result_cache.make_key('category_consistency', user_id, category)] = (
+                lambda c=category: analyzer.calculate_category_consistency(user_id, c)
+            )
+
+        count = 0
+        for key, compute in warmed.items():
+            if result_cache.is_warm(key):
+                continue
+            ttl = settings.prewarm_lead_minutes * 60 + result_cache.ttl_for(key)
+            result_cache.set(key, compute(), ttl=ttl, source='prewarm')
+            count += 1
+        return count
+
+    def run(self, db) -> Dict[str, Any]:
+        """One budgeted pre-warm pass (blocking; run it off the event loop)"""
+        started = time.time()
+        summary = {'due_users': 0, 'warmed_users': 0, 'warmed_results': 0,
+                   'deferred_batches': 0, 'budget_exhausted': False}
+
+        due = self.find_due_users(db)
+        summary['due_users'] = len(due)
+        rows = due.to_dict('records')[:settings.prewarm_max_users_per_run]
+        summary['budget_exhausted'] = len(due) > len(rows)
+
+        for start in range(0, len(rows), settings.prewarm_batch_size):
+            # Back off while the API is busy serving real requests
+            while request_load.is_busy():
+                summary['deferred_batches'] += 1
+                time.sleep(settings.prewarm_batch_pause_seconds)
+                if time.time() - started > settings.prewarm_max_seconds_per_run:
+                    break
+
+            if time.time() - started > settings.prewarm_max_seconds_per_run:
+                summary['budget_exhausted'] = True
+                break
+
+            for row in rows[start:start + settings.prewarm_batch_size]:
+                try:
+                    summary['warmed_results'] += self.warm_user(
+                        db, row['user_id'], list(row['categories'] or [])
+                    )
+                    summary['warmed_users'] += 1
+                except Exception as e:
+                    db.rollback()
+                    print(f"⚠️  Pre-warm failed for {row['user_id']}: {e}")
+
+            time.sleep(settings.prewarm_batch_pause_seconds)
+
+        summary['duration_seconds'] = round(time.time() - started, 2)
+        return summary
+
+
+cache_prewarmer = PeriodicJob('Pre-warm pass', CachePrewarmer().run, settings.prewarm_interval_seconds)
@@ -0,0 +1,322 @@
+"""
+Pattern Change Feed Service
+Detects when a user's patterns, engagement risk level or streak actually
+change and appends compact events to pattern_change_events. The log is the
+source for the push stream: subscribers read it in id order, so they can
+resume from a Last-Event-ID and a slow reader never makes the service buffer
+events in memory.
+"""
+
+import asyncio
+import json
+import time
+from typing import Dict, List, Any, Optional, Set
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services.pattern_detector import PatternDetectionService
+from app.services.consistency_analyzer import ConsistencyAnalyzer
+from app.services.result_cache import result_cache
+from config.settings import settings
+
+
+def pattern_key(pattern: Dict[str, Any]) -> str:
+    """
+    Identity of a pattern that only moves on a real change: new/lost
+    patterns, a different peak hour, or a whole-number shift in weekly rate
+    """
+    if pattern['pattern_type'] == 'time_preference':
+        detail = pattern['peak_hour']
+    else:
+        detail = f"{round(pattern['frequency_per_week'])}x"
+    return f"{pattern['pattern_type']}:{pattern['category']}:{pattern['activity']}:{detail}"
+
+
+def coalesce(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge events per user (in id order) into one net change: patterns
+    added then removed cancel out, risk/streak keep the first 'from' and the
+    last 'to', and changes that net to nothing are dropped
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for event in events:
+        current = merged.get(event['user_id'])
+        if current is None:
+            merged[event['user_id']] = {
+                **event,
+                'changes': json.loads(json.dumps(event['changes'])),
+            }
+            continue
+
+        current['id'] = event['id']
+        current['created_at'] = event['created_at']
+        current['summary'] = event['summary']
+        for kind, change in event['changes'].items():
+            if kind == 'patterns':
+                net = current['changes'].setdefault('patterns', {'added': [], 'removed': []})
+                for key in change['added']:
+                    if key in net['removed']:
+                        net['removed'].remove(key)
+                    elif key not in net['added']:
+                        net['added'].append(key)
+                for key in change['removed']:
+                    if key in net['added']:
+                        net['added'].remove(key)
+                    elif key not in net['removed']:
+                        net['removed'].append(key)
+            elif kind in current['changes']:
+                current['changes'][kind]['to'] = change['to']
+            else:
+                current['changes'][kind] = dict(change)
+
+    results = []
+    for event in merged.values():
+        changes = event['changes']
+        if 'patterns' in changes and not (changes['patterns']['added'] or changes['patterns']['removed']):
+            del changes['patterns']
+        for kind in ('risk_level', 'streak'):
+            if kind in changes and changes[kind]['from'] == changes[kind]['to']:
+                del changes[kind]
+        if changes:
+            results.append(event)
+    return sorted(results, key=lambda e: e['id'])
+
+
+class PatternChangeTracker:
+    """Snapshot comparison for users with new activity; writes the event log"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def scan(self) -> Dict[str, Any]:
+        """
+        One scanner at a time across all workers: the others skip the round.
+        With a single writer, event ids also commit in increasing order, so
+        readers paging by id > cursor can't step over one still in flight
+        """
+        with self.db.get_bind().connect() as lock_conn:
+            # Session-level lock on a connection of its own: the scan
+            # commits per chunk, which would release a transaction lock
+            if not lock_conn.execute(text("SELECT pg_try_advisory_lock(hashtext('pattern_change_feed'))")).scalar():
+                return {'skipped': 'scan running in another worker'}
+            lock_conn.commit()
+            try:
+                return self._scan()
+            finally:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(hashtext('pattern_change_feed'))"))
+                lock_conn.commit()
+
+    def _scan(self) -> Dict[str, Any]:
+        started = time.time()
+        state = self.db.execute(text("""
+            SELECT watermark FROM change_feed_state WHERE feed_key = 'default'
+        """)).first()
+        # The very first scan only records baselines, so deploying the feed
+        # doesn't announce every existing pattern as new
+        baseline_only = state is None
+
+        queued = self._changed_users(baseline_only)
+        user_ids = list(queued)
+        summary = {'users': len(user_ids), 'events': 0, 'baseline': baseline_only}
+        for start in range(0, len(user_ids), settings.stream_scan_chunk_users):
+            chunk = user_ids[start:start + settings.stream_scan_chunk_users]
+            for user_id in chunk:
+                if self._check_user(user_id, emit=not baseline_only):
+                    summary['events'] += 1
+            # Dequeued with the snapshots they produced
+            self._dequeue({user_id: queued[user_id] for user_id in chunk if queued[user_id] is not None})
+            self.db.commit()
+
+        self.db.execute(text("""
+            INSERT INTO change_feed_state (feed_key, watermark, updated_at)
+            VALUES ('default', NOW(), NOW())
+            ON CONFLICT (feed_key) DO UPDATE SET watermark = NOW(), updated_at = NOW()
+        """))
+        self.db.execute(text("""
+            DELETE FROM pattern_change_events
+            WHERE created_at < NOW() - make_interval(hours => :hours)
+        """), {'hours': settings.stream_retention_hours})
+        self.db.commit()
+
+        summary['seconds'] = round(time.time() - started, 2)
+        return summary
+
+    def read_events(self, after_id: int, user_id: Optional[str] = None,
+                    limit: int = 100) -> List[Dict[str, Any]]:
+        query = """
+            SELECT id, user_id::text AS user_id, changes, summary, created_at
+            FROM pattern_change_events
+            WHERE id > :after_id
+        """
+        params = {'after_id': after_id, 'limit': limit}
+        if user_id:
+            query += " AND user_id = :user_id"
+            params['user_id'] = user_id
+        query += " ORDER BY id LIMIT :limit"
+        return [
+            {**row, 'created_at': row['created_at'].isoformat()}
+            for row in self.db.execute(text(query), params).mappings()
+        ]
+
+    def log_bounds(self) -> Dict[str, int]:
+        """Oldest retained and newest event ids (0 when the log is empty)"""
+        row = self.db.execute(text("""
+            SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM pattern_change_events
+        """)).first()
+        return {'oldest': row[0], 'latest': row[1]}
+
+    # Helper methods
+
+    def _changed_users(self, baseline: bool) -> Dict[str, Optional[int]]:
+        """
+        Users queued by the activity triggers (with the queue version read),
+        plus snapshots old enough for risk/streak to decay (version None).
+        The first scan also takes everyone active in the last 30 days
+        """
+        if baseline:
+            extra = """
+                SELECT DISTINCT user_id::text, NULL::bigint FROM metrics
+                WHERE user_id IS NOT NULL AND metric_date >= CURRENT_DATE - 30
+            """
+        else:
+            extra = """
+                SELECT user_id::text, NULL::bigint FROM pattern_snapshots
+                WHERE checked_at < NOW() - make_interval(hours => :max_age)
+            """
+        rows = self.db.execute(text("""
+            SELECT user_id::text, version FROM change_feed_queue
+            UNION ALL
+        """ + extra), {'max_age': settings.stream_snapshot_max_age_hours}).fetchall()
+
+        queued: Dict[str, Optional[int]] = {}
+        for user_id, version in rows:
+            if queued.get(user_id) is None:
+                queued[user_id] = version
+        return queued
+
+    def _dequeue(self, versions: Dict[str, int]) -> None:
+        """Drop queue entries that weren't bumped since they were read"""
+        if not versions:
+            return
+        self.db.execute(text("""
+            DELETE FROM change_feed_queue q
+            USING unnest(CAST(:user_ids AS UUID[]), CAST(:versions AS BIGINT[])) AS done(user_id, version)
+            WHERE q.user_id = done.user_id AND q.version = done.version
+        """), {'user_ids': list(versions), 'versions': list(versions.values())})
+
+    def _check_user(self, user_id: str, emit: bool) -> bool:
+        # Fresh results; also leaves the cache warm for anyone who pulls next
+        result_cache.invalidate(user_id)
+        patterns = PatternDetectionService(self.db).detect_all_patterns(user_id)
+        engagement = ConsistencyAnalyzer(self.db).calculate_engagement_score(user_id)
+        result_cache.set(result_cache.make_key('patterns', user_id), patterns)
+        result_cache.set(result_cache.make_key('engagement', user_id), engagement)
+
+        keys = sorted({pattern_key(p) for p in patterns['frequency_patterns'] + patterns['time_patterns']})
+        risk_level = engagement['risk_level']
+        streak = engagement['stats']['current_streak']
+
+        previous = self.db.execute(text("""
+            SELECT pattern_keys, risk_level, streak FROM pattern_snapshots WHERE user_id = :user_id
+        """), {'user_id': user_id}).mappings().first()
+
+        changes: Dict[str, Any] = {}
+        old_keys: Set[str] = set(previous['pattern_keys']) if previous else set()
+        if set(keys) != old_keys:
+            changes['patterns'] = {'added': sorted(set(keys) - old_keys),
+                                   'removed': sorted(old_keys - set(keys))}
+        if previous is None or previous['risk_level'] != risk_level:
+            changes['risk_level'] = {'from': previous['risk_level'] if previous else None, 'to': risk_level}
+        if previous is None or previous['streak'] != streak:
+            changes['streak'] = {'from': previous['streak'] if previous else None, 'to': streak}
+
+        self.db.execute(text("""
+            INSERT INTO pattern_snapshots (user_id, pattern_keys, risk_level, streak, checked_at)
+            VALUES (:user_id, CAST(:pattern_keys AS JSONB), :risk_level, :streak, NOW())
+            ON CONFLICT (user_id) DO UPDATE SET
+                pattern_keys = EXCLUDED.pattern_keys,
+                risk_level = EXCLUDED.risk_level,
+                streak = EXCLUDED.streak,
+                checked_at = NOW()
+        """), {'user_id': user_id, 'pattern_keys': json.dumps(keys),
+               'risk_level': risk_level, 'streak': streak})
+
+        if not changes or not emit:
+            return False
+        self.db.execute(text("""
+            INSERT INTO pattern_change_events (user_id, changes, summary)
+            VALUES (:user_id, CAST(:changes AS JSONB), CAST(:summary AS JSONB))
+        """), {'user_id': user_id, 'changes': json.dumps(changes), 'summary': json.dumps({
+            'pattern_count': len(keys),
+            'risk_level': risk_level,
+            'engagement_score': engagement['engagement_score'],
+            'streak': streak,
+        })})
+        return True
+
+
+class ChangeFeed:
+    """
+    Wakes stream subscribers when the tracker writes events. Subscribers
+    also re-check the log on a timer, so a missed wake-up only adds latency.
+    """
+
+    def __init__(self):
+        self.last_scan: Dict[str, Any] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+        self._task = None
+
+    async def wait(self, timeout: float) -> bool:
+        """True when woken by new events, False on timeout"""
+        if self._event is None:
+            self._loop = asyncio.get_running_loop()
+            self._event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def notify(self) -> None:
+        """Thread-safe: called from the scan thread"""
+        if self._loop is not None and self._event is not None:
+            self._loop.call_soon_threadsafe(self._pulse)
+
+    def _pulse(self) -> None:
+        # Release everyone currently waiting, then re-arm
+        self._event.set()
+        self._event = asyncio.Event()
+
+    def run_once(self) -> Dict[str, Any]:
+        from app.db.connection import SessionLocal
+
+        db = SessionLocal()
+        try:
+            self.last_scan = PatternChangeTracker(db).scan()
+        finally:
+            db.close()
+        if self.last_scan.get('events'):
+            self.notify()
+        return self.last_scan
+
+    async def run_forever(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"❌ Change feed scan failed: {e}")
+            await asyncio.sleep(settings.stream_scan_interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._event = asyncio.Event()
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+change_feed = ChangeFeed()
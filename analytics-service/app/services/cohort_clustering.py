@@ -0,0 +1,397 @@
+"""
+Behavioral Cohort Clustering Service
+Groups users into cohorts (morning exercisers, weekend-only loggers,
+finance-heavy, ...) from category mix, time-of-day and weekend share, and
+engagement components. Features are extracted in batched queries per chunk of
+users; a MiniBatchKMeans model is updated with partial_fit from users with new
+activity, so assignments move without a full refit. Lookups are a primary-key
+read of user_cohorts.
+"""
+
+import json
+import pickle
+import threading
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.exceptions import InconsistentVersionWarning
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services.consistency_analyzer import ConsistencyAnalyzer
+from app.services.user_time import user_timezones
+from app.services.periodic_job import PeriodicJob
+from config.settings import settings
+
+CATEGORIES = ['fitness', 'finance', 'health', 'mindfulness', 'routine', 'generic']
+HOUR_BLOCKS = ['night', 'early_morning', 'morning', 'afternoon', 'evening', 'late_evening']  # 4h each
+COMPONENTS = ['recency', 'frequency', 'streak', 'growth']
+
+FEATURES = ([f'category_{c}' for c in CATEGORIES] + ['category_other'] +
+            [f'hours_{b}' for b in HOUR_BLOCKS] + ['weekend_share'] +
+            [f'engagement_{c}' for c in COMPONENTS])
+
+_BLOCK_WORDS = {
+    'night': 'night-owl', 'early_morning': 'early-morning', 'morning': 'morning',
+    'afternoon': 'afternoon', 'evening': 'evening', 'late_evening': 'late-evening',
+}
+
+# One run at a time per process (scheduler and manual runs share the model row)
+_run_lock = threading.Lock()
+
+
+class CohortClusteringService:
+    """Batched feature extraction, incremental MiniBatchKMeans and cohort lookups"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.scorer = ConsistencyAnalyzer(db)
+
+    def get_user_cohort(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(text("""
+            SELECT uc.cluster_id, uc.distance, uc.features, uc.assigned_at,
+                   cc.label, cc.traits, cc.size
+            FROM user_cohorts uc
+            LEFT JOIN cohort_clusters cc ON cc.cluster_id = uc.cluster_id
+            WHERE uc.user_id = :user_id
+        """), {'user_id': user_id}).mappings().first()
+        if row is None:
+            return None
+        return {
+            'cohort_id': row['cluster_id'],
+            'label': row['label'],
+            'traits': row['traits'],
+            'cohort_size': row['size'],
+            'distance': round(row['distance'], 3),
+            'features': row['features'],
+            'assigned_at': row['assigned_at'].isoformat(),
+        }
+
+    def get_cohorts(self) -> List[Dict[str, Any]]:
+        rows = self.db.execute(text("""
+            SELECT cluster_id, label, traits, size, center, updated_at
+            FROM cohort_clusters
+            ORDER BY size DESC
+        """)).mappings().all()
+        return [{
+            'cohort_id': row['cluster_id'],
+            'label': row['label'],
+            'traits': row['traits'],
+            'size': row['size'],
+            'center': row['center'],
+            'updated_at': row['updated_at'].isoformat(),
+        } for row in rows]
+
+    def run(self, full: bool = False, user_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Incremental pass: users with activity since the last run (or stale
+        assignments) are featurized in chunks, folded into the model with
+        partial_fit and reassigned. full=True (or no stored model) fits a
+        fresh model over every active user and reassigns everyone.
+        With user_ids only those users are reassigned to the existing
+        centers: the shared model is not updated from a caller-chosen set of
+        users, and the watermark stays put so other users' activity is still
+        picked up by the next incremental pass. A stored model that no longer
+        unpickles (e.g. after an sklearn upgrade) counts as missing.
+        """
+        with _run_lock:
+            started = time.time()
+            model_row = self._load_model()
+            model = self._unpickle(model_row) if model_row else None
+            if model is None:
+                model_row = None
+            scoped = bool(user_ids) and not full
+            if scoped and model_row is None:
+                return {'mode': 'assign', 'users': 0, 'assigned': 0,
+                        'skipped': 'no usable cohort model yet'}
+            full = full or model_row is None
+            run_at = self.db.execute(text("SELECT NOW()")).scalar()
+
+            candidates = (self._active_users() if full
+                          else user_ids if scoped else self._changed_users(model_row['watermark']))
+            summary = {'mode': 'full' if full else 'assign' if scoped else 'incremental',
+                       'users': len(candidates), 'assigned': 0}
+            chunks = (self.extract_features(candidates[i:i + settings.cohort_chunk_users])
+                      for i in range(0, len(candidates), settings.cohort_chunk_users))
+
+            if full:
+                frames = [f for f in chunks if not f.empty]
+                features = pd.concat(frames) if frames else pd.DataFrame(columns=FEATURES)
+                if len(features) < settings.cohort_clusters:
+                    summary['skipped'] = 'not enough active users'
+                    return summary
+                model = MiniBatchKMeans(n_clusters=settings.cohort_clusters, random_state=0,
+                                        batch_size=settings.cohort_chunk_users, n_init=3)
+                model.fit(features.to_numpy())
+                n_samples = len(features)
+                self.db.execute(text("DELETE FROM user_cohorts"))
+                for frame in frames:
+                    summary['assigned'] += self._assign(model, frame)
+            elif scoped:
+                for features in chunks:
+                    if not features.empty:
+                        summary['assigned'] += self._assign(model, features)
+                self._refresh_cluster_sizes()
+                self.db.commit()
+                summary['seconds'] = round(time.time() - started, 2)
+                return summary
+            else:
+                n_samples = model_row['n_samples']
+                for features in chunks:
+                    if features.empty:
+                        continue
+                    model.partial_fit(features.to_numpy())
+                    n_samples += len(features)
+                    summary['assigned'] += self._assign(model, features)
+
+            self._save_model(model, n_samples, run_at, full)
+            self._save_clusters(model)
+            self.db.commit()
+
+            summary['seconds'] = round(time.time() - started, 2)
+            return summary
+
+    def extract_features(self, user_ids: List[str]) -> pd.DataFrame:
+        """
+        One row per user (index user_id), columns FEATURES, all in [0, 1]
+        Hours, weekdays and day ages are local: each user's zone is joined
+        in as a parameter array, so the chunk still takes two queries
+        """
+        zones = user_timezones.get_many(self.db, user_ids)
+        params = {'user_ids': list(zones), 'timezones': list(zones.values()),
+                  'days': settings.cohort_history_days}
+
+        activity = pd.read_sql(text("""
+            SELECT m.user_id::text AS user_id, m.category,
+                   EXTRACT(HOUR FROM m.created_at AT TIME ZONE z.tz)::int AS hour,
+                   EXTRACT(ISODOW FROM m.created_at AT TIME ZONE z.tz)::int AS dow,
+                   COUNT(*) AS events
+            FROM memory_units m
+            JOIN UNNEST(CAST(:user_ids AS UUID[]), CAST(:timezones AS TEXT[])) AS z(user_id, tz)
+              ON z.user_id = m.user_id
+            WHERE m.status = 'validated'
+              AND m.created_at >= NOW() - make_interval(days => :days)
+            GROUP BY 1, 2, 3, 4
+        """), self.db.read_bind, params=params)
+
+        # age = local days before the user's local today
+        daily = pd.read_sql(text("""
+            SELECT m.user_id::text AS user_id,
+                   DATE(NOW() AT TIME ZONE z.tz) - DATE(m.created_at AT TIME ZONE z.tz) AS age,
+                   COUNT(*) AS events
+            FROM metrics m
+            JOIN UNNEST(CAST(:user_ids AS UUID[]), CAST(:timezones AS TEXT[])) AS z(user_id, tz)
+              ON z.user_id = m.user_id
+            WHERE m.metric_date >= CURRENT_DATE - 92
+              AND DATE(m.created_at AT TIME ZONE z.tz) >= DATE(NOW() AT TIME ZONE z.tz) - 90
+            GROUP BY 1, 2
+        """), self.db.read_bind, params=params)
+
+        users = pd.Index(sorted(set(activity['user_id']) | set(daily['user_id'])), name='user_id')
+        if users.empty:
+            return pd.DataFrame(columns=FEATURES)
+
+        features = pd.DataFrame(0.0, index=users, columns=FEATURES)
+        if not activity.empty:
+            totals = activity.groupby('user_id')['events'].sum()
+
+            category = activity['category'].where(activity['category'].isin(CATEGORIES), 'other')
+            mix = activity.groupby(['user_id', category])['events'].sum().unstack(fill_value=0)
+            for c in mix.columns:
+                features.loc[mix.index, f'category_{c}'] = mix[c] / totals[mix.index]
+
+            block = (activity['hour'] // 4).map(dict(enumerate(HOUR_BLOCKS)))
+            hours = activity.groupby(['user_id', block])['events'].sum().unstack(fill_value=0)
+            for b in hours.columns:
+                features.loc[hours.index, f'hours_{b}'] = hours[b] / totals[hours.index]
+
+            weekend = activity[activity['dow'] >= 6].groupby('user_id')['events'].sum()
+            features.loc[weekend.index, 'weekend_share'] = weekend / totals[weekend.index]
+
+        components = self._engagement_components(daily, users)
+        for c in COMPONENTS:
+            features[f'engagement_{c}'] = components[c] / 100
+        return features
+
+    # Helper methods
+
+    def _engagement_components(self, daily: pd.DataFrame, users: pd.Index) -> pd.DataFrame:
+        """
+        Same scoring as ConsistencyAnalyzer.calculate_engagement_score, for
+        many users at once. An N-day window is ages 0..N-1, today included
+        """
+        stats = pd.DataFrame(index=users)
+        if daily.empty:
+            stats['days_since_last'], stats['events_7d'], stats['events_30d'], stats['streak'] = 999, 0, 0, 0
+        else:
+            grouped = daily.groupby('user_id')
+            stats['days_since_last'] = grouped['age'].min().reindex(users).fillna(999).astype(int)
+            stats['events_7d'] = daily[daily['age'] < 7].groupby('user_id')['events'].sum().reindex(users).fillna(0)
+            stats['events_30d'] = daily[daily['age'] < 30].groupby('user_id')['events'].sum().reindex(users).fillna(0)
+            stats['streak'] = grouped['age'].apply(self._streak).reindex(users).fillna(0).astype(int)
+
+        return pd.DataFrame({
+            'recency': stats['days_since_last'].map(self.scorer._score_recency),
+            'frequency': stats['events_7d'].map(self.scorer._score_frequency),
+            'streak': stats['streak'].map(self.scorer._score_streak),
+            'growth': [self.scorer._score_growth(e7, e30)
+                       for e7, e30 in zip(stats['events_7d'], stats['events_30d'])],
+        }, index=users)
+
+    @staticmethod
+    def _streak(ages: pd.Series) -> int:
+        """Consecutive logged days ending today or yesterday"""
+        ages = np.sort(ages.to_numpy())
+        if ages[0] > 1:
+            return 0
+        breaks = np.flatnonzero(np.diff(ages) != 1)
+        return int(breaks[0] + 1) if breaks.size else int(ages.size)
+
+    def _active_users(self) -> List[str]:
+        return [r[0] for r in self.db.execute(text("""
+            SELECT user_id::text FROM memory_units
+            WHERE status = 'validated' AND created_at >= NOW() - make_interval(days => :days)
+            UNION
+            SELECT user_id::text FROM metrics
+            WHERE user_id IS NOT NULL AND metric_date >= CURRENT_DATE - :days
+        """), {'days': settings.cohort_history_days})]
+
+    def _changed_users(self, since: datetime) -> List[str]:
+        """New activity since the last run, plus assignments old enough for recency to have moved"""
+        return [r[0] for r in self.db.execute(text("""
+            SELECT user_id::text FROM memory_units
+            WHERE created_at > :since AND status = 'validated'
+            UNION
+            SELECT user_id::text FROM metrics
+            WHERE created_at > :since AND user_id IS NOT NULL
+            UNION
+            SELECT user_id::text FROM user_cohorts
+            WHERE assigned_at < NOW() - make_interval(hours => :max_age)
+        """), {'since': since, 'max_age': settings.cohort_max_assignment_age_hours})]
+
+    def _assign(self, model: MiniBatchKMeans, features: pd.DataFrame) -> int:
+        distances = model.transform(features.to_numpy())
+        labels = distances.argmin(axis=1)
+        rows = [{
+            'user_id': user_id,
+            'cluster_id': int(label),
+            'distance': float(distances[i, label]),
+            'features': json.dumps({f: round(float(v), 4) for f, v in features.iloc[i].items()}),
+        } for i, (user_id, label) in enumerate(zip(features.index, labels))]
+
+        self.db.execute(text("""
+            INSERT INTO user_cohorts (user_id, cluster_id, distance, features, assigned_at)
+            VALUES (:user_id, :cluster_id, :distance, CAST(:features AS JSONB), NOW())
+            ON CONFLICT (user_id) DO UPDATE SET
+                cluster_id = EXCLUDED.cluster_id,
+                distance = EXCLUDED.distance,
+                features = EXCLUDED.features,
+                assigned_at = NOW()
+        """), rows)
+        return len(rows)
+
+    @staticmethod
+    def _describe(center: np.ndarray) -> Dict[str, Any]:
+        """Human label from the dominant traits of a cluster center"""
+        values = dict(zip(FEATURES, center))
+        traits = []
+
+        block = max(HOUR_BLOCKS, key=lambda b: values[f'hours_{b}'])
+        if values[f'hours_{block}'] >= 0.4:
+            traits.append(_BLOCK_WORDS[block])
+
+        category = max(CATEGORIES, key=lambda c: values[f'category_{c}'])
+        if values[f'category_{category}'] >= 0.4:
+            traits.append(f'{category}-heavy')
+
+        if values['weekend_share'] >= 0.6:
+            traits.append('weekend-only')
+        elif values['weekend_share'] <= 0.1 and sum(values[f'hours_{b}'] for b in HOUR_BLOCKS) > 0:
+            traits.append('weekday-only')
+
+        engagement = (values['engagement_recency'] * 0.4 + values['engagement_frequency'] * 0.3 +
+                      values['engagement_streak'] * 0.2 + values['engagement_growth'] * 0.1)
+        if engagement >= 0.7:
+            traits.append('highly engaged')
+        elif engagement < 0.25:
+            traits.append('lapsing')
+
+        return {
+            'label': ', '.join(traits) if traits else 'mixed',
+            'traits': traits,
+            'engagement': round(float(engagement) * 100),
+        }
+
+    @staticmethod
+    def _unpickle(model_row: Dict[str, Any]) -> Optional[MiniBatchKMeans]:
+        """Stored model, or None when it can't be used as is (a refit follows)"""
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', InconsistentVersionWarning)
+                model = pickle.loads(model_row['model'])
+            if getattr(model, 'n_features_in_', None) != len(FEATURES):
+                raise ValueError('feature layout changed')
+            return model
+        except Exception as e:
+            print(f"⚠️  Stored cohort model unusable, refitting: {e}")
+            return None
+
+    def _load_model(self) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(text("""
+            SELECT model, n_samples, watermark FROM cohort_model
+            WHERE model_key = 'default'
+        """)).mappings().first()
+        return dict(row) if row else None
+
+    def _save_model(self, model: MiniBatchKMeans, n_samples: int, watermark: datetime, full: bool) -> None:
+        self.db.execute(text("""
+            INSERT INTO cohort_model (model_key, model, feature_names, n_samples, watermark, fitted_at, updated_at)
+            VALUES ('default', :model, CAST(:feature_names AS JSONB), :n_samples, :watermark, NOW(), NOW())
+            ON CONFLICT (model_key) DO UPDATE SET
+                model = EXCLUDED.model,
+                feature_names = EXCLUDED.feature_names,
+                n_samples = EXCLUDED.n_samples,
+                watermark = EXCLUDED.watermark,
+                fitted_at = CASE WHEN :full THEN NOW() ELSE cohort_model.fitted_at END,
+                updated_at = NOW()
+        """), {'model': pickle.dumps(model), 'feature_names': json.dumps(FEATURES),
+               'n_samples': n_samples, 'watermark': watermark, 'full': full})
+
+    def _save_clusters(self, model: MiniBatchKMeans) -> None:
+        rows = []
+        for cluster_id, center in enumerate(model.cluster_centers_):
+            description = self._describe(center)
+            rows.append({
+                'cluster_id': cluster_id,
+                'label': description['label'],
+                'traits': json.dumps(description),
+                'center': json.dumps({f: round(float(v), 4) for f, v in zip(FEATURES, center)}),
+            })
+
+        self.db.execute(text("DELETE FROM cohort_clusters WHERE cluster_id >= :n"), {'n': len(rows)})
+        self.db.execute(text("""
+            INSERT INTO cohort_clusters (cluster_id, label, traits, center, size, updated_at)
+            VALUES (:cluster_id, :label, CAST(:traits AS JSONB), CAST(:center AS JSONB), 0, NOW())
+            ON CONFLICT (cluster_id) DO UPDATE SET
+                label = EXCLUDED.label,
+                traits = EXCLUDED.traits,
+                center = EXCLUDED.center,
+                updated_at = NOW()
+        """), rows)
+        self._refresh_cluster_sizes()
+
+    def _refresh_cluster_sizes(self) -> None:
+        self.db.execute(text("""
+            UPDATE cohort_clusters cc SET size = COALESCE(s.size, 0)
+            FROM cohort_clusters c
+            LEFT JOIN (SELECT cluster_id, COUNT(*) AS size FROM user_cohorts GROUP BY cluster_id) s
+                ON s.cluster_id = c.cluster_id
+            WHERE cc.cluster_id = c.cluster_id
+        """))
+
+
+cohort_scheduler = PeriodicJob('Cohort job', lambda db: CohortClusteringService(db).run(),
+                               settings.cohort_interval_seconds)
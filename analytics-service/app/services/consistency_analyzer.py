@@ -1,12 +1,16 @@
 """
 Consistency Analysis Service
 Calculates consistency scores, streaks, and engagement metrics
+Days and hours are local to the user (metrics.created_at in users.timezone);
+metric_date is a UTC date, so it only narrows index ranges here
 """
 
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from datetime import timedelta
+from typing import Dict, List, Any, Optional
 from sqlalchemy.orm import Session
+from app.services.activity_sketches import ActivitySketchStore, UNKNOWN_HOUR
+from app.services.user_time import user_timezones, local_today
 
 class ConsistencyAnalyzer:
     """Analyzes user activity consistency and engagement"""
@@ -67,24 +71,17 @@ class ConsistencyAnalyzer:
             }
         }
     
-    def calculate_category_consistency(self, user_id: str, category: str) -> Dict[str, Any]:
-        """Calculate consistency for specific category"""
-        from sqlalchemy import text
-        
-        query = text("""
-            SELECT 
-                metric_date,
-                COUNT(*) as event_count,
-                EXTRACT(HOUR FROM metric_time) as hour
-            FROM metrics
-            WHERE user_id = :user_id
-              AND category = :category
-              AND metric_date >= NOW() - INTERVAL '30 days'
-            GROUP BY metric_date, EXTRACT(HOUR FROM metric_time)
-            ORDER BY metric_date
-        """)
-        
-        df = pd.read_sql(query, self.db.bind, params={'user_id': user_id, 'category': category})
+    def calculate_category_consistency(self, user_id: str, category: str,
+                                       window_days: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Calculate consistency for specific category
+        window_days reads merged weekly sketches instead of raw rows
+        """
+        if window_days:
+            store = ActivitySketchStore(self.db)
+            df = self._sketch_day_hour_counts(store, user_id, window_days, category)
+        else:
+            df = self._query_day_hour_counts(user_id, category)
         
         if df.empty:
             return {
@@ -93,7 +90,7 @@ class ConsistencyAnalyzer:
             }
         
         # Calculate consistency metrics
-        total_days = 30
+        total_days = window_days or 30
         active_days = len(df['metric_date'].unique())
         frequency = active_days / total_days
         
@@ -111,7 +108,7 @@ class ConsistencyAnalyzer:
             regularity * 0.3
         ) * 100
         
-        return {
+        result = {
             'consistency_score': round(consistency_score),
             'active_days': active_days,
             'total_days': total_days,
@@ -120,65 +117,74 @@ class ConsistencyAnalyzer:
             'regularity': round(regularity * 100),
             'has_data': True
         }
-
         
-        if df.empty:
-            return {
-                'consistency_score': 0,
-                'has_data': False
-            }
-        
-        # Calculate consistency metrics
-        total_days = 30
-        active_days = len(df['metric_date'].unique())
-        frequency = active_days / total_days
+        if window_days:
+            result['window_days'] = window_days
+            result['metric_values'] = store.value_stats(user_id, window_days, category)
         
-        # Time consistency (std dev of hour)
-        time_variance = df['hour'].std() if len(df) > 1 else 0
-        time_consistency = max(0, 100 - (time_variance * 10))
-        
-        # Regularity (how evenly distributed)
-        regularity = self._calculate_regularity(df)
+        return result
+    
+    def _query_day_hour_counts(self, user_id: str, category: str) -> pd.DataFrame:
+        """Per (local date, local hour) counts for the last 30 days"""
+        from sqlalchemy import text
         
-        # Overall consistency score
-        consistency_score = (
-            frequency * 0.4 +
-            (time_consistency / 100) * 0.3 +
-            regularity * 0.3
-        ) * 100
+        query = text("""
+            SELECT 
+                DATE(created_at AT TIME ZONE :tz) as metric_date,
+                COUNT(*) as event_count,
+                EXTRACT(HOUR FROM created_at AT TIME ZONE :tz) as hour
+            FROM metrics
+            WHERE user_id = :user_id
+              AND category = :category
+              AND created_at >= NOW() - INTERVAL '30 days'
+            GROUP BY 1, 3
+            ORDER BY 1
+        """)
         
-        return {
-            'consistency_score': round(consistency_score),
-            'active_days': active_days,
-            'total_days': total_days,
-            'frequency_rate': round(frequency * 100, 1),
-            'time_consistency': round(time_consistency),
-            'regularity': round(regularity * 100),
-            'has_data': True
-        }
+        params = {'user_id': user_id, 'category': category, 'tz': user_timezones.get(self.db, user_id)}
+        return pd.read_sql(query, self.db.read_bind, params=params)
     
-    def detect_gaps(self, user_id: str, category: str = None) -> List[Dict[str, Any]]:
+    def _sketch_day_hour_counts(self, store: ActivitySketchStore, user_id: str,
+                                days: int, category: Optional[str]) -> pd.DataFrame:
+        """Same shape as _query_day_hour_counts, rebuilt from weekly sketches"""
+        cells = store.load_cells(user_id, 'metric', days, category)
+        df = cells.groupby(['date', 'hour'], as_index=False)['count'].sum()
+        df = df.rename(columns={'date': 'metric_date', 'count': 'event_count'})
+        df['metric_date'] = df['metric_date'].dt.date
+        df['hour'] = df['hour'].where(df['hour'] != UNKNOWN_HOUR).astype(float)
+        return df
+    
+    def detect_gaps(self, user_id: str, category: str = None,
+                    window_days: Optional[int] = None) -> List[Dict[str, Any]]:
         """Detect gaps in activity (missed days/weeks)"""
         from sqlalchemy import text
         
+        if window_days:
+            cells = ActivitySketchStore(self.db).load_cells(user_id, 'metric', window_days, category)
+            df = pd.DataFrame({'metric_date': sorted(cells['date'].unique(), reverse=True)})
+            return self._gaps_from_dates(df)
+        
         query = text("""
-            SELECT DISTINCT metric_date
+            SELECT DISTINCT DATE(created_at AT TIME ZONE :tz) AS metric_date
             FROM metrics
             WHERE user_id = :user_id
         """)
-        params = {'user_id': user_id}
+        params = {'user_id': user_id, 'tz': user_timezones.get(self.db, user_id)}
         
         if category:
             query = text("""
-                SELECT DISTINCT metric_date
+                SELECT DISTINCT DATE(created_at AT TIME ZONE :tz) AS metric_date
                 FROM metrics
                 WHERE user_id = :user_id AND category = :category
             """)
             params['category'] = category
         
         query_str = str(query) + " ORDER BY metric_date DESC LIMIT 90"
-        df = pd.read_sql(text(query_str), self.db.bind, params=params)
-        
+        df = pd.read_sql(text(query_str), self.db.read_bind, params=params)
+        return self._gaps_from_dates(df)
+    
+    def _gaps_from_dates(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Gaps between consecutive activity dates (df sorted newest first)"""
         if df.empty:
             return []
         
@@ -202,49 +208,58 @@ class ConsistencyAnalyzer:
     # Helper methods
     
     def _get_days_since_last_event(self, user_id: str) -> int:
-        """Get days since last activity"""
+        """Get local days since last activity"""
         from sqlalchemy import text
         
         query = text("""
-            SELECT EXTRACT(days FROM (NOW() - MAX(metric_date)))::int as days
+            SELECT DATE(NOW() AT TIME ZONE :tz) - MAX(DATE(created_at AT TIME ZONE :tz)) as days
             FROM metrics
             WHERE user_id = :user_id
         """)
-        result = self.db.execute(query, {'user_id': user_id}).fetchone()
+        tz = user_timezones.get(self.db, user_id)
+        # Same source as the streak query, so the three agree
+        with self.db.read_bind.connect() as conn:
+            result = conn.execute(query, {'user_id': user_id, 'tz': tz}).fetchone()
         return result[0] if result and result[0] is not None else 999
     
     def _get_event_count(self, user_id: str, days: int) -> int:
-        """Get event count for last N days"""
+        """Get event count for the last N local days (today included)"""
         from sqlalchemy import text
         
         query = text("""
             SELECT COUNT(*)
             FROM metrics
             WHERE user_id = :user_id
-              AND metric_date >= NOW() - INTERVAL ':days days'
+              AND metric_date >= CAST(:start AS DATE) - 1
+              AND DATE(created_at AT TIME ZONE :tz) >= :start
         """)
-        result = self.db.execute(query, {'user_id': user_id, 'days': days}).fetchone()
+        tz = user_timezones.get(self.db, user_id)
+        start = local_today(tz) - timedelta(days=days - 1)
+        with self.db.read_bind.connect() as conn:
+            result = conn.execute(query, {'user_id': user_id, 'start': start, 'tz': tz}).fetchone()
         return result[0] if result else 0
     
     def _get_current_streak(self, user_id: str) -> int:
-        """Calculate current logging streak"""
+        """Calculate current logging streak in local days"""
         from sqlalchemy import text
         
         query = text("""
-            SELECT DISTINCT metric_date
+            SELECT DISTINCT DATE(created_at AT TIME ZONE :tz) AS metric_date
             FROM metrics
             WHERE user_id = :user_id
             ORDER BY metric_date DESC
             LIMIT 90
         """)
-        df = pd.read_sql(query, self.db.bind, params={'user_id': user_id})
+        tz = user_timezones.get(self.db, user_id)
+        df = pd.read_sql(query, self.db.read_bind, params={'user_id': user_id, 'tz': tz})
         
         if df.empty:
             return 0
         
-        dates = pd.to_datetime(df['metric_date']).dt.date
-        today = datetime.now().date()
-        
+        return self._streak_from_dates(pd.to_datetime(df['metric_date']).dt.date, local_today(tz))
+    
+    def _streak_from_dates(self, dates: pd.Series, today) -> int:
+        """Consecutive days ending today or yesterday (dates distinct, newest first)"""
         # Check if logged today or yesterday
         if dates.iloc[0] not in [today, today - timedelta(days=1)]:
             return 0
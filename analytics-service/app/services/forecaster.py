@@ -0,0 +1,398 @@
+"""
+Forecasting Service
+Next-7-day activity counts and metric totals per user x category with
+prediction intervals. Parameters are fitted in batched jobs over a process
+pool (statsmodels Holt-Winters), persisted with the smoothing state, and
+rolled forward day by day without refitting; requests only read the stored
+forecast.
+"""
+
+import json
+import multiprocessing
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Any, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services.periodic_job import PeriodicJob
+from config.settings import settings
+
+SEASON = 7
+
+_DEFAULT_PARAMS = {
+    'smoothing_level': 0.3,
+    'smoothing_trend': 0.0,
+    'smoothing_seasonal': 0.0,
+    'damping_trend': 1.0,
+}
+
+
+# Model math (module-level so process-pool workers can import it)
+
+def _initial_state(y: np.ndarray, start: date, seasonal: bool) -> Dict[str, Any]:
+    head = y[:SEASON]
+    level = float(head.mean()) if head.size else 0.0
+    season = [0.0] * SEASON
+    if seasonal:
+        for i, v in enumerate(head):
+            season[(start + timedelta(days=i)).weekday()] = float(v) - level
+    return {'level': level, 'trend': 0.0, 'season': season}
+
+
+def _advance(params: Dict[str, float], state: Dict[str, Any], y: np.ndarray,
+             start: date) -> List[float]:
+    """
+    Error-correction form of additive damped Holt-Winters, seasonal terms
+    indexed by weekday. Mutates state, returns one-step-ahead errors.
+    """
+    alpha = params['smoothing_level']
+    beta = params['smoothing_trend']
+    gamma = params['smoothing_seasonal']
+    phi = params['damping_trend']
+    level, trend, season = state['level'], state['trend'], state['season']
+
+    errors = []
+    for i, value in enumerate(y):
+        wd = (start + timedelta(days=i)).weekday()
+        err = float(value) - (level + phi * trend + season[wd])
+        level = level + phi * trend + alpha * err
+        trend = phi * trend + alpha * beta * err
+        season[wd] = season[wd] + gamma * err
+        errors.append(err)
+
+    state['level'], state['trend'], state['season'] = level, trend, season
+    return errors
+
+
+def _forecast(params: Dict[str, float], state: Dict[str, Any], sigma2: float,
+              last_date: date, horizon: int) -> List[Dict[str, Any]]:
+    """Point forecasts with 95% intervals from the ETS(A,Ad,A) variance formula"""
+    alpha = params['smoothing_level']
+    beta = params['smoothing_trend']
+    gamma = params['smoothing_seasonal']
+    phi = params['damping_trend']
+
+    days = []
+    phi_sum = 0.0
+    var_factor = 1.0
+    for h in range(1, horizon + 1):
+        target = last_date + timedelta(days=h)
+        phi_sum += phi ** h
+        mean = state['level'] + phi_sum * state['trend'] + state['season'][target.weekday()]
+        if h > 1:
+            j = h - 1
+            phi_j = sum(phi ** k for k in range(1, j + 1))
+            c_j = alpha + alpha * beta * phi_j + (gamma if j % SEASON == 0 else 0.0)
+            var_factor += c_j ** 2
+        half = 1.96 * np.sqrt(max(sigma2, 0.0) * var_factor)
+        days.append({
+            'date': str(target),
+            'mean': round(max(mean, 0.0), 2),
+            'lower': round(max(mean - half, 0.0), 2),
+            'upper': round(max(mean + half, 0.0), 2),
+        })
+    return days
+
+
+def _fitted_param(fitted: Dict[str, Any], name: str, default: float) -> float:
+    value = fitted.get(name)
+    if value is None or not np.isfinite(value):
+        return default
+    return float(value)
+
+
+def _fitted_state(fit, start: date, seasonal: bool) -> Dict[str, Any]:
+    """Estimated initial level, trend and seasonals (the state before the first day)"""
+    season = [0.0] * SEASON
+    if seasonal:
+        for i, v in enumerate(fit.params['initial_seasons']):
+            season[(start + timedelta(days=i)).weekday()] = float(v)
+    state = {
+        'level': float(fit.params['initial_level']),
+        'trend': float(fit.params['initial_trend']),
+        'season': season,
+    }
+    if not np.all(np.isfinite([state['level'], state['trend'], *season])):
+        raise ValueError('non-finite initial state')
+    return state
+
+
+def fit_series(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fit one series (inline or in a worker process). The stored state is
+    statsmodels' own: its estimated initial states run through the same
+    recursion, so the stored forecast equals fit.forecast()
+    """
+    y = np.asarray(payload['values'], dtype=float)
+    start = date.fromisoformat(payload['start'])
+    seasonal = y.size >= 3 * SEASON
+    params = dict(_DEFAULT_PARAMS)
+    method = 'simple_exponential_smoothing'
+    state = None
+
+    if y.size >= settings.forecast_min_days and np.ptp(y) > 0:
+        try:
+            from statsmodels.tsa.holtwinters import ExponentialSmoothing
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                fit = ExponentialSmoothing(
+                    y,
+                    trend='add',
+                    damped_trend=True,
+                    seasonal='add' if seasonal else None,
+                    seasonal_periods=SEASON if seasonal else None,
+                    initialization_method='estimated',
+                ).fit()
+            params = {
+                name: _fitted_param(fit.params, name, default)
+                for name, default in _DEFAULT_PARAMS.items()
+            }
+            if not seasonal:
+                params['smoothing_seasonal'] = 0.0
+            state = _fitted_state(fit, start, seasonal)
+            method = 'holt_winters_damped' + ('_seasonal' if seasonal else '')
+        except Exception:
+            params, state = dict(_DEFAULT_PARAMS), None
+
+    if state is None:
+        state = _initial_state(y, start, seasonal)
+    errors = np.asarray(_advance(params, state, y, start))
+    settled = errors[SEASON:] if errors.size > 2 * SEASON else errors
+    sigma2 = float(np.mean(settled ** 2)) if settled.size else 0.0
+
+    return {
+        **payload['key'],
+        'method': method,
+        'params': params,
+        'state': state,
+        'sigma2': sigma2,
+        'n_obs': int(y.size),
+        'last_date': str(start + timedelta(days=int(y.size) - 1)),
+    }
+
+
+class ForecastService:
+    """Batched fitting, incremental updates and stored-forecast lookups"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_forecasts(self, user_id: str, category: Optional[str] = None,
+                      target: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Serving path: a single indexed read of stored forecasts"""
+        query = """
+            SELECT category, target, unit, method, last_date, fitted_at, updated_at, forecast
+            FROM forecast_models
+            WHERE user_id = :user_id
+        """
+        params = {'user_id': user_id}
+        if category:
+            query += " AND category = :category"
+            params['category'] = category
+        if target:
+            query += " AND target = :target"
+            params['target'] = target
+        query += " ORDER BY category, target, unit"
+
+        results = []
+        for row in self.db.execute(text(query), params).mappings():
+            days = row['forecast'] or []
+            results.append({
+                'category': row['category'],
+                'target': row['target'],
+                'unit': row['unit'] or None,
+                'method': row['method'],
+                'as_of': str(row['last_date']),
+                'fitted_at': row['fitted_at'].isoformat() if row['fitted_at'] else None,
+                'days': days,
+                'horizon_total': round(sum(d['mean'] for d in days), 2),
+            })
+        return results
+
+    def run(self, user_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        One batch pass: roll existing models forward over new days, refit the
+        stale or missing ones, store fresh forecasts, and drop models whose
+        series no longer has enough active days. Fits go to a process pool
+        only when a chunk has more than FORECAST_INLINE_MAX_FITS of them; the
+        pool is started on first use and shared by the rest of the run.
+        """
+        started = time.time()
+        end = self.db.execute(text("SELECT CURRENT_DATE - 1")).scalar()  # last complete day
+        start = end - timedelta(days=settings.forecast_history_days - 1)
+
+        if user_ids is None:
+            # Users with stored models but no recent activity are included so
+            # their forecasts get dropped
+            user_ids = [r[0] for r in self.db.execute(text("""
+                SELECT DISTINCT user_id::text FROM metric_daily_aggregates
+                WHERE bucket_date >= :start
+                UNION
+                SELECT DISTINCT user_id::text FROM forecast_models
+            """), {'start': start})]
+
+        summary = {'users': len(user_ids), 'fitted': 0, 'updated': 0, 'unchanged': 0, 'dropped': 0}
+        pool = None
+        try:
+            chunk = settings.forecast_chunk_users
+            for i in range(0, len(user_ids), chunk):
+                batch = user_ids[i:i + chunk]
+                series = self._load_series(batch, start, end)
+                models = self._load_models(batch)
+
+                to_fit, to_update = [], []
+                for key, (first, values) in series.items():
+                    model = models.get(key)
+                    if model is None or self._needs_refit(model, end):
+                        to_fit.append({'key': dict(zip(('user_id', 'category', 'target', 'unit'), key)),
+                                       'start': str(first), 'values': values})
+                    elif model['last_date'] < end:
+                        to_update.append((model, first, values))
+                    else:
+                        summary['unchanged'] += 1
+
+                if len(to_fit) > settings.forecast_inline_max_fits:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(max_workers=settings.forecast_workers,
+                                                   mp_context=multiprocessing.get_context('spawn'))
+                    results = pool.map(fit_series, to_fit, chunksize=16)
+                else:
+                    results = map(fit_series, to_fit)
+
+                for fitted in results:
+                    fitted['last_date'] = date.fromisoformat(fitted['last_date'])
+                    self._save_model(fitted, refitted=True)
+                    summary['fitted'] += 1
+
+                for model, first, values in to_update:
+                    self._roll_forward(model, first, values)
+                    self._save_model(model, refitted=False)
+                    summary['updated'] += 1
+
+                # Below FORECAST_MIN_ACTIVE_DAYS (or no activity at all): an
+                # old forecast would otherwise be served indefinitely
+                summary['dropped'] += self._drop_models([key for key in models if key not in series])
+                self.db.commit()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        summary['duration_seconds'] = round(time.time() - started, 2)
+        return summary
+
+    # Helper methods
+
+    def _load_series(self, user_ids: List[str], start: date, end: date) -> Dict[tuple, tuple]:
+        """Zero-filled daily count and total series from the bucket aggregates"""
+        df = pd.read_sql(text("""
+            SELECT user_id::text AS user_id, category, unit, bucket_date,
+                   SUM(event_count) AS events, SUM(value_sum) AS total, SUM(value_count) AS value_count
+            FROM metric_daily_aggregates
+            WHERE user_id = ANY(CAST(:user_ids AS UUID[]))
+              AND bucket_date BETWEEN :start AND :end
+            GROUP BY user_id, category, unit, bucket_date
+        """), self.db.read_bind, params={'user_ids': user_ids, 'start': start, 'end': end})
+
+        if df.empty:
+            return {}
+
+        df['bucket_date'] = pd.to_datetime(df['bucket_date'])
+        for col in ('events', 'total', 'value_count'):
+            df[col] = pd.to_numeric(df[col])
+
+        counts = df.groupby(['user_id', 'category', 'bucket_date'])['events'].sum()
+        counts.index = pd.MultiIndex.from_tuples(
+            [(u, c, 'count', '', d) for u, c, d in counts.index])
+        totals = df[df['value_count'] > 0].groupby(['user_id', 'category', 'unit', 'bucket_date'])['total'].sum()
+        totals.index = pd.MultiIndex.from_tuples(
+            [(u, c, 'total', unit, d) for u, c, unit, d in totals.index])
+
+        series = {}
+        for key, s in pd.concat([counts, totals]).groupby(level=[0, 1, 2, 3]):
+            s = s.droplevel([0, 1, 2, 3])
+            if (s > 0).sum() < settings.forecast_min_active_days:
+                continue
+            # Start at the series' first active day, zero-fill through `end`
+            idx = pd.date_range(s.index.min(), end, freq='D')
+            filled = s.reindex(idx, fill_value=0.0).astype(float)
+            series[key] = (idx[0].date(), filled.tolist())
+        return series
+
+    def _load_models(self, user_ids: List[str]) -> Dict[tuple, Dict[str, Any]]:
+        rows = self.db.execute(text("""
+            SELECT user_id::text AS user_id, category, target, unit, method, params, state,
+                   sigma2, n_obs, last_date, fitted_at
+            FROM forecast_models
+            WHERE user_id = ANY(CAST(:user_ids AS UUID[]))
+        """), {'user_ids': user_ids}).mappings()
+        return {(r['user_id'], r['category'], r['target'], r['unit']): dict(r) for r in rows}
+
+    def _drop_models(self, keys: List[tuple]) -> int:
+        if not keys:
+            return 0
+        self.db.execute(text("""
+            DELETE FROM forecast_models
+            WHERE user_id = :user_id AND category = :category AND target = :target AND unit = :unit
+        """), [dict(zip(('user_id', 'category', 'target', 'unit'), key)) for key in keys])
+        return len(keys)
+
+    def _needs_refit(self, model: Dict[str, Any], end: date) -> bool:
+        fitted_on = model['fitted_at'].date() if model['fitted_at'] else date.min
+        return (end - fitted_on).days >= settings.forecast_refit_days
+
+    def _roll_forward(self, model: Dict[str, Any], first: date, values: List[float]) -> None:
+        """Feed only the days after last_date through the stored recursion"""
+        offset = (model['last_date'] - first).days + 1
+        new = np.asarray(values[max(offset, 0):], dtype=float)
+        if not new.size:
+            return
+        errors = np.asarray(_advance(model['params'], model['state'], new,
+                                     model['last_date'] + timedelta(days=1)))
+        n = model['n_obs']
+        model['sigma2'] = float((model['sigma2'] * n + np.sum(errors ** 2)) / (n + errors.size))
+        model['n_obs'] = n + int(errors.size)
+        model['last_date'] = model['last_date'] + timedelta(days=int(new.size))
+
+    def _save_model(self, model: Dict[str, Any], refitted: bool) -> None:
+        forecast = _forecast(model['params'], model['state'], model['sigma2'],
+                             model['last_date'], settings.forecast_horizon_days)
+        self.db.execute(text(f"""
+            INSERT INTO forecast_models (
+                user_id, category, target, unit, method, params, state, sigma2,
+                n_obs, last_date, forecast, fitted_at, updated_at
+            ) VALUES (
+                :user_id, :category, :target, :unit, :method, CAST(:params AS JSONB),
+                CAST(:state AS JSONB), :sigma2, :n_obs, :last_date, CAST(:forecast AS JSONB),
+                NOW(), NOW()
+            )
+            ON CONFLICT (user_id, category, target, unit) DO UPDATE SET
+                method = EXCLUDED.method,
+                params = EXCLUDED.params,
+                state = EXCLUDED.state,
+                sigma2 = EXCLUDED.sigma2,
+                n_obs = EXCLUDED.n_obs,
+                last_date = EXCLUDED.last_date,
+                forecast = EXCLUDED.forecast,
+                {'fitted_at = NOW(),' if refitted else ''}
+                updated_at = NOW()
+        """), {
+            'user_id': model['user_id'],
+            'category': model['category'],
+            'target': model['target'],
+            'unit': model['unit'],
+            'method': model['method'],
+            'params': json.dumps(model['params']),
+            'state': json.dumps(model['state']),
+            'sigma2': model['sigma2'],
+            'n_obs': model['n_obs'],
+            'last_date': model['last_date'],
+            'forecast': json.dumps(forecast),
+        })
+
+
+forecast_scheduler = PeriodicJob('Forecast job', lambda db: ForecastService(db).run(),
+                                 settings.forecast_interval_seconds)
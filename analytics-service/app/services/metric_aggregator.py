@@ -0,0 +1,175 @@
+"""
+Metric Aggregation Service
+Time-bucketed sum/mean/min/max/count over metrics.numeric_value and
+duration_minutes, served from the trigger-maintained daily aggregates
+"""
+
+import pandas as pd
+from datetime import date
+from typing import Dict, List, Any, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+BUCKETS = ('day', 'week', 'month')
+FIELDS = ('value', 'duration')
+
+_OFFSETS = {
+    'day': pd.offsets.Day(1),
+    'week': pd.offsets.Week(1),
+    'month': pd.offsets.MonthBegin(1),
+}
+
+
+class MetricAggregationService:
+    """Aggregates quantities per user x category/metric_type x time bucket"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def aggregate(self, user_id: str, bucket: str = 'week', periods: int = 12,
+                  field: str = 'value', category: Optional[str] = None,
+                  metric_type: Optional[str] = None, unit: Optional[str] = None,
+                  rolling: Optional[int] = None,
+                  end_date: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Bucketed stats for the last `periods` buckets ending at end_date.
+        Each bucket carries a period-over-period delta and, when `rolling` is
+        given, rolling sum/mean over that many buckets.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {BUCKETS}")
+        if field not in FIELDS:
+            raise ValueError(f"field must be one of {FIELDS}")
+
+        end_bucket = self._bucket_start(pd.Timestamp(end_date or date.today()), bucket)
+        # Extra leading buckets so the first visible rolling/delta values are complete
+        lookback = periods + max(rolling or 1, 1)
+        fetch_start = end_bucket - _OFFSETS[bucket] * (lookback - 1)
+        first_visible = end_bucket - _OFFSETS[bucket] * (periods - 1)
+
+        df = self._fetch_buckets(user_id, bucket, field, fetch_start.date(),
+                                 (end_bucket + _OFFSETS[bucket]).date(),
+                                 category, metric_type, unit)
+
+        series = []
+        if not df.empty:
+            full_range = pd.date_range(fetch_start, end_bucket, freq=_OFFSETS[bucket])
+            for (cat, mtype, u), group in df.groupby(['category', 'metric_type', 'unit']):
+                frame = self._fill_and_derive(group, full_range, rolling)
+                frame = frame[frame.index >= first_visible]
+                series.append({
+                    'category': cat,
+                    'metric_type': mtype,
+                    'unit': u or None,
+                    'totals': {
+                        'count': int(frame['count'].sum()),
+                        'sum': round(float(frame['sum'].sum()), 2),
+                    },
+                    'buckets': self._to_records(frame),
+                })
+
+        return {
+            'bucket': bucket,
+            'field': field,
+            'periods': periods,
+            'rolling': rolling,
+            'start': str(first_visible.date()),
+            'end': str(end_bucket.date()),
+            'series': series,
+        }
+
+    # Helper methods
+
+    def _fetch_buckets(self, user_id: str, bucket: str, field: str,
+                       start: date, end: date, category: Optional[str],
+                       metric_type: Optional[str], unit: Optional[str]) -> pd.DataFrame:
+        """Single indexed range read over metric_daily_aggregates"""
+        col = 'value' if field == 'value' else 'duration'
+        count_col = 'event_count' if field == 'value' else 'duration_count'
+
+        query = f"""
+            SELECT
+                category,
+                metric_type,
+                unit,
+                DATE_TRUNC('{bucket}', bucket_date)::date AS bucket_start,
+                SUM({count_col}) AS count,
+                SUM({col}_count) AS n,
+                SUM({col}_sum) AS sum,
+                MIN({col}_min) AS min,
+                MAX({col}_max) AS max
+            FROM metric_daily_aggregates
+            WHERE user_id = :user_id
+              AND bucket_date >= :start
+              AND bucket_date < :end
+        """
+        params = {'user_id': user_id, 'start': start, 'end': end}
+
+        if category:
+            query += " AND category = :category"
+            params['category'] = category
+        if metric_type:
+            query += " AND metric_type = :metric_type"
+            params['metric_type'] = metric_type
+        if unit is not None:
+            query += " AND unit = :unit"
+            params['unit'] = unit
+
+        query += " GROUP BY category, metric_type, unit, bucket_start"
+
+        df = pd.read_sql(text(query), self.db.read_bind, params=params)
+        if not df.empty:
+            df['bucket_start'] = pd.to_datetime(df['bucket_start'])
+            for c in ('count', 'n', 'sum', 'min', 'max'):
+                df[c] = pd.to_numeric(df[c])
+        return df
+
+    def _fill_and_derive(self, group: pd.DataFrame, full_range: pd.DatetimeIndex,
+                         rolling: Optional[int]) -> pd.DataFrame:
+        """Zero-fill empty buckets, then add mean, deltas and rolling windows"""
+        frame = group.set_index('bucket_start')[['count', 'n', 'sum', 'min', 'max']]
+        frame = frame.reindex(full_range)
+        frame[['count', 'n', 'sum']] = frame[['count', 'n', 'sum']].fillna(0)
+
+        frame['mean'] = frame['sum'] / frame['n'].where(frame['n'] > 0)
+        frame['delta_sum'] = frame['sum'].diff()
+        prev = frame['sum'].shift(1)
+        frame['delta_pct'] = (frame['delta_sum'] / prev.where(prev != 0)) * 100
+
+        if rolling and rolling > 1:
+            window = frame[['sum', 'n']].rolling(rolling, min_periods=rolling).sum()
+            frame['rolling_sum'] = window['sum']
+            frame['rolling_mean'] = window['sum'] / window['n'].where(window['n'] > 0)
+
+        return frame
+
+    def _to_records(self, frame: pd.DataFrame) -> List[Dict[str, Any]]:
+        def num(v, digits=2):
+            return None if pd.isna(v) else round(float(v), digits)
+
+        records = []
+        for ts, row in frame.iterrows():
+            record = {
+                'bucket_start': str(ts.date()),
+                'count': int(row['count']),
+                'sum': num(row['sum']),
+                'mean': num(row['mean']),
+                'min': num(row['min']),
+                'max': num(row['max']),
+                'delta_sum': num(row['delta_sum']),
+                'delta_pct': num(row['delta_pct'], 1),
+            }
+            if 'rolling_sum' in frame.columns:
+                record['rolling_sum'] = num(row['rolling_sum'])
+                record['rolling_mean'] = num(row['rolling_mean'])
+            records.append(record)
+        return records
+
+    @staticmethod
+    def _bucket_start(ts: pd.Timestamp, bucket: str) -> pd.Timestamp:
+        ts = ts.normalize()
+        if bucket == 'week':
+            return ts - pd.Timedelta(days=ts.weekday())
+        if bucket == 'month':
+            return ts.replace(day=1)
+        return ts
@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
+from app.services.activity_sketches import ActivitySketchStore
+from app.services.user_time import user_timezones
 
 class PatternDetectionService:
     """
@@ -13,16 +15,32 @@ class PatternDetectionService:
     def __init__(self, db: Session):
         self.db = db
     
-    def detect_frequency_patterns(self, user_id: str, category: str = None) -> List[Dict[str, Any]]:
+    def detect_frequency_patterns(self, user_id: str, category: str = None,
+                                  window_days: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Detect frequency patterns: "You usually X times per week"
+        window_days reads merged weekly sketches instead of raw rows
         """
+        if window_days:
+            cells = ActivitySketchStore(self.db).load_cells(user_id, 'memory', window_days, category)
+            df = (cells.rename(columns={'item': 'activity'})
+                       .groupby(['activity', 'category', 'date'], as_index=False)['count'].sum())
+        else:
+            df = self._query_daily_counts(user_id, category)
+        
+        if df.empty:
+            return []
+        
+        return self._frequency_patterns_from_counts(df)
+    
+    def _query_daily_counts(self, user_id: str, category: str = None) -> pd.DataFrame:
+        """Per (activity, category, local date) counts for the last 30 days"""
         # Query memory units
         query = """
             SELECT 
                 normalized_data->>'activity' as activity,
                 category,
-                DATE(created_at) as date,
+                DATE(created_at AT TIME ZONE %(tz)s) as date,
                 COUNT(*) as count
             FROM memory_units
             WHERE user_id = %(user_id)s
@@ -30,20 +48,18 @@ class PatternDetectionService:
                 AND created_at >= NOW() - INTERVAL '30 days'
         """
         
-        params = {"user_id": user_id}
+        params = {"user_id": user_id, "tz": user_timezones.get(self.db, user_id)}
         
         if category:
             query += " AND category = %(category)s"
             params["category"] = category
         
-        query += " GROUP BY activity, category, DATE(created_at)"
+        query += " GROUP BY activity, category, DATE(created_at AT TIME ZONE %(tz)s)"
         
         # Execute and load into pandas
-        df = pd.read_sql(query, self.db.bind, params=params)
-        
-        if df.empty:
-            return []
-        
+        return pd.read_sql(query, self.db.read_bind, params=params)
+    
+    def _frequency_patterns_from_counts(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         patterns = []
         
         # Group by activity
@@ -87,15 +103,37 @@ class PatternDetectionService:
         
         return sorted(patterns, key=lambda x: x['confidence'], reverse=True)
     
-    def detect_time_patterns(self, user_id: str) -> List[Dict[str, Any]]:
+    def detect_time_patterns(self, user_id: str,
+                             window_days: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Detect time-based patterns: "You usually meditate at 6 AM"
+        window_days reads merged weekly sketches instead of raw rows
+        Hours are local to the user; evidence.timezone names the zone
         """
+        if window_days:
+            cells = ActivitySketchStore(self.db).load_cells(user_id, 'memory', window_days)
+            df = (cells.rename(columns={'item': 'activity'})
+                       .groupby(['activity', 'category', 'hour'], as_index=False)['count'].sum())
+            df = df[df['count'] >= 3]
+        else:
+            df = self._query_hourly_counts(user_id)
+        
+        if df.empty:
+            return []
+        
+        patterns = self._time_patterns_from_counts(df)
+        timezone = user_timezones.get(self.db, user_id)
+        for pattern in patterns:
+            pattern['evidence']['timezone'] = timezone
+        return patterns
+    
+    def _query_hourly_counts(self, user_id: str) -> pd.DataFrame:
+        """Per (activity, category, local hour) counts for the last 30 days"""
         query = """
             SELECT 
                 normalized_data->>'activity' as activity,
                 category,
-                EXTRACT(HOUR FROM created_at) as hour,
+                EXTRACT(HOUR FROM created_at AT TIME ZONE %(tz)s) as hour,
                 COUNT(*) as count
             FROM memory_units
             WHERE user_id = %(user_id)s
@@ -105,11 +143,10 @@ class PatternDetectionService:
             HAVING COUNT(*) >= 3
         """
         
-        df = pd.read_sql(query, self.db.bind, params={"user_id": user_id})
-        
-        if df.empty:
-            return []
-        
+        params = {"user_id": user_id, "tz": user_timezones.get(self.db, user_id)}
+        return pd.read_sql(query, self.db.read_bind, params=params)
+    
+    def _time_patterns_from_counts(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         patterns = []
         
         for (activity, category), group in df.groupby(['activity', 'category']):
@@ -149,11 +186,12 @@ class PatternDetectionService:
         
         return sorted(patterns, key=lambda x: x['confidence'], reverse=True)
     
-    def detect_all_patterns(self, user_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    def detect_all_patterns(self, user_id: str,
+                            window_days: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
         """
         Detect all types of patterns for a user
         """
         return {
-            'frequency_patterns': self.detect_frequency_patterns(user_id),
-            'time_patterns': self.detect_time_patterns(user_id)
+            'frequency_patterns': self.detect_frequency_patterns(user_id, window_days=window_days),
+            'time_patterns': self.detect_time_patterns(user_id, window_days=window_days)
         }
@@ -0,0 +1,48 @@
+"""
+Periodic Jobs
+Background loop shared by the batch schedulers (cohorts, forecasts, timeline,
+cache pre-warming): open a session, run the job in a worker thread, keep its
+summary, sleep for the interval. A failed run is logged and retried at the next interval.
+"""
+
+import asyncio
+from typing import Any, Callable, Dict
+from sqlalchemy.orm import Session
+
+
+class PeriodicJob:
+    """Runs job(db) every interval_seconds; started/stopped from the app lifespan"""
+
+    def __init__(self, name: str, job: Callable[[Session], Dict[str, Any]], interval_seconds: float):
+        self.name = name
+        self.job = job
+        self.interval_seconds = interval_seconds
+        self.last_run: Dict[str, Any] = {}
+        self._task = None
+
+    def run_once(self) -> Dict[str, Any]:
+        from app.db.connection import SessionLocal
+
+        db = SessionLocal()
+        try:
+            self.last_run = self.job(db)
+        finally:
+            db.close()
+        return self.last_run
+
+    async def run_forever(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"❌ {self.name} failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,155 @@
+"""
+Result Cache
+In-process TTL cache for analyzer results, with hit-rate reporting
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from config.settings import settings
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'created_at', 'source', 'used')
+
+    def __init__(self, value: Any, ttl: float, source: str):
+        now = time.time()
+        self.value = value
+        self.created_at = now
+        self.expires_at = now + ttl
+        self.source = source
+        self.used = False
+
+
+class ResultCache:
+    """
+    LRU + TTL cache keyed by (kind, user_id, *args).
+
+    Entries remember whether they were produced in the request path or by the
+    pre-warmer, so the stats can tell how many requests were served warm and
+    how long before first use the pre-warmer ran (used to tune the lead time).
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int,
+                 kind_ttls: Optional[Dict[str, float]] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.kind_ttls = kind_ttls or {}
+        self._entries: 'OrderedDict[Tuple[Hashable, ...], _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._prewarmed = 0
+        self._prewarm_hits = 0
+        self._prewarm_expired_unused = 0
+        self._lead_minutes: List[float] = []
+
+    @staticmethod
+    def make_key(kind: str, user_id: str, *args: Any) -> Tuple[Hashable, ...]:
+        return (kind, str(user_id)) + tuple(args)
+
+    def ttl_for(self, key: Tuple[Hashable, ...]) -> float:
+        return self.kind_ttls.get(key[0], self.ttl_seconds)
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[Any]:
+        """Return a cached value or None, recording the hit/miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._drop(key, entry)
+                entry = None
+
+            if entry is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            if entry.source == 'prewarm' and not entry.used:
+                self._prewarm_hits += 1
+                self._lead_minutes.append((now - entry.created_at) / 60)
+                if len(self._lead_minutes) > 1000:
+                    self._lead_minutes = self._lead_minutes[-1000:]
+            entry.used = True
+            return entry.value
+
+    def set(self, key: Tuple[Hashable, ...], value: Any,
+            ttl: Optional[float] = None, source: str = 'request') -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._account_unused(old)
+            self._entries[key] = _Entry(value, ttl or self.ttl_for(key), source)
+            if source == 'prewarm':
+                self._prewarmed += 1
+            while len(self._entries) > self.max_entries:
+                old_key, old_entry = next(iter(self._entries.items()))
+                self._drop(old_key, old_entry)
+
+    def get_or_compute(self, kind: str, user_id: str,
+                       compute: Callable[[], Any], *args: Any) -> Any:
+        """Serve from cache, computing and storing the value on a miss"""
+        key = self.make_key(kind, user_id, *args)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def is_warm(self, key: Tuple[Hashable, ...]) -> bool:
+        """Check for a live entry without touching hit/miss counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.expires_at > time.time()
+
+    def invalidate(self, user_id: str) -> int:
+        """Drop every entry belonging to a user (e.g. after new activity)"""
+        user_id = str(user_id)
+        with self._lock:
+            keys = [k for k in self._entries if k[1] == user_id]
+            for key in keys:
+                self._drop(key, self._entries[key])
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            leads = sorted(self._lead_minutes)
+            settled = self._prewarm_hits + self._prewarm_expired_unused
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+                'prewarm': {
+                    'warmed': self._prewarmed,
+                    'used': self._prewarm_hits,
+                    'expired_unused': self._prewarm_expired_unused,
+                    'use_rate': round(self._prewarm_hits / settled, 3) if settled else 0.0,
+                    'median_minutes_to_first_use': round(leads[len(leads) // 2], 1) if leads else None,
+                    'p90_minutes_to_first_use': round(leads[int(len(leads) * 0.9)], 1) if leads else None,
+                }
+            }
+
+    # Helper methods
+
+    def _drop(self, key: Tuple[Hashable, ...], entry: _Entry) -> None:
+        self._entries.pop(key, None)
+        self._account_unused(entry)
+
+    def _account_unused(self, entry: _Entry) -> None:
+        if entry.source == 'prewarm' and not entry.used:
+            self._prewarm_expired_unused += 1
+
+
+result_cache = ResultCache(
+    ttl_seconds=settings.result_cache_ttl_seconds,
+    max_entries=settings.result_cache_max_entries,
+    kind_ttls={
+        'engagement': settings.result_cache_activity_ttl_seconds,
+        'category_consistency': settings.result_cache_activity_ttl_seconds,
+    },
+)
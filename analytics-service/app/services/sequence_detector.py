@@ -0,0 +1,322 @@
+"""
+Sequence Pattern Detection Service
+Finds ordered activity routines ("after your run you usually log breakfast
+within 30 minutes") in a user's validated memory_units.
+
+Mining is index based: events are sorted once, each event's follow-up window
+is found with searchsorted, and chains are grown level by level with hash
+joins over the (event -> later event) edge list. Longer chains only extend
+prefixes that already reach min support. Per-user counts are persisted and
+updated incrementally from memories past the stored (created_at, id)
+watermark; a trigger drops the state when a memory behind the watermark is
+validated, unvalidated or deleted, and the next request rebuilds it.
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from config.settings import settings
+
+
+def mine_chains(times: np.ndarray, codes: np.ndarray, max_gap: float, max_length: int,
+                min_prefix_support: int = 0, start_mask: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Every (start event, activity chain) pair where each step follows the
+    previous one within max_gap seconds. Returns one row per start/chain with
+    the shortest span, columns: start, c0..c{k}, span.
+    Chains longer than 2 only extend prefixes with >= min_prefix_support.
+    """
+    columns = ['start', 'c0', 'c1', 'span']
+    n = times.size
+    if n < 2:
+        return pd.DataFrame(columns=columns)
+
+    idx = np.arange(n)
+    hi = np.searchsorted(times, times + max_gap, side='right')
+    counts = np.maximum(hi - idx - 1, 0)
+    src = np.repeat(idx, counts)
+    offsets = np.arange(src.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    dst = src + offsets + 1
+
+    keep = codes[src] != codes[dst]
+    edges = pd.DataFrame({'src': src[keep], 'dst': dst[keep]})
+
+    paths = edges.rename(columns={'src': 'start', 'dst': 'last'})
+    if start_mask is not None:
+        paths = paths[start_mask[paths['start'].to_numpy()]]
+    paths['c0'] = codes[paths['start'].to_numpy()]
+    paths['c1'] = codes[paths['last'].to_numpy()]
+
+    results = [_collapse(paths, ['c0', 'c1'], times)]
+    for level in range(2, max_length):
+        chain_cols = [f'c{i}' for i in range(level)]
+        prefix = results[-1]
+        frequent = prefix.groupby(chain_cols).size()
+        frequent = frequent[frequent >= min_prefix_support].reset_index()[chain_cols]
+        paths = paths.merge(frequent, on=chain_cols)
+        if paths.empty:
+            break
+
+        paths = paths.merge(edges, left_on='last', right_on='src').drop(columns=['src', 'last'])
+        paths = paths.rename(columns={'dst': 'last'})
+        paths[f'c{level}'] = codes[paths['last'].to_numpy()]
+        paths = paths[paths[f'c{level}'] != paths[f'c{level - 1}']]
+        # Distinct (start, chain, last event) is all later levels need
+        paths = paths.drop_duplicates(['start', 'last'] + chain_cols + [f'c{level}'])
+        results.append(_collapse(paths, chain_cols + [f'c{level}'], times))
+
+    return pd.concat(results, ignore_index=True)
+
+
+def _collapse(paths: pd.DataFrame, chain_cols: List[str], times: np.ndarray) -> pd.DataFrame:
+    spans = times[paths['last'].to_numpy()] - times[paths['start'].to_numpy()]
+    return (paths.assign(span=spans)
+                 .groupby(['start'] + chain_cols, as_index=False)['span'].min())
+
+
+class SequencePatternDetector:
+    """Frequent ordered activity pairs and chains with support/confidence"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.max_gap = settings.sequence_max_gap_minutes * 60
+        self.max_length = settings.sequence_max_length
+        self.min_support = settings.sequence_min_support
+
+    def detect_sequence_patterns(self, user_id: str,
+                                 min_confidence: Optional[float] = None) -> List[Dict[str, Any]]:
+        state = self._load_state(user_id)
+        if state is None or self._is_stale(state):
+            state = self._full_build(user_id)
+            self._save_state(user_id, state)
+        else:
+            seen = (state['watermark'], state['watermark_id'], state['built_at'])
+            state = self._incremental_update(user_id, state)
+            # Nothing new: no write (and no commit) on a plain read
+            if (state['watermark'], state['watermark_id'], state['built_at']) != seen:
+                self._save_state(user_id, state)
+        return self._to_patterns(state, min_confidence if min_confidence is not None
+                                 else settings.sequence_min_confidence)
+
+    # Helper methods
+
+    def _fetch_events(self, user_id: str, after: Optional[datetime] = None,
+                      after_id: Optional[str] = None) -> pd.DataFrame:
+        query = """
+            SELECT EXTRACT(EPOCH FROM created_at)::float AS ts,
+                   created_at,
+                   id::text AS id,
+                   normalized_data->>'activity' AS activity,
+                   category
+            FROM memory_units
+            WHERE user_id = :user_id
+              AND status = 'validated'
+              AND normalized_data->>'activity' IS NOT NULL
+        """
+        params = {'user_id': user_id}
+        if after is not None:
+            # Row comparison: a memory sharing the watermark's timestamp is
+            # still new if its id sorts after the watermark's
+            query += " AND (created_at, id) > (:after, CAST(:after_id AS UUID))"
+            params.update(after=after, after_id=after_id)
+        else:
+            query += " AND created_at >= NOW() - make_interval(days => :days)"
+            params['days'] = settings.sequence_history_days
+        query += " ORDER BY created_at, id"
+        return pd.read_sql(text(query), self.db.read_bind, params=params)
+
+    def _encode(self, activities: pd.Series) -> Tuple[np.ndarray, List[str]]:
+        codes, names = pd.factorize(activities)
+        return codes, list(names)
+
+    def _chain_counts(self, mined: pd.DataFrame, names: List[str]) -> Dict[Tuple[str, ...], List[float]]:
+        """(support, span_sum) per chain of activity names"""
+        counts = {}
+        chain_cols = [c for c in mined.columns if c.startswith('c')]
+        for length in range(2, len(chain_cols) + 1):
+            cols = chain_cols[:length]
+            subset = mined.dropna(subset=cols)
+            if length < len(chain_cols):
+                subset = subset[subset[chain_cols[length]].isna()]
+            grouped = subset.groupby(cols)['span'].agg(['size', 'sum'])
+            for key, row in grouped.iterrows():
+                chain = tuple(names[int(c)] for c in (key if isinstance(key, tuple) else (key,)))
+                counts[chain] = [int(row['size']), float(row['sum'])]
+        return counts
+
+    def _full_build(self, user_id: str) -> Dict[str, Any]:
+        events = self._fetch_events(user_id)
+        state = {
+            'watermark': None,
+            'watermark_id': None,
+            'activity_counts': {},
+            'activity_categories': {},
+            'chains': {},
+            'tail': [],
+            'built_at': datetime.now(timezone.utc),
+        }
+        if events.empty:
+            return state
+
+        codes, names = self._encode(events['activity'])
+        mined = mine_chains(events['ts'].to_numpy(), codes, self.max_gap,
+                            self.max_length, self.min_support)
+        state['chains'] = self._chain_counts(mined, names)
+        state['activity_counts'] = events['activity'].value_counts().to_dict()
+        state['activity_categories'] = (events.dropna(subset=['category'])
+                                        .groupby('activity')['category']
+                                        .agg(lambda s: s.mode().iat[0]).to_dict())
+        self._advance_watermark(state, events, events.iloc[-1])
+        return state
+
+    def _incremental_update(self, user_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Mine tail+new minus tail-only: tail events are every event that could
+        still start a chain reaching a new memory, so the difference is
+        exactly the chain occurrences the new memories add.
+        """
+        new = self._fetch_events(user_id, after=state['watermark'], after_id=state['watermark_id'])
+        if new.empty:
+            return state
+
+        tail = pd.DataFrame(state['tail'], columns=['ts', 'activity'])
+        combined = pd.concat([tail, new[['ts', 'activity']]], ignore_index=True)
+        codes, names = self._encode(combined['activity'])
+        times = combined['ts'].to_numpy(dtype=float)
+
+        after = mine_chains(times, codes, self.max_gap, self.max_length)
+        if len(tail):
+            before = mine_chains(times[:len(tail)], codes[:len(tail)], self.max_gap, self.max_length)
+            chain_cols = [c for c in after.columns if c.startswith('c')]
+            before = before.reindex(columns=['start'] + chain_cols)
+            merged = after.merge(before[['start'] + chain_cols].assign(_seen=True),
+                                 on=['start'] + chain_cols, how='left')
+            after = merged[merged['_seen'].isna()].drop(columns=['_seen'])
+
+        # Same pruning as the full build: a chain only counts while its prefix
+        # has min support. Prefix support only grows between rebuilds, so a
+        # prefix reaching it now means its earlier extensions were never
+        # counted, and only a full build can recover them.
+        increments = {
+            chain: counts for chain, counts in self._chain_counts(after, names).items()
+            if len(chain) == 2 or state['chains'].get(chain[:-1], [0])[0] >= self.min_support
+        }
+        for chain, (support, _) in increments.items():
+            previous = state['chains'].get(chain, [0])[0]
+            if len(chain) < self.max_length and previous < self.min_support <= previous + support:
+                return self._full_build(user_id)
+
+        for chain, (support, span_sum) in increments.items():
+            current = state['chains'].setdefault(chain, [0, 0.0])
+            current[0] += support
+            current[1] += span_sum
+
+        for activity, count in new['activity'].value_counts().items():
+            state['activity_counts'][activity] = state['activity_counts'].get(activity, 0) + int(count)
+        for activity, category in new.dropna(subset=['category']).groupby('activity')['category'].last().items():
+            state['activity_categories'].setdefault(activity, category)
+
+        self._advance_watermark(state, combined, new.iloc[-1])
+        return state
+
+    def _advance_watermark(self, state: Dict[str, Any], events: pd.DataFrame, last: pd.Series) -> None:
+        """Keep only events that can still start a chain reaching future memories"""
+        # Postgres timestamps are whole microseconds
+        state['watermark'] = pd.Timestamp(last['created_at']).floor('us').to_pydatetime()
+        state['watermark_id'] = last['id']
+        cutoff = events['ts'].iloc[-1] - self.max_gap * (self.max_length - 1)
+        tail = events[events['ts'] >= cutoff]
+        state['tail'] = [[float(t), a] for t, a in zip(tail['ts'], tail['activity'])]
+
+    def _is_stale(self, state: Dict[str, Any]) -> bool:
+        age = datetime.now(timezone.utc) - state['built_at']
+        return age.days >= settings.sequence_rebuild_days
+
+    def _to_patterns(self, state: Dict[str, Any], min_confidence: float) -> List[Dict[str, Any]]:
+        chains = state['chains']
+        counts = state['activity_counts']
+        categories = state['activity_categories']
+
+        patterns = []
+        for chain, (support, span_sum) in chains.items():
+            if support < self.min_support:
+                continue
+            prefix_support = counts.get(chain[0], 0) if len(chain) == 2 else chains.get(chain[:-1], [0])[0]
+            if not prefix_support:
+                continue
+            confidence = min(support / prefix_support, 1.0)
+            if confidence < min_confidence:
+                continue
+
+            avg_minutes = round(span_sum / support / 60)
+            if len(chain) == 2:
+                description = f"After you {chain[0]}, you usually {chain[1]} within {max(avg_minutes, 1)} minutes"
+            else:
+                description = f"You often {', then '.join(chain)} (about {max(avg_minutes, 1)} minutes end to end)"
+
+            patterns.append({
+                'pattern_type': 'sequence',
+                'category': categories.get(chain[0]),
+                'activity': chain[0],
+                'activities': list(chain),
+                'categories': [categories.get(a) for a in chain],
+                'support': support,
+                'confidence': round(confidence, 2),
+                'avg_gap_minutes': avg_minutes,
+                'description': description,
+                'evidence': {
+                    'sample_size': support,
+                    'prefix_count': int(prefix_support),
+                    'max_gap_minutes': settings.sequence_max_gap_minutes
+                }
+            })
+
+        return sorted(patterns, key=lambda x: (x['confidence'], x['support']), reverse=True)
+
+    def _load_state(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(text("""
+            SELECT watermark, watermark_id::text AS watermark_id,
+                   activity_counts, activity_categories, chains, tail, built_at
+            FROM sequence_mining_state
+            WHERE user_id = :user_id
+        """), {'user_id': user_id}).mappings().first()
+        if row is None:
+            return None
+        state = dict(row)
+        state['chains'] = {tuple(chain): [support, span_sum]
+                           for chain, support, span_sum in state['chains']}
+        return state
+
+    def _save_state(self, user_id: str, state: Dict[str, Any]) -> None:
+        self.db.execute(text("""
+            INSERT INTO sequence_mining_state (
+                user_id, watermark, watermark_id, activity_counts, activity_categories, chains, tail,
+                built_at, updated_at
+            ) VALUES (
+                :user_id, :watermark, CAST(:watermark_id AS UUID), CAST(:activity_counts AS JSONB), CAST(:activity_categories AS JSONB),
+                CAST(:chains AS JSONB), CAST(:tail AS JSONB), :built_at, NOW()
+            )
+            ON CONFLICT (user_id) DO UPDATE SET
+                watermark = EXCLUDED.watermark,
+                watermark_id = EXCLUDED.watermark_id,
+                activity_counts = EXCLUDED.activity_counts,
+                activity_categories = EXCLUDED.activity_categories,
+                chains = EXCLUDED.chains,
+                tail = EXCLUDED.tail,
+                built_at = EXCLUDED.built_at,
+                updated_at = NOW()
+        """), {
+            'user_id': user_id,
+            'watermark': state['watermark'],
+            'watermark_id': state['watermark_id'],
+            'activity_counts': json.dumps({k: int(v) for k, v in state['activity_counts'].items()}),
+            'activity_categories': json.dumps(state['activity_categories']),
+            'chains': json.dumps([[list(c), s, g] for c, (s, g) in state['chains'].items()]),
+            'tail': json.dumps(state['tail']),
+            'built_at': state['built_at'],
+        })
+        self.db.commit()
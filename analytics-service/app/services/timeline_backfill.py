@@ -0,0 +1,402 @@
+"""
+Engagement Timeline Backfill Service
+Replays each user's history once, oldest day first, and writes one snapshot
+per day (engagement components, score, risk, streak and detected patterns)
+to engagement_timeline. Rolling counts come from cumulative sums and the
+30-day pattern window slides by adding the entering day and dropping the
+leaving one, so no day is recomputed from raw rows. Per-user checkpoints
+make the job resumable, and later runs just append the new days. Days and
+hours are local to each user (see user_time).
+"""
+
+import json
+import multiprocessing
+import time
+import numpy as np
+import pandas as pd
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Any, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services.user_time import user_timezones, local_today
+from app.services.periodic_job import PeriodicJob
+from config.settings import settings
+
+PATTERN_WINDOW_DAYS = 30
+STREAK_LOOKBACK = 90  # ConsistencyAnalyzer reads the last 90 logged dates
+# History reloaded before a checkpoint: covers the streak cap, and the 7/30-day
+# and pattern windows fit inside it
+RESUME_LOOKBACK_DAYS = STREAK_LOOKBACK
+
+
+# Replay (module-level so process-pool workers can import it)
+
+def _engagement_series(metric_days: List[List[Any]], days: pd.DatetimeIndex,
+                       last_active_before: Optional[str] = None) -> pd.DataFrame:
+    """
+    Per-day inputs of calculate_engagement_score, as of the end of each day
+    last_active_before: last active date known from before days[0] (a
+    resumed replay only loads recent history), so days_since_last stays exact
+    """
+    counts = pd.Series({pd.Timestamp(d): c for d, c in metric_days}, dtype=float)
+    daily = counts.reindex(days, fill_value=0).to_numpy()
+    idx = np.arange(daily.size)
+
+    csum = np.concatenate([[0.0], np.cumsum(daily)])
+    events_7d = csum[idx + 1] - csum[np.maximum(idx - 6, 0)]
+    events_30d = csum[idx + 1] - csum[np.maximum(idx - 29, 0)]
+
+    never = -10 ** 9
+    seed = (pd.Timestamp(last_active_before) - days[0]).days if last_active_before else never
+    active = daily > 0
+    last_active = np.maximum.accumulate(np.where(active, idx, seed))
+    days_since_last = np.where(last_active != never, idx - last_active, 999)
+
+    last_inactive = np.maximum.accumulate(np.where(~active, idx, -1))
+    run = np.where(active, idx - last_inactive, 0)
+    # A streak is still alive the day after the last log
+    previous_run = np.concatenate([[0], run[:-1]])
+    streak = np.minimum(np.where(active, run, previous_run), STREAK_LOOKBACK)
+
+    return pd.DataFrame({
+        'days_since_last': days_since_last.astype(int),
+        'events_7d': events_7d.astype(int),
+        'events_30d': events_30d.astype(int),
+        'current_streak': streak.astype(int),
+    }, index=days)
+
+
+def replay_user(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Daily snapshots for one user from first activity (or the checkpoint) to
+    payload['end']. Payload: user_id, timezone, end, resume_after,
+    history_from, last_active, metric_days [[date, count]], memory_rows
+    [[activity, category, date, hour, count]], all bucketed in the user's
+    timezone. A resumed replay gets history from history_from only (the
+    sliding state warms up from there) plus the last active date carried
+    over from the checkpoint
+    """
+    from app.services.consistency_analyzer import ConsistencyAnalyzer
+    from app.services.pattern_detector import PatternDetectionService
+    from app.services.change_feed import pattern_key
+
+    analyzer = ConsistencyAnalyzer(None)
+    detector = PatternDetectionService(None)
+
+    end = pd.Timestamp(payload['end'])
+    memory = pd.DataFrame(payload['memory_rows'], columns=['activity', 'category', 'date', 'hour', 'count'])
+    memory['date'] = pd.to_datetime(memory['date'])
+    first_dates = [pd.Timestamp(d) for d, _ in payload['metric_days'][:1]]
+    if not memory.empty:
+        first_dates.append(memory['date'].min())
+    if payload.get('history_from'):
+        first_dates = [pd.Timestamp(payload['history_from'])]
+    if not first_dates:
+        return {'user_id': payload['user_id'], 'timezone': payload['timezone'],
+                'rows': [], 'last_date': payload['resume_after']}
+
+    days = pd.date_range(min(first_dates), end, freq='D')
+    emit_from = max(days[0], end - pd.Timedelta(days=settings.timeline_max_history_days - 1))
+    if payload['resume_after']:
+        emit_from = max(emit_from, pd.Timestamp(payload['resume_after']) + pd.Timedelta(days=1))
+
+    stats = _engagement_series(payload['metric_days'], days, payload.get('last_active'))
+
+    # Sliding 30-day pattern window: daily rows sorted by date, sliced by
+    # position; hourly counts kept in a Counter updated per entering/leaving day
+    daily_rows = memory.groupby(['date', 'activity', 'category'], as_index=False)['count'].sum()
+    daily_dates = daily_rows['date'].to_numpy()
+    by_day = {d: g for d, g in memory.groupby('date')}
+    hourly: Counter = Counter()
+
+    rows, patterns_cache = [], None
+    for day in days:
+        leaving = day - pd.Timedelta(days=PATTERN_WINDOW_DAYS)
+        changed = day in by_day or leaving in by_day
+        for d, sign in ((day, 1), (leaving, -1)):
+            if d in by_day:
+                for a, c, h, n in by_day[d][['activity', 'category', 'hour', 'count']].itertuples(index=False):
+                    hourly[(a, c, h)] += sign * n
+        if day < emit_from:
+            continue
+
+        if patterns_cache is None or changed:
+            lo = np.searchsorted(daily_dates, np.datetime64(leaving), side='right')
+            hi = np.searchsorted(daily_dates, np.datetime64(day), side='right')
+            window = daily_rows.iloc[lo:hi]
+            frequency = detector._frequency_patterns_from_counts(window) if not window.empty else []
+            hours = pd.DataFrame([(a, c, h, n) for (a, c, h), n in hourly.items() if n >= 3],
+                                 columns=['activity', 'category', 'hour', 'count'])
+            timing = detector._time_patterns_from_counts(hours) if not hours.empty else []
+            patterns_cache = sorted(pattern_key(p) for p in frequency + timing)
+
+        s = stats.loc[day]
+        components = {
+            'recency': analyzer._score_recency(s['days_since_last']),
+            'frequency': analyzer._score_frequency(s['events_7d']),
+            'streak': analyzer._score_streak(s['current_streak']),
+            'growth': analyzer._score_growth(s['events_7d'], s['events_30d']),
+        }
+        score = (components['recency'] * 0.4 + components['frequency'] * 0.3 +
+                 components['streak'] * 0.2 + components['growth'] * 0.1)
+        rows.append({
+            'snapshot_date': day.date().isoformat(),
+            'engagement_score': round(score),
+            'trend': analyzer._determine_trend(score, s['days_since_last'], s['events_7d'], s['events_30d']),
+            'risk_level': analyzer._assess_risk(score, s['days_since_last']),
+            **{k: round(v) for k, v in components.items()},
+            **{k: int(v) for k, v in s.items()},
+            'pattern_keys': patterns_cache,
+        })
+
+    return {
+        'user_id': payload['user_id'],
+        'timezone': payload['timezone'],
+        'rows': rows,
+        'last_date': rows[-1]['snapshot_date'] if rows else payload['resume_after'],
+    }
+
+
+class TimelineBackfillService:
+    """Chunked, checkpointed replay across users over a process pool"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_timeline(self, user_id: str, days: int = 90) -> List[Dict[str, Any]]:
+        rows = self.db.execute(text("""
+            SELECT snapshot_date, engagement_score, trend, risk_level,
+                   recency, frequency, streak, growth,
+                   days_since_last, events_7d, events_30d, current_streak, pattern_keys
+            FROM engagement_timeline
+            WHERE user_id = :user_id
+              AND snapshot_date >= CURRENT_DATE - :days
+            ORDER BY snapshot_date
+        """), {'user_id': user_id, 'days': days}).mappings().all()
+        return [{**row, 'snapshot_date': str(row['snapshot_date'])} for row in rows]
+
+    def run(self, user_ids: Optional[List[str]] = None, rebuild: bool = False) -> Dict[str, Any]:
+        """
+        Replay every user (or the given ones) from their checkpoint up to
+        their last complete local day. Safe to interrupt: a user's snapshots
+        and their checkpoint are committed together, and rewrites are upserts.
+        rebuild drops the checkpoints first so history is replayed in full.
+        """
+        started = time.time()
+
+        if rebuild:
+            query = "DELETE FROM timeline_backfill_progress"
+            if user_ids is not None:
+                query += " WHERE user_id = ANY(CAST(:user_ids AS UUID[]))"
+            self.db.execute(text(query), {'user_ids': user_ids})
+            self.db.commit()
+
+        if user_ids is None:
+            user_ids = [r[0] for r in self.db.execute(text("""
+                SELECT user_id::text FROM metrics WHERE user_id IS NOT NULL
+                UNION
+                SELECT user_id::text FROM memory_units WHERE status = 'validated'
+            """))]
+
+        summary = {'users': len(user_ids), 'replayed': 0, 'up_to_date': 0, 'snapshots': 0}
+        pool = None
+        try:
+            chunk = settings.timeline_chunk_users
+            for i in range(0, len(user_ids), chunk):
+                zones = user_timezones.get_many(self.db, user_ids[i:i + chunk])
+                ends = {u: local_today(tz) - timedelta(days=1) for u, tz in zones.items()}
+                checkpoints = self._load_checkpoints(zones)
+                batch = [u for u in zones if u not in checkpoints or checkpoints[u]['last_date'] != ends[u]]
+                summary['up_to_date'] += len(zones) - len(batch)
+                if not batch:
+                    self.db.commit()
+                    continue
+
+                # Resumed and fresh users load separately so the resumed
+                # group's scan stays bounded
+                payloads = []
+                for group in ([u for u in batch if u in checkpoints], [u for u in batch if u not in checkpoints]):
+                    if group:
+                        payloads += self._load_history(group, ends, checkpoints, zones)
+
+                # Single-user refreshes and daily extensions are cheap; only
+                # large backfill chunks are worth starting worker processes
+                if len(payloads) > settings.timeline_inline_max_users:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(max_workers=settings.timeline_workers,
+                                                   mp_context=multiprocessing.get_context('spawn'))
+                    results = pool.map(replay_user, payloads, chunksize=4)
+                else:
+                    results = map(replay_user, payloads)
+
+                for result in results:
+                    self._save(result)
+                    summary['replayed'] += 1
+                    summary['snapshots'] += len(result['rows'])
+                self.db.commit()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        summary['duration_seconds'] = round(time.time() - started, 2)
+        return summary
+
+    # Helper methods
+
+    def _load_checkpoints(self, zones: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Per user: last snapshot date and the last active date as of that
+        snapshot (seeds days_since_last for a bounded resume). A checkpoint
+        written under another timezone is dropped with that user's snapshots
+        (their days no longer line up), so the user is replayed in full
+        """
+        rows = self.db.execute(text("""
+            SELECT p.user_id::text, p.last_date, p.timezone, t.days_since_last
+            FROM timeline_backfill_progress p
+            LEFT JOIN engagement_timeline t
+              ON t.user_id = p.user_id AND t.snapshot_date = p.last_date
+            WHERE p.user_id = ANY(CAST(:user_ids AS UUID[]))
+        """), {'user_ids': list(zones)}).fetchall()
+
+        stale = [user_id for user_id, _, timezone, _ in rows if timezone != zones[user_id]]
+        if stale:
+            params = {'user_ids': stale}
+            self.db.execute(text("DELETE FROM engagement_timeline WHERE user_id = ANY(CAST(:user_ids AS UUID[]))"), params)
+            self.db.execute(text("DELETE FROM timeline_backfill_progress WHERE user_id = ANY(CAST(:user_ids AS UUID[]))"), params)
+
+        checkpoints = {}
+        for user_id, last_date, timezone, days_since_last in rows:
+            if timezone != zones[user_id]:
+                continue
+            checkpoints[user_id] = {
+                'last_date': last_date,
+                'last_active': (last_date - timedelta(days=days_since_last)
+                                if days_since_last is not None and days_since_last < 999 else None),
+            }
+        return checkpoints
+
+    def _load_history(self, user_ids: List[str], ends: Dict[str, date],
+                      checkpoints: Dict[str, Dict[str, Any]],
+                      zones: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        Two grouped queries per chunk: metric days and memory day/hour counts,
+        each bucketed in its user's timezone (joined in as parameter arrays).
+        A user with a checkpoint only needs RESUME_LOOKBACK_DAYS before it;
+        the per-user bound is a local date, so the chunk's earliest bound is
+        also applied to created_at directly where the index can use it
+        """
+        lowers = {u: checkpoints[u]['last_date'] - timedelta(days=RESUME_LOOKBACK_DAYS)
+                  for u in user_ids if u in checkpoints}
+        params = {
+            'user_ids': user_ids,
+            'timezones': [zones[u] for u in user_ids],
+            'lowers': [lowers.get(u) for u in user_ids],
+        }
+        scan_bound = ""
+        if len(lowers) == len(user_ids):
+            # Local dates are within a day of UTC ones
+            params['lower'] = min(lowers.values()) - timedelta(days=1)
+            scan_bound = "AND m.created_at >= CAST(:lower AS TIMESTAMPTZ)"
+
+        metrics = pd.read_sql(text(f"""
+            SELECT m.user_id::text AS user_id,
+                   DATE(m.created_at AT TIME ZONE z.tz) AS metric_date,
+                   COUNT(*) AS count
+            FROM metrics m
+            JOIN UNNEST(CAST(:user_ids AS UUID[]), CAST(:timezones AS TEXT[]), CAST(:lowers AS DATE[]))
+              AS z(user_id, tz, lower_date)
+              ON z.user_id = m.user_id
+            WHERE DATE(m.created_at AT TIME ZONE z.tz) < DATE(NOW() AT TIME ZONE z.tz)
+              AND (z.lower_date IS NULL OR DATE(m.created_at AT TIME ZONE z.tz) >= z.lower_date)
+              {scan_bound}
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """), self.db.read_bind, params=params)
+
+        memory = pd.read_sql(text(f"""
+            SELECT m.user_id::text AS user_id,
+                   m.normalized_data->>'activity' AS activity,
+                   m.category,
+                   DATE(m.created_at AT TIME ZONE z.tz) AS date,
+                   EXTRACT(HOUR FROM m.created_at AT TIME ZONE z.tz)::int AS hour,
+                   COUNT(*) AS count
+            FROM memory_units m
+            JOIN UNNEST(CAST(:user_ids AS UUID[]), CAST(:timezones AS TEXT[]), CAST(:lowers AS DATE[]))
+              AS z(user_id, tz, lower_date)
+              ON z.user_id = m.user_id
+            WHERE m.status = 'validated'
+              AND DATE(m.created_at AT TIME ZONE z.tz) < DATE(NOW() AT TIME ZONE z.tz)
+              AND (z.lower_date IS NULL OR DATE(m.created_at AT TIME ZONE z.tz) >= z.lower_date)
+              {scan_bound}
+            GROUP BY 1, 2, 3, 4, 5
+        """), self.db.read_bind, params=params)
+
+        metric_groups = {u: g for u, g in metrics.groupby('user_id')}
+        memory_groups = {u: g for u, g in memory.groupby('user_id')}
+        payloads = []
+        for user_id in user_ids:
+            m = metric_groups.get(user_id, metrics.iloc[0:0])
+            mu = memory_groups.get(user_id, memory.iloc[0:0])
+            checkpoint = checkpoints.get(user_id)
+            payloads.append({
+                'user_id': user_id,
+                'timezone': zones[user_id],
+                'end': ends[user_id].isoformat(),
+                'resume_after': checkpoint['last_date'].isoformat() if checkpoint else None,
+                'history_from': lowers[user_id].isoformat() if checkpoint else None,
+                'last_active': (checkpoint['last_active'].isoformat()
+                                if checkpoint and checkpoint['last_active'] else None),
+                'metric_days': [[str(d), int(c)] for d, c in zip(m['metric_date'], m['count'])],
+                'memory_rows': [[a, c, str(d), int(h), int(n)] for a, c, d, h, n in
+                                zip(mu['activity'], mu['category'], mu['date'], mu['hour'], mu['count'])],
+            })
+        return payloads
+
+    def _save(self, result: Dict[str, Any]) -> None:
+        if result['rows']:
+            # One statement per user: the rows travel as a JSON array
+            self.db.execute(text("""
+                INSERT INTO engagement_timeline (
+                    user_id, snapshot_date, engagement_score, trend, risk_level,
+                    recency, frequency, streak, growth,
+                    days_since_last, events_7d, events_30d, current_streak, pattern_keys
+                )
+                SELECT CAST(:user_id AS UUID), r.snapshot_date, r.engagement_score, r.trend, r.risk_level,
+                       r.recency, r.frequency, r.streak, r.growth,
+                       r.days_since_last, r.events_7d, r.events_30d, r.current_streak, r.pattern_keys
+                FROM jsonb_to_recordset(CAST(:rows AS JSONB)) AS r(
+                    snapshot_date DATE, engagement_score INT, trend VARCHAR(20), risk_level VARCHAR(20),
+                    recency INT, frequency INT, streak INT, growth INT,
+                    days_since_last INT, events_7d INT, events_30d INT, current_streak INT, pattern_keys JSONB
+                )
+                ON CONFLICT (user_id, snapshot_date) DO UPDATE SET
+                    engagement_score = EXCLUDED.engagement_score,
+                    trend = EXCLUDED.trend,
+                    risk_level = EXCLUDED.risk_level,
+                    recency = EXCLUDED.recency,
+                    frequency = EXCLUDED.frequency,
+                    streak = EXCLUDED.streak,
+                    growth = EXCLUDED.growth,
+                    days_since_last = EXCLUDED.days_since_last,
+                    events_7d = EXCLUDED.events_7d,
+                    events_30d = EXCLUDED.events_30d,
+                    current_streak = EXCLUDED.current_streak,
+                    pattern_keys = EXCLUDED.pattern_keys
+            """), {'user_id': result['user_id'], 'rows': json.dumps(result['rows'])})
+
+        if result['last_date']:
+            self.db.execute(text("""
+                INSERT INTO timeline_backfill_progress (user_id, last_date, timezone, updated_at)
+                VALUES (:user_id, :last_date, :timezone, NOW())
+                ON CONFLICT (user_id) DO UPDATE SET
+                    last_date = EXCLUDED.last_date,
+                    timezone = EXCLUDED.timezone,
+                    updated_at = NOW()
+            """), {'user_id': result['user_id'], 'last_date': result['last_date'],
+                   'timezone': result['timezone']})
+
+
+timeline_scheduler = PeriodicJob('Timeline backfill', lambda db: TimelineBackfillService(db).run(),
+                                 settings.timeline_interval_seconds)
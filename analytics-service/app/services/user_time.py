@@ -0,0 +1,87 @@
+"""
+User Local Time
+Day and hour buckets follow each user's users.timezone. Conversion happens
+in SQL inside the aggregation (created_at AT TIME ZONE :tz), so Postgres
+applies the offset in effect at each event's instant, DST included, and no
+rows are converted in Python. What is cached per user is the validated
+zone name rather than a fixed offset, because the offset changes with DST.
+"""
+
+import threading
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from config.settings import settings
+
+
+@lru_cache(maxsize=1024)
+def valid_timezone(name: str) -> str:
+    """IANA name if known, else the default (a bad name must never reach SQL)"""
+    if not name:
+        return settings.default_timezone
+    try:
+        ZoneInfo(name)
+        return name
+    except (ZoneInfoNotFoundError, ValueError):
+        return settings.default_timezone
+
+
+def local_today(timezone: str) -> date:
+    return datetime.now(ZoneInfo(timezone)).date()
+
+
+class UserTimezones:
+    """In-process TTL cache of user_id -> timezone, filled in bulk"""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, db: Session, user_id: str) -> str:
+        return self.get_many(db, [user_id])[str(user_id)]
+
+    def get_many(self, db: Session, user_ids: List[str]) -> Dict[str, str]:
+        """One users query for whatever isn't cached; unknown users get the default"""
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for user_id in map(str, user_ids):
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[1] > now:
+                    found[user_id] = entry[0]
+                else:
+                    missing.append(user_id)
+            self._hits += len(found)
+            self._misses += len(missing)
+
+        if missing:
+            rows = dict(db.execute(text("""
+                SELECT id::text, timezone FROM users WHERE id = ANY(CAST(:user_ids AS UUID[]))
+            """), {'user_ids': missing}).fetchall())
+            loaded = {user_id: valid_timezone(rows.get(user_id)) for user_id in missing}
+            with self._lock:
+                for user_id, timezone in loaded.items():
+                    self._entries[user_id] = (timezone, now + self.ttl_seconds)
+            found.update(loaded)
+        return found
+
+    def invalidate(self, user_id: str = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(user_id), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self._hits, 'misses': self._misses}
+
+
+user_timezones = UserTimezones(settings.timezone_cache_ttl_seconds)
@@ -7,15 +7,111 @@ class Settings(BaseSettings):
     port: int = 8001
     environment: str = "development"
     
-    # Database
+    # Database (writes and state go to the primary; analytical scans to the
+    # read replica when DATABASE_READ_URL is set and its lag is acceptable)
     database_url: str = "postgresql://localhost:5432/memory_os"
+    database_read_url: Optional[str] = None
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    db_read_pool_size: int = 10
+    db_read_max_overflow: int = 10
+    db_pool_timeout_seconds: int = 10
+    db_pool_recycle_seconds: int = 1800
+    db_connect_timeout_seconds: int = 5
+    db_statement_timeout_ms: int = 15000
+    db_read_statement_timeout_ms: int = 60000
+    db_query_cache_size: int = 1000         # compiled statements reused per engine
+    db_replica_max_lag_seconds: float = 30.0
+    db_replica_check_interval_seconds: float = 10.0
     
     # API Keys (if needed for integrations)
     backend_api_url: str = "http://localhost:3000"
     
+    # Shared secret for service-to-service calls (e.g. the all-user change stream)
+    service_token: Optional[str] = None
+    
     # Firebase (optional for auth)
     firebase_service_account_path: Optional[str] = None
     
+    # Result cache
+    result_cache_ttl_seconds: int = 3600
+    result_cache_max_entries: int = 10000
+    # Engagement/streak results go stale on the next log; capped so a missed
+    # invalidation can't serve them for the full TTL
+    result_cache_activity_ttl_seconds: int = 300
+    
+    # Local time bucketing (users.timezone, cached per user)
+    default_timezone: str = "UTC"
+    timezone_cache_ttl_seconds: int = 3600
+    
+    # Cache pre-warming (runs shortly before each user's usual active hour)
+    prewarm_enabled: bool = True
+    prewarm_lead_minutes: int = 30
+    prewarm_interval_seconds: int = 900
+    prewarm_batch_size: int = 25
+    prewarm_batch_pause_seconds: float = 0.5
+    prewarm_max_users_per_run: int = 500
+    prewarm_max_seconds_per_run: float = 120.0
+    prewarm_max_inflight_requests: int = 2
+    
+    # Metric anomaly detection
+    anomaly_alpha: float = 0.1              # EWMA smoothing factor
+    anomaly_recent_window: int = 30         # values kept for median/IQR
+    anomaly_min_samples: int = 8            # warm-up before flagging
+    anomaly_z_threshold: float = 3.0
+    anomaly_robust_threshold: float = 3.5
+    anomaly_rebuild_chunk_users: int = 500
+    
+    # Forecasting (batched fits over a process pool, served from forecast_models)
+    forecast_enabled: bool = True
+    forecast_interval_seconds: int = 21600
+    forecast_horizon_days: int = 7
+    forecast_history_days: int = 120
+    forecast_refit_days: int = 7
+    forecast_min_days: int = 14
+    forecast_min_active_days: int = 3
+    forecast_workers: int = 2
+    forecast_inline_max_fits: int = 32
+    forecast_chunk_users: int = 200
+    
+    # Sequence (routine) pattern mining
+    sequence_max_gap_minutes: int = 90
+    sequence_max_length: int = 3
+    sequence_min_support: int = 3
+    sequence_min_confidence: float = 0.3
+    sequence_history_days: int = 90
+    sequence_rebuild_days: int = 7
+    
+    # Behavioral cohorts (MiniBatchKMeans, updated incrementally with partial_fit)
+    cohort_enabled: bool = True
+    cohort_clusters: int = 8
+    cohort_interval_seconds: int = 3600
+    cohort_history_days: int = 60
+    cohort_chunk_users: int = 500
+    cohort_max_assignment_age_hours: int = 24  # recency drifts even without new activity
+    
+    # Response encoding
+    response_gzip_min_bytes: int = 1024
+    response_gzip_level: int = 5            # gzip 9 costs far more CPU for ~2% smaller bodies
+    pattern_batch_max_users: int = 200
+    
+    # Pattern change stream (SSE)
+    stream_enabled: bool = True
+    stream_scan_interval_seconds: int = 60
+    stream_scan_chunk_users: int = 100
+    stream_snapshot_max_age_hours: int = 24   # risk/streak decay without new activity
+    stream_retention_hours: int = 72          # how far back Last-Event-ID can resume
+    stream_heartbeat_seconds: float = 15.0
+    stream_retry_ms: int = 5000
+    
+    # Engagement timeline (daily snapshots, backfilled once then extended)
+    timeline_enabled: bool = True
+    timeline_interval_seconds: int = 21600
+    timeline_workers: int = 2
+    timeline_inline_max_users: int = 32
+    timeline_chunk_users: int = 100
+    timeline_max_history_days: int = 730
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,12 +1,22 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from config.settings import settings
-from app.api.routes import patterns, consistency
+from app.api.responses import CompressionMiddleware
+from app.api.routes import patterns, consistency, cache, metrics, anomalies, forecasts, cohorts, stream, timeline, database
+from app.db.connection import engine
+from app.db.schema import ensure_schema
+from app.services.cache_prewarmer import cache_prewarmer, request_load
+from app.services.forecaster import forecast_scheduler
+from app.services.cohort_clustering import cohort_scheduler
+from app.services.change_feed import change_feed
+from app.services.timeline_backfill import timeline_scheduler
 
 app = FastAPI(
     title="Memory OS Analytics Service",
     description="Statistical analysis and pattern detection for Memory OS",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -18,6 +28,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip responses (the SSE stream is excluded so events aren't held back)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.response_gzip_min_bytes,
+    compresslevel=settings.response_gzip_level,
+    exclude_paths=("/stream/changes",),
+)
+
+# Track in-flight requests so background pre-warming stays off-peak
+@app.middleware("http")
+async def track_request_load(request: Request, call_next):
+    request_load.in_flight += 1
+    try:
+        return await call_next(request)
+    finally:
+        request_load.in_flight -= 1
+
+@app.on_event("startup")
+async def start_background_jobs():
+    ensure_schema(engine)
+    if settings.prewarm_enabled:
+        cache_prewarmer.start()
+    if settings.forecast_enabled:
+        forecast_scheduler.start()
+    if settings.cohort_enabled:
+        cohort_scheduler.start()
+    if settings.stream_enabled:
+        change_feed.start()
+    if settings.timeline_enabled:
+        timeline_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    await cache_prewarmer.stop()
+    await forecast_scheduler.stop()
+    await cohort_scheduler.stop()
+    await change_feed.stop()
+    await timeline_scheduler.stop()
+
 # Health check
 @app.get("/health")
 async def health_check():
@@ -30,6 +79,14 @@ async def health_check():
 # Register routers
 app.include_router(patterns.router, prefix="/api/v1", tags=["patterns"])
 app.include_router(consistency.router, prefix="/api/v1", tags=["consistency"])
+app.include_router(metrics.router, prefix="/api/v1", tags=["metrics"])
+app.include_router(anomalies.router, prefix="/api/v1", tags=["anomalies"])
+app.include_router(forecasts.router, prefix="/api/v1", tags=["forecasts"])
+app.include_router(cohorts.router, prefix="/api/v1", tags=["cohorts"])
+app.include_router(stream.router, prefix="/api/v1", tags=["stream"])
+app.include_router(timeline.router, prefix="/api/v1", tags=["timeline"])
+app.include_router(cache.router, prefix="/api/v1", tags=["cache"])
+app.include_router(database.router, prefix="/api/v1", tags=["database"])
 
 @app.get("/")
 async def root():
@@ -39,7 +96,15 @@ async def root():
         "endpoints": {
             "health": "/health",
             "patterns": "/api/v1/patterns/{user_id}",
-            "consistency": "/api/v1/consistency/{user_id}"
+            "consistency": "/api/v1/consistency/{user_id}",
+            "metric_aggregates": "/api/v1/metrics/{user_id}/aggregate",
+            "anomalies": "/api/v1/anomalies/{user_id}",
+            "forecasts": "/api/v1/forecasts/{user_id}",
+            "cohorts": "/api/v1/cohorts/{user_id}",
+            "change_stream": "/api/v1/stream/changes",
+            "timeline": "/api/v1/timeline/{user_id}",
+            "cache_stats": "/api/v1/cache/stats",
+            "db_stats": "/api/v1/db/stats"
         }
     }
 
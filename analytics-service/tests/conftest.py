@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Run from analytics-service/ (python -m pytest); make `app` and `config` importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
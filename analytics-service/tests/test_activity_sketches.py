@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.services import activity_sketches
+from app.services.activity_sketches import ActivitySketchStore
+from app.services.consistency_analyzer import ConsistencyAnalyzer
+
+TODAY = date(2025, 6, 18)  # a Wednesday: the window starts in a closed week
+
+
+class _Row:
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+
+class FakeDb:
+    """Serves a closed weekly sketch with one event at 07:00 on every day"""
+
+    def __init__(self, weeks):
+        self.weeks = weeks
+
+    def execute(self, query, params=None):
+        return [_Row(week) for week in self.weeks if week['week_start'] >= params['first_week']
+                and week['week_start'] < params['current_week']]
+
+
+def _week(week_start, days=7):
+    return {'week_start': week_start, 'category': 'fitness', 'item': 'steps',
+            'cells': {str(day * 25 + 7): 1 for day in range(days)},
+            'value_count': 0, 'value_sum': 0, 'value_min': None, 'value_max': None, 'value_sketch': None}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(activity_sketches, 'local_today', lambda tz: TODAY)
+    monkeypatch.setattr(activity_sketches.user_timezones, 'get', lambda db, user_id: 'UTC')
+    monkeypatch.setattr(ActivitySketchStore, '_build_missing_weeks', lambda self, *a: None)
+    current_week = TODAY - timedelta(days=TODAY.weekday())
+    # Open week: Monday through today, summarized live
+    monkeypatch.setattr(ActivitySketchStore, '_summarize',
+                        lambda self, *a, **k: [_week(current_week, days=TODAY.weekday() + 1)])
+    return FakeDb([_week(current_week - timedelta(days=7 * i)) for i in range(1, 3)])
+
+
+@pytest.mark.parametrize('days', [1, 7, 10])
+def test_window_covers_exactly_n_local_dates(db, days):
+    cells = ActivitySketchStore(db).load_cells('u', 'metric', days)
+    dates = sorted(cells['date'].dt.date.unique())
+    assert dates[0] == TODAY - timedelta(days=days - 1) and dates[-1] == TODAY
+    assert len(dates) == days
+
+
+def test_daily_activity_is_full_frequency(db):
+    result = ConsistencyAnalyzer(db).calculate_category_consistency('u', 'fitness', window_days=7)
+    assert result['active_days'] == result['total_days'] == 7
+    assert result['frequency_rate'] == 100.0
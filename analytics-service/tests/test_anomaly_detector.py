@@ -0,0 +1,139 @@
+import random
+import uuid
+
+import pandas as pd
+import pytest
+
+from app.services.anomaly_detector import MetricAnomalyDetector
+
+
+@pytest.fixture(scope='module')
+def metrics():
+    rng = random.Random(11)
+    rows, created = [], pd.Timestamp('2025-01-01', tz='UTC')
+    for series, (user_id, metric_type, level) in enumerate([('u1', 'sleep_hours', 7.5), ('u1', 'steps', 8000),
+                                                            ('u2', 'sleep_hours', 6.0)]):
+        for i in range(80):
+            value = rng.gauss(level, level * 0.08)
+            if i in (30, 55, 70):
+                value *= 1.8 if i != 55 else 0.3
+            created += pd.Timedelta(hours=rng.randint(1, 12))
+            rows.append({'metric_id': str(uuid.UUID(int=rng.getrandbits(128))), 'user_id': user_id,
+                         'category': 'health', 'metric_type': metric_type, 'value': value,
+                         'metric_date': created.date(), 'created_at': created})
+    return pd.DataFrame(rows).sort_values(['user_id', 'metric_type', 'created_at'], ignore_index=True)
+
+
+class StubDetector(MetricAnomalyDetector):
+    """Detector with its persistence kept in dicts"""
+
+    def __init__(self, metrics):
+        super().__init__(None)
+        self.db = self
+        self.saved_states, self.saved_anomalies = {}, []
+        self.stored = {r.metric_id: {'metric_id': r.metric_id, 'user_id': r.user_id, 'metric_type': r.metric_type,
+                                     'numeric_value': r.value, 'category': r.category,
+                                     'metric_date': r.metric_date, 'created_at': r.created_at.to_pydatetime()}
+                       for r in metrics.itertuples()}
+
+    def commit(self):
+        pass
+
+    def _stored_metrics(self, metric_ids):
+        return {m: dict(self.stored[m]) for m in metric_ids if m in self.stored}
+
+    def _load_state(self, user_id, metric_type):
+        state = self.saved_states.get((user_id, metric_type))
+        return dict(state) if state else None
+
+    def _save_state(self, user_id, metric_type, state):
+        self.saved_states[(user_id, metric_type)] = dict(state)
+
+    def _save_anomalies(self, anomalies):
+        self.saved_anomalies.extend(anomalies)
+
+
+def _events(frame):
+    return [{'user_id': r.user_id, 'metric_type': r.metric_type, 'numeric_value': r.value,
+             'metric_id': r.metric_id, 'category': r.category, 'metric_date': r.metric_date}
+            for r in frame.itertuples()]
+
+
+def test_replay_matches_streaming(metrics):
+    detector = MetricAnomalyDetector(None)
+    states, anomalies = detector._replay(metrics)
+
+    streamed_states, streamed = {}, []
+    for row in metrics.itertuples():
+        key = (row.user_id, row.metric_type)
+        anomaly = detector._score(streamed_states.get(key), row.value)
+        if anomaly:
+            streamed.append((row.metric_id, anomaly))
+        streamed_states[key] = detector._update(streamed_states.get(key), row.value)
+
+    assert streamed
+    fields = streamed[0][1].keys()
+    assert [(a['metric_id'], {k: a[k] for k in fields}) for a in anomalies] == streamed
+    for state in states:
+        expected = streamed_states[(state['user_id'], state['metric_type'])]
+        assert state['n'] == expected['n']
+        assert state['ewma_mean'] == pytest.approx(expected['ewma_mean'])
+        assert state['ewma_var'] == pytest.approx(expected['ewma_var'])
+        assert state['recent_values'] == pytest.approx(expected['recent_values'])
+
+
+def test_ingest_skips_metrics_already_folded_in(metrics):
+    once = StubDetector(metrics)
+    once.ingest(_events(metrics))
+
+    retried = StubDetector(metrics)
+    events = _events(metrics)
+    # Overlapping, shuffled and partly repeated batches
+    rng = random.Random(5)
+    for start in range(0, len(events), 50):
+        batch = events[max(start - 20, 0):start + 50]
+        rng.shuffle(batch)
+        retried.ingest(batch + batch[:5])
+    retried.ingest(events)
+
+    sizes = metrics.groupby(['user_id', 'metric_type']).size()
+    assert retried.saved_states.keys() == once.saved_states.keys()
+    for key, state in once.saved_states.items():
+        assert retried.saved_states[key]['n'] == state['n'] == sizes[key]
+        assert retried.saved_states[key]['ewma_mean'] == pytest.approx(state['ewma_mean'])
+    assert [a['metric_id'] for a in retried.saved_anomalies] == [a['metric_id'] for a in once.saved_anomalies]
+
+
+def test_ingest_matches_rebuild_state(metrics):
+    streamed = StubDetector(metrics)
+    streamed.ingest(_events(metrics.sample(frac=1, random_state=3)))
+    states, _ = MetricAnomalyDetector(None)._replay(metrics)
+    for state in states:
+        saved = streamed.saved_states[(state['user_id'], state['metric_type'])]
+        assert saved['ewma_mean'] == pytest.approx(state['ewma_mean'])
+        assert (saved['last_created_at'], saved['last_metric_id']) == (state['last_created_at'], state['last_metric_id'])
+
+
+def test_unknown_metric_ids_are_ignored(metrics):
+    detector = StubDetector(metrics)
+    event = dict(_events(metrics.head(1))[0], metric_id=str(uuid.uuid4()))
+    assert detector.ingest([event]) == [] and detector.saved_states == {}
+
+
+def test_stored_row_is_scored_not_the_request_body(metrics):
+    honest, tampered = StubDetector(metrics), StubDetector(metrics)
+    honest.ingest(_events(metrics))
+    # Inflated values (or none at all) for stored metrics change nothing
+    tampered.ingest([dict(e, numeric_value=None if i % 2 else e['numeric_value'] * 10)
+                     for i, e in enumerate(_events(metrics))])
+    assert tampered.saved_states == honest.saved_states
+    assert [a['metric_id'] for a in tampered.saved_anomalies] == [a['metric_id'] for a in honest.saved_anomalies]
+
+
+@pytest.mark.parametrize('field, value', [('user_id', 'u2'), ('metric_type', 'steps')])
+def test_metric_id_must_match_its_series(metrics, field, value):
+    detector = StubDetector(metrics)
+    event = _events(metrics[metrics['user_id'] == 'u1'].head(1).assign(metric_type='sleep_hours'))[0]
+    with pytest.raises(ValueError):
+        detector.ingest([dict(event, **{field: value})])
+    assert detector.saved_states == {}
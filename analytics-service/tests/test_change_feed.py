@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services.change_feed import PatternChangeTracker
+from config.settings import settings
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar(self):
+        return self.rows[0][0]
+
+
+class FakeDb:
+    """Answers the tracker's queries by SQL fragment; records what it dequeues"""
+
+    def __init__(self, changed_rows, lock_free=True, has_state=True):
+        self.changed_rows, self.lock_free, self.has_state = changed_rows, lock_free, has_state
+        self.changed_sql = None
+        self.dequeued = []
+        self.state_saved = False
+        self.unlocked = False
+
+    # Session side
+    def get_bind(self):
+        return self
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        pass
+
+    def execute(self, query, params=None):
+        sql = str(query)
+        if 'pg_try_advisory_lock' in sql:
+            return FakeResult([(self.lock_free,)])
+        if 'pg_advisory_unlock' in sql:
+            self.unlocked = True
+            return FakeResult([(True,)])
+        if 'FROM change_feed_state' in sql:
+            return FakeResult([(datetime(2025, 1, 1, tzinfo=timezone.utc),)] if self.has_state else [])
+        if 'INSERT INTO change_feed_state' in sql:
+            self.state_saved = True
+        if 'DELETE FROM change_feed_queue' in sql:
+            self.dequeued.append(dict(zip(params['user_ids'], params['versions'])))
+        if 'SELECT user_id::text, version FROM change_feed_queue' in sql:
+            self.changed_sql = sql
+            return FakeResult(self.changed_rows)
+        return FakeResult([])
+
+
+def _tracker(db):
+    tracker = PatternChangeTracker(db)
+    tracker.checked = []
+    tracker._check_user = lambda user_id, emit: tracker.checked.append(user_id) or False
+    return tracker
+
+
+def test_queued_users_are_checked_then_dequeued_by_version(monkeypatch):
+    monkeypatch.setattr(settings, 'stream_scan_chunk_users', 2)
+    db = FakeDb([('u1', 3), ('u2', 1), ('u3', None), ('u1', None)])
+    tracker = _tracker(db)
+    summary = tracker.scan()
+
+    assert tracker.checked == ['u1', 'u2', 'u3']
+    assert summary['users'] == 3 and not summary['baseline']
+    # Snapshot-decay users (no version) have nothing queued to drop
+    assert db.dequeued == [{'u1': 3, 'u2': 1}]
+    assert db.state_saved and db.unlocked
+
+
+def test_decay_entry_never_hides_a_queued_version():
+    db = FakeDb([('u1', None), ('u1', 7)])
+    _tracker(db).scan()
+    assert db.dequeued == [{'u1': 7}]
+
+
+def test_first_scan_is_baseline_over_recent_metrics():
+    db = FakeDb([('u1', None)], has_state=False)
+    summary = _tracker(db).scan()
+    assert summary['baseline']
+    assert 'FROM metrics' in db.changed_sql and 'pattern_snapshots' not in db.changed_sql
+
+
+def test_second_worker_skips_the_scan():
+    db = FakeDb([('u1', None)], lock_free=False)
+    tracker = _tracker(db)
+    assert 'skipped' in tracker.scan()
+    assert tracker.checked == [] and not db.unlocked
@@ -0,0 +1,116 @@
+import pickle
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import MiniBatchKMeans
+
+from app.services.cohort_clustering import FEATURES, CohortClusteringService
+from app.services.timeline_backfill import _engagement_series
+
+TODAY = date(2025, 6, 30)
+
+
+@pytest.fixture
+def service():
+    return CohortClusteringService(None)
+
+
+def _components(service, ages_and_events):
+    daily = pd.DataFrame([('u', age, events) for age, events in ages_and_events],
+                         columns=['user_id', 'age', 'events'])
+    return service._engagement_components(daily, pd.Index(['u'], name='user_id')).loc['u']
+
+
+def _scores(service, days_since_last, events_7d, events_30d, streak):
+    scorer = service.scorer
+    return {
+        'recency': scorer._score_recency(days_since_last),
+        'frequency': scorer._score_frequency(events_7d),
+        'streak': scorer._score_streak(streak),
+        'growth': scorer._score_growth(events_7d, events_30d),
+    }
+
+
+@pytest.mark.parametrize('age, in_7d, in_30d', [
+    (6, True, True), (7, False, True), (29, False, True), (30, False, False),
+])
+def test_window_boundaries(service, age, in_7d, in_30d):
+    # Ages 0..N-1 are the last N local days, today included
+    base = [(0, 1), (1, 1)]
+    components = _components(service, base + [(age, 10)])
+    expected = _scores(service, 0, 2 + 10 * in_7d, 2 + 10 * in_30d, 2)
+    assert components.to_dict() == expected
+
+
+def test_matches_timeline_replay(service):
+    rng = random.Random(3)
+    start = TODAY - timedelta(days=90)
+    metric_days = [[(start + timedelta(days=d)).isoformat(), rng.randint(1, 5)]
+                   for d in range(91) if rng.random() < 0.6 or d >= 86]
+    series = _engagement_series(metric_days, pd.date_range(start, TODAY, freq='D')).loc[pd.Timestamp(TODAY)]
+
+    components = _components(service, [((TODAY - date.fromisoformat(d)).days, n) for d, n in metric_days])
+    assert components.to_dict() == _scores(service, series['days_since_last'], series['events_7d'],
+                                           series['events_30d'], series['current_streak'])
+
+
+def test_user_without_metrics_scores_as_lapsed(service):
+    components = service._engagement_components(pd.DataFrame(columns=['user_id', 'age', 'events']),
+                                                pd.Index(['u'], name='user_id')).loc['u']
+    assert components.to_dict() == _scores(service, 999, 0, 0, 0)
+
+
+def test_single_user_run_without_model_is_a_no_op(service):
+    # db is None: anything past the model lookup would fail
+    service._load_model = lambda: None
+    summary = service.run(user_ids=['u'])
+    assert summary['skipped'] == 'no usable cohort model yet' and summary['assigned'] == 0
+
+
+class FakeDb:
+    def __init__(self):
+        self.commits = 0
+
+    def execute(self, *args, **kwargs):
+        return self
+
+    def scalar(self):
+        return None
+
+    def commit(self):
+        self.commits += 1
+
+
+def _stored_model():
+    model = MiniBatchKMeans(n_clusters=2, random_state=0, n_init=1)
+    model.fit(np.random.default_rng(0).random((10, len(FEATURES))))
+    return model
+
+
+def test_single_user_run_only_assigns(monkeypatch):
+    stored = _stored_model()
+    service = CohortClusteringService(FakeDb())
+    service._load_model = lambda: {'model': pickle.dumps(stored), 'n_samples': 10, 'watermark': None}
+    service.extract_features = lambda users: pd.DataFrame(0.5, index=users, columns=FEATURES)
+    assigned = []
+    service._assign = lambda model, features: assigned.append(model.cluster_centers_) or len(features)
+    service._refresh_cluster_sizes = lambda: None
+    service._save_model = service._save_clusters = pytest.fail
+    monkeypatch.setattr(MiniBatchKMeans, 'partial_fit', lambda *a, **k: pytest.fail('partial_fit'))
+
+    summary = service.run(user_ids=['u'])
+    assert summary['mode'] == 'assign' and summary['assigned'] == 1
+    assert np.array_equal(assigned[0], stored.cluster_centers_)
+
+
+def test_unreadable_model_counts_as_missing(service):
+    assert service._unpickle({'model': b'not a pickle'}) is None
+    narrow = MiniBatchKMeans(n_clusters=2, n_init=1).fit(np.zeros((4, 2)) + np.arange(4)[:, None])
+    assert service._unpickle({'model': pickle.dumps(narrow)}) is None
+    assert service._unpickle({'model': pickle.dumps(_stored_model())}) is not None
+
+    service._load_model = lambda: {'model': b'not a pickle', 'n_samples': 10, 'watermark': None}
+    assert service.run(user_ids=['u'])['skipped'] == 'no usable cohort model yet'
@@ -0,0 +1,62 @@
+from datetime import date
+
+import numpy as np
+import pytest
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+from app.services.forecaster import SEASON, _advance, _forecast, fit_series
+
+START = date(2025, 3, 5)  # a Wednesday: seasonals must follow weekdays, not positions
+
+
+def _series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    return 40 + 0.15 * t + 6 * np.sin(2 * np.pi * t / SEASON) + rng.normal(0, 1.5, n)
+
+
+def _statsmodels_fit(y, seasonal):
+    return ExponentialSmoothing(
+        y, trend='add', damped_trend=True,
+        seasonal='add' if seasonal else None, seasonal_periods=SEASON if seasonal else None,
+        initialization_method='estimated',
+    ).fit()
+
+
+@pytest.mark.filterwarnings('ignore')
+@pytest.mark.parametrize('n, seasonal', [(63, True), (18, False)])
+def test_stored_forecast_matches_statsmodels(n, seasonal):
+    y = _series(n)
+    fitted = fit_series({'key': {}, 'start': START.isoformat(), 'values': y.tolist()})
+    assert fitted['method'] == 'holt_winters_damped' + ('_seasonal' if seasonal else '')
+
+    reference = _statsmodels_fit(y, seasonal)
+    days = _forecast(fitted['params'], fitted['state'], fitted['sigma2'],
+                     date.fromisoformat(fitted['last_date']), 7)
+    assert [d['mean'] for d in days] == pytest.approx(reference.forecast(7), abs=0.01)
+
+
+@pytest.mark.filterwarnings('ignore')
+def test_recursion_reproduces_fitted_values():
+    y = _series(70, seed=1)
+    fitted = fit_series({'key': {}, 'start': START.isoformat(), 'values': y[:56].tolist()})
+
+    # Rolling the stored state forward equals statsmodels' one-step-ahead
+    # predictions with the same parameters over the new days
+    errors = _advance(fitted['params'], fitted['state'], y[56:], date(2025, 4, 30))
+    initial = _statsmodels_fit(y[:56], True).params
+    reference = ExponentialSmoothing(
+        y, trend='add', damped_trend=True, seasonal='add', seasonal_periods=SEASON,
+        initialization_method='known', initial_level=initial['initial_level'],
+        initial_trend=initial['initial_trend'], initial_seasonal=initial['initial_seasons'],
+    ).fit(smoothing_level=fitted['params']['smoothing_level'],
+          smoothing_trend=fitted['params']['smoothing_trend'],
+          smoothing_seasonal=fitted['params']['smoothing_seasonal'],
+          damping_trend=fitted['params']['damping_trend'], optimized=False)
+    assert y[56:] - np.asarray(errors) == pytest.approx(reference.fittedvalues[56:], abs=1e-6)
+
+
+def test_flat_series_falls_back_to_simple_smoothing():
+    fitted = fit_series({'key': {}, 'start': START.isoformat(), 'values': [2.0] * 20})
+    assert fitted['method'] == 'simple_exponential_smoothing'
+    assert fitted['state']['level'] == pytest.approx(2.0)
@@ -0,0 +1,112 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.metric_aggregator import MetricAggregationService
+
+
+@pytest.fixture
+def service():
+    return MetricAggregationService(None)
+
+
+def _buckets(rows):
+    """Rows of (bucket_start, count, sum, min, max), one series, n == count"""
+    df = pd.DataFrame(rows, columns=['bucket_start', 'count', 'sum', 'min', 'max'])
+    df['bucket_start'] = pd.to_datetime(df['bucket_start'])
+    df['n'] = df['count']
+    df['category'], df['metric_type'], df['unit'] = 'fitness', 'steps', ''
+    return df
+
+
+def _stub_fetch(service, df):
+    calls = []
+
+    def fetch(user_id, bucket, field, start, end, *filters):
+        calls.append((start, end))
+        return df
+    service._fetch_buckets = fetch
+    return calls
+
+
+@pytest.mark.parametrize('day, bucket, expected', [
+    ('2025-06-18 13:45', 'day', '2025-06-18'),
+    ('2025-06-18 13:45', 'week', '2025-06-16'),  # Wednesday -> Monday
+    ('2025-06-22', 'week', '2025-06-16'),        # Sunday stays in the same ISO week
+    ('2025-06-16', 'week', '2025-06-16'),
+    ('2025-06-18', 'month', '2025-06-01'),
+    ('2024-02-29', 'month', '2024-02-01'),
+])
+def test_bucket_start(day, bucket, expected):
+    assert MetricAggregationService._bucket_start(pd.Timestamp(day), bucket) == pd.Timestamp(expected)
+
+
+def test_fill_and_derive_zero_fills_gaps(service):
+    full_range = pd.date_range('2025-06-01', '2025-06-05', freq='D')
+    group = _buckets([('2025-06-01', 2, 10.0, 4.0, 6.0), ('2025-06-04', 1, 5.0, 5.0, 5.0)])
+    frame = service._fill_and_derive(group, full_range, rolling=None)
+
+    assert list(frame.index) == list(full_range)
+    assert frame['count'].tolist() == [2, 0, 0, 1, 0]
+    assert frame['sum'].tolist() == [10.0, 0, 0, 5.0, 0]
+    # Empty buckets have no mean/min/max rather than zeros
+    assert frame['mean'].iloc[0] == 5.0 and frame['mean'].iloc[1:3].isna().all()
+    assert frame['min'].iloc[1:3].isna().all() and frame['max'].iloc[3] == 5.0
+    assert frame['delta_sum'].tolist()[1:] == [-10.0, 0, 5.0, -5.0]
+    # Growth from an empty bucket has no percentage
+    assert frame['delta_pct'].iloc[1] == -100.0 and np.isnan(frame['delta_pct'].iloc[3])
+    assert 'rolling_sum' not in frame.columns
+
+
+def test_fill_and_derive_rolling_needs_a_full_window(service):
+    full_range = pd.date_range('2025-06-01', '2025-06-04', freq='D')
+    group = _buckets([('2025-06-01', 1, 2.0, 2.0, 2.0), ('2025-06-02', 1, 4.0, 4.0, 4.0),
+                      ('2025-06-04', 2, 9.0, 4.0, 5.0)])
+    frame = service._fill_and_derive(group, full_range, rolling=2)
+
+    assert frame['rolling_sum'].isna().tolist() == [True, False, False, False]
+    assert frame['rolling_sum'].tolist()[1:] == [6.0, 4.0, 9.0]
+    assert frame['rolling_mean'].tolist()[1:] == [3.0, 4.0, 4.5]
+
+
+def test_week_range_edges_and_first_bucket_delta(service):
+    # The bucket before the first visible one is fetched so its delta is real
+    calls = _stub_fetch(service, _buckets([
+        ('2025-05-26', 2, 8.0, 3.0, 5.0),
+        ('2025-06-02', 1, 6.0, 6.0, 6.0),
+        ('2025-06-16', 3, 12.0, 2.0, 6.0),
+    ]))
+    result = service.aggregate('u', bucket='week', periods=3, end_date=date(2025, 6, 19))
+
+    assert calls == [(date(2025, 5, 26), date(2025, 6, 23))]
+    assert (result['start'], result['end']) == ('2025-06-02', '2025-06-16')
+    buckets = result['series'][0]['buckets']
+    assert [b['bucket_start'] for b in buckets] == ['2025-06-02', '2025-06-09', '2025-06-16']
+    assert buckets[0]['delta_sum'] == -2.0 and buckets[0]['delta_pct'] == -25.0
+    assert buckets[1]['count'] == 0 and buckets[1]['mean'] is None
+    # Totals only cover the visible buckets
+    assert result['series'][0]['totals'] == {'count': 4, 'sum': 18.0}
+
+
+def test_month_range_edges_with_rolling(service):
+    calls = _stub_fetch(service, _buckets([
+        ('2024-11-01', 1, 1.0, 1.0, 1.0),
+        ('2024-12-01', 1, 2.0, 2.0, 2.0),
+        ('2025-01-01', 1, 3.0, 3.0, 3.0),
+        ('2025-03-01', 1, 4.0, 4.0, 4.0),
+    ]))
+    result = service.aggregate('u', bucket='month', periods=3, rolling=2, end_date=date(2025, 3, 31))
+
+    assert calls == [(date(2024, 11, 1), date(2025, 4, 1))]
+    buckets = result['series'][0]['buckets']
+    assert [b['bucket_start'] for b in buckets] == ['2025-01-01', '2025-02-01', '2025-03-01']
+    assert [b['rolling_sum'] for b in buckets] == [5.0, 3.0, 4.0]
+    assert buckets[0]['delta_sum'] == 1.0
+
+
+def test_no_rows_means_no_series(service):
+    _stub_fetch(service, pd.DataFrame())
+    result = service.aggregate('u', bucket='day', periods=7, end_date=date(2025, 6, 19))
+    assert result['series'] == [] and (result['start'], result['end']) == ('2025-06-13', '2025-06-19')
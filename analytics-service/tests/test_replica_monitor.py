@@ -0,0 +1,63 @@
+import threading
+import time
+
+from app.db import connection
+from app.db.connection import ReplicaMonitor
+
+
+class FakeReplica:
+    """Engine stand-in whose probe returns `row` after `delay` seconds"""
+
+    def __init__(self, row, delay=0.0):
+        self.row, self.delay = row, delay
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        time.sleep(self.delay)
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        return self
+
+    def mappings(self):
+        return self
+
+    def one(self):
+        return self.row
+
+
+def _row(receiver_running=True, receiver_status='streaming', lag=1.0):
+    return {'in_recovery': True, 'receiver_running': receiver_running,
+            'receiver_status': receiver_status, 'lag': lag}
+
+
+def test_stopped_receiver_is_unhealthy_despite_zero_lag():
+    monitor = ReplicaMonitor(FakeReplica(_row(receiver_running=False, receiver_status=None, lag=0)))
+    assert monitor.read_engine() is connection.primary_scan_engine
+    assert monitor.stats()['receiver_status'] == 'stopped'
+
+
+def test_hidden_receiver_status_counts_as_running():
+    monitor = ReplicaMonitor(FakeReplica(_row(receiver_status=None)))
+    assert monitor.read_engine() is monitor.replica
+
+
+def test_probe_does_not_block_other_readers():
+    monitor = ReplicaMonitor(FakeReplica(_row(), delay=0.5))
+    first = []
+    prober = threading.Thread(target=lambda: first.append(monitor.read_engine()))
+    prober.start()
+    time.sleep(0.1)
+
+    started = time.time()
+    assert monitor.read_engine() is connection.primary_scan_engine  # last published state
+    assert time.time() - started < 0.1
+
+    prober.join()
+    assert first == [monitor.replica]
+    assert monitor.read_engine() is monitor.replica
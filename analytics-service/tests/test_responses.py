@@ -0,0 +1,77 @@
+import msgpack
+import numpy as np
+import orjson
+import pytest
+from starlette.requests import Request
+
+from app.api.responses import MsgPackResponse, negotiate, wants_msgpack
+from benchmarks.serialization import pattern_set
+
+
+def _request(accept='application/json'):
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'',
+                    'headers': [(b'accept', accept.encode())]})
+
+
+@pytest.fixture
+def content():
+    patterns = pattern_set(np.random.default_rng(0))
+    # numpy scalars the analyzers can leak besides float64
+    patterns['frequency_patterns'][0]['evidence']['sample_size'] = np.int64(12)
+    patterns['time_patterns'][0]['peak_hour'] = np.int32(6)
+    patterns['time_patterns'][0]['is_weekend'] = np.bool_(True)
+    return {'success': True, 'data': patterns}
+
+
+def _plain(value):
+    """Expected decoded form: numpy scalars as Python values"""
+    return orjson.loads(orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY))
+
+
+def test_default_json_rows_pass_through(content):
+    assert negotiate(_request(), content) is content
+
+
+def test_msgpack_rows_round_trip(content):
+    response = negotiate(_request('application/msgpack'), content)
+    assert isinstance(response, MsgPackResponse)
+    assert response.media_type == 'application/msgpack'
+    assert msgpack.unpackb(response.body, raw=False) == _plain(content)
+
+
+@pytest.mark.parametrize('accept', ['application/json', 'application/x-msgpack'])
+def test_columnar_round_trips(content, accept):
+    response = negotiate(_request(accept), content, layout='columnar')
+    decoded = (msgpack.unpackb(response.body, raw=False) if 'msgpack' in accept
+               else orjson.loads(response.body))
+
+    assert decoded['layout'] == 'columnar'
+    times = decoded['data']['time_patterns']
+    assert times['peak_hour'][0] == 6 and times['is_weekend'] == [True] + [None] * (len(times['activity']) - 1)
+    assert decoded['data']['frequency_patterns']['evidence.sample_size'][0] == 12
+
+    # Columns rebuild the original rows
+    for kind, rows in _plain(content['data']).items():
+        columns = decoded['data'][kind]
+        for index, row in enumerate(rows):
+            for key, value in row.items():
+                if isinstance(value, dict):
+                    for field, nested in value.items():
+                        assert columns[f'{key}.{field}'][index] == nested
+                else:
+                    assert columns[key][index] == value
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('application/msgpack', True),
+    ('application/vnd.msgpack, */*;q=0.8', True),
+    ('application/json;q=0.5, application/x-msgpack', True),
+    ('Application/MsgPack; charset=binary', True),
+    ('application/msgpack;q=0', False),
+    ('application/x-msgpack-foo', False),
+    ('application/json, application/msgpack;q=0.5', False),
+    ('*/*', False),
+    ('', False),
+])
+def test_accept_header_negotiation(accept, expected):
+    assert wants_msgpack(_request(accept)) is expected
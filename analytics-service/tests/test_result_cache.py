@@ -0,0 +1,36 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.result_cache import ResultCache
+
+
+def test_activity_kinds_use_their_own_ttl():
+    cache = ResultCache(ttl_seconds=3600, max_entries=10, kind_ttls={'engagement': 0.05})
+    cache.set(cache.make_key('engagement', 'u'), {'score': 1})
+    cache.set(cache.make_key('patterns', 'u'), [1])
+    time.sleep(0.1)
+    assert cache.get(cache.make_key('engagement', 'u')) is None
+    assert cache.get(cache.make_key('patterns', 'u')) == [1]
+
+
+def test_invalidate_drops_only_that_user():
+    cache = ResultCache(ttl_seconds=3600, max_entries=10)
+    cache.set(cache.make_key('patterns', 'u1'), 1)
+    cache.set(cache.make_key('engagement', 'u1'), 2)
+    cache.set(cache.make_key('patterns', 'u2'), 3)
+    assert cache.invalidate('u1') == 2
+    assert cache.get(cache.make_key('patterns', 'u2')) == 3
+
+
+@pytest.mark.parametrize('path', ['/api/v1/cache/stats', '/api/v1/db/stats'])
+def test_stats_need_service_token_outside_development(monkeypatch, path):
+    from main import app
+    from config.settings import settings
+
+    monkeypatch.setenv('ENVIRONMENT', 'production')
+    monkeypatch.setattr(settings, 'service_token', 'secret')
+    client = TestClient(app)
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={'X-Service-Token': 'secret'}).status_code == 200
@@ -0,0 +1,46 @@
+import logging
+
+from app.db import schema
+
+
+class FakeEngine:
+    """Each begin() is one transaction; DDL containing `fail_on` raises"""
+
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+        self.committed, self.rolled_back = [], []
+        self._statements = None
+
+    def begin(self):
+        self._statements = []
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        (self.rolled_back if exc_type else self.committed).append(self._statements)
+        return False
+
+    def execute(self, query, params):
+        return self
+
+    def scalar(self):
+        return True
+
+    def exec_driver_sql(self, sql):
+        if self.fail_on in sql:
+            raise RuntimeError('boom')
+        self._statements.append(sql)
+
+
+def test_failing_migration_does_not_roll_back_the_others(monkeypatch, caplog):
+    monkeypatch.setattr(schema, 'MIGRATIONS', [('a', 'CREATE a', None), ('b', 'CREATE b', None),
+                                               ('c', 'CREATE c', None)])
+    engine = FakeEngine(fail_on='CREATE b')
+    with caplog.at_level(logging.ERROR, logger=schema.__name__):
+        schema.ensure_schema(engine)
+
+    assert [s[-1] for s in engine.committed] == ['CREATE a', 'CREATE c']
+    assert len(engine.rolled_back) == 1
+    assert 'migration for b failed' in caplog.text and 'RuntimeError: boom' in caplog.text
@@ -0,0 +1,108 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.sequence_detector import SequencePatternDetector, mine_chains
+
+
+@pytest.fixture(scope='module')
+def events():
+    rng = random.Random(7)
+    routine = ['run', 'stretch', 'breakfast', 'shower']
+    rows, ts = [], 1_700_000_000.0
+    for _ in range(60):
+        ts += rng.uniform(4, 30) * 3600
+        t = ts
+        for activity in routine if rng.random() < 0.6 else rng.sample(routine + ['read', 'coffee'], 3):
+            rows.append((t, activity))
+            t += rng.uniform(5, 80) * 60
+    frame = pd.DataFrame(rows, columns=['ts', 'activity']).sort_values('ts', ignore_index=True)
+    # Postgres keeps microseconds; two memories share a timestamp
+    frame['created_at'] = pd.to_datetime(frame['ts'], unit='s', utc=True).dt.floor('us')
+    frame.loc[41, 'created_at'] = frame.loc[40, 'created_at']
+    frame['id'] = [f'{i:08d}' for i in range(len(frame))]
+    frame['category'] = 'health'
+    return frame
+
+
+def _detector(events, max_length=4, min_support=3):
+    detector = SequencePatternDetector(None)
+    detector.max_length, detector.min_support = max_length, min_support
+    detector.visible = len(events)
+    detector.full_builds = 0
+
+    def fetch(user_id, after=None, after_id=None):
+        seen = events.iloc[:detector.visible]
+        if after is None:
+            return seen
+        after = pd.Timestamp(after)
+        newer = (seen['created_at'] > after) | ((seen['created_at'] == after) & (seen['id'] > after_id))
+        return seen[newer].reset_index(drop=True)
+
+    full_build = detector._full_build
+
+    def counted_full_build(user_id):
+        detector.full_builds += 1
+        return full_build(user_id)
+
+    detector._fetch_events = fetch
+    detector._full_build = counted_full_build
+    return detector
+
+
+def test_incremental_matches_full_build(events):
+    incremental = _detector(events)
+    incremental.visible = 40
+    state = incremental._full_build('u')
+    for visible in range(47, len(events) + 1, 7):
+        incremental.visible = visible
+        state = incremental._incremental_update('u', state)
+    incremental.visible = len(events)
+    state = incremental._incremental_update('u', state)
+
+    full = _detector(events)._full_build('u')
+    assert state['activity_counts'] == full['activity_counts']
+    assert state['chains'].keys() == full['chains'].keys()
+    for chain, (support, span_sum) in full['chains'].items():
+        assert state['chains'][chain][0] == support
+        assert state['chains'][chain][1] == pytest.approx(span_sum)
+    # Most steps must have stayed incremental for this to mean anything
+    assert incremental.full_builds < len(range(47, len(events) + 1, 7)) // 2
+    assert any(len(chain) == 4 for chain in full['chains'])
+
+
+def test_long_chains_only_extend_frequent_prefixes(events):
+    codes, _ = pd.factorize(events['activity'])
+    times = events['ts'].to_numpy()
+    pruned = mine_chains(times, codes, 90 * 60, 3, min_prefix_support=5)
+    unpruned = mine_chains(times, codes, 90 * 60, 3)
+
+    pair_support = unpruned[unpruned['c2'].isna()].groupby(['c0', 'c1']).size()
+    triples = pruned.dropna(subset=['c2'])
+    assert (pair_support.loc[list(zip(triples['c0'], triples['c1']))] >= 5).all()
+    assert len(triples) < len(unpruned.dropna(subset=['c2']))
+
+
+def test_memory_sharing_the_watermark_timestamp_is_counted(events):
+    detector = _detector(events)
+    detector.visible = 41
+    state = detector._full_build('u')
+    assert events.loc[41, 'created_at'] == state['watermark']
+
+    detector.visible = 42
+    state = detector._incremental_update('u', state)
+    assert state['activity_counts'] == _detector(events.iloc[:42])._full_build('u')['activity_counts']
+    assert state['watermark_id'] == events.loc[41, 'id']
+
+
+def test_read_without_new_memories_writes_nothing(events):
+    detector = _detector(events)
+    state = detector._full_build('u')
+    detector._load_state = lambda user_id: state
+    saves = []
+    detector._save_state = lambda user_id, saved: saves.append(saved)
+
+    assert detector.detect_sequence_patterns('u')
+    assert saves == []
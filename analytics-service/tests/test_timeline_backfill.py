@@ -0,0 +1,109 @@
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from app.services.consistency_analyzer import ConsistencyAnalyzer
+from app.services import timeline_backfill
+from app.services.timeline_backfill import (RESUME_LOOKBACK_DAYS, TimelineBackfillService,
+                                             _engagement_series, replay_user)
+from config.settings import settings
+
+START = date(2025, 1, 1)
+END = date(2025, 6, 30)
+
+
+@pytest.fixture(scope='module')
+def history():
+    rng = random.Random(1)
+    metric_days, memory_rows = [], []
+    day = START
+    while day <= END:
+        # Long idle stretch in March so days_since_last has to carry over a resume
+        idle = date(2025, 3, 1) <= day <= date(2025, 4, 20)
+        if not idle and rng.random() < 0.7:
+            metric_days.append([day.isoformat(), rng.randint(1, 4)])
+            for activity, category, hour in (('run', 'fitness', 7), ('read', 'learning', 21)):
+                if rng.random() < 0.7:
+                    memory_rows.append([activity, category, day.isoformat(),
+                                        hour + rng.choice([0, 0, 1]), rng.randint(1, 2)])
+        day += timedelta(days=1)
+    return metric_days, memory_rows
+
+
+def _payload(history, **overrides):
+    metric_days, memory_rows = history
+    payload = {
+        'user_id': 'u', 'timezone': 'UTC', 'end': END.isoformat(), 'resume_after': None,
+        'history_from': None, 'last_active': None,
+        'metric_days': metric_days, 'memory_rows': memory_rows,
+    }
+    payload.update(overrides)
+    return payload
+
+
+def test_engagement_series_matches_consistency_analyzer(history):
+    metric_days, _ = history
+    analyzer = ConsistencyAnalyzer(None)
+    counts = {date.fromisoformat(d): c for d, c in metric_days}
+    days = pd.date_range(START, END, freq='D')
+    series = _engagement_series(metric_days, days)
+
+    for today in (date(2025, 2, 10), date(2025, 3, 2), date(2025, 4, 10), END):
+        logged = sorted((d for d in counts if d <= today), reverse=True)[:90]
+        expected = {
+            'days_since_last': (today - logged[0]).days,
+            # _get_event_count: local days [today - (n - 1), today]
+            'events_7d': sum(c for d, c in counts.items() if today - timedelta(days=6) <= d <= today),
+            'events_30d': sum(c for d, c in counts.items() if today - timedelta(days=29) <= d <= today),
+            'current_streak': analyzer._streak_from_dates(pd.Series(logged), today),
+        }
+        assert series.loc[pd.Timestamp(today)].to_dict() == expected
+
+
+def test_bounded_resume_matches_full_replay(history):
+    full = replay_user(_payload(history))
+    by_date = {row['snapshot_date']: row for row in full['rows']}
+
+    # Checkpoints inside and right after the idle stretch
+    for checkpoint in (date(2025, 4, 1), date(2025, 5, 15)):
+        lower = checkpoint - timedelta(days=RESUME_LOOKBACK_DAYS)
+        metric_days, memory_rows = history
+        since_last = by_date[checkpoint.isoformat()]['days_since_last']
+        resumed = replay_user(_payload(
+            (
+                [m for m in metric_days if date.fromisoformat(m[0]) >= lower],
+                [m for m in memory_rows if date.fromisoformat(m[2]) >= lower],
+            ),
+            resume_after=checkpoint.isoformat(),
+            history_from=lower.isoformat(),
+            last_active=(checkpoint - timedelta(days=since_last)).isoformat(),
+        ))
+        expected = [row for row in full['rows'] if row['snapshot_date'] > checkpoint.isoformat()]
+        assert resumed['rows'] == expected
+        assert resumed['last_date'] == END.isoformat()
+
+
+def test_user_without_history_emits_nothing():
+    result = replay_user({'user_id': 'u', 'timezone': 'UTC', 'end': END.isoformat(),
+                          'resume_after': None, 'metric_days': [], 'memory_rows': []})
+    assert result['rows'] == [] and result['last_date'] is None
+
+
+class _Db:
+    def commit(self):
+        pass
+
+
+def test_small_batches_replay_inline(history, monkeypatch):
+    monkeypatch.setattr(timeline_backfill.user_timezones, 'get_many', lambda db, users: {u: 'UTC' for u in users})
+    monkeypatch.setattr(timeline_backfill, 'ProcessPoolExecutor', lambda *a, **k: pytest.fail('pool started'))
+    service = TimelineBackfillService(_Db())
+    service._load_checkpoints = lambda zones: {}
+    service._load_history = lambda users, ends, checkpoints, zones: [_payload(history, user_id=u) for u in users]
+    saved = []
+    service._save = saved.append
+
+    summary = service.run([f'u{i}' for i in range(settings.timeline_inline_max_users)])
+    assert summary['replayed'] == len(saved) == settings.timeline_inline_max_users
@@ -0,0 +1,97 @@
+from datetime import date, datetime, timezone
+
+import pandas as pd
+import pytest
+
+from app.services import user_time
+from app.services.consistency_analyzer import ConsistencyAnalyzer
+from app.services.user_time import UserTimezones, local_today, valid_timezone
+from config.settings import settings
+
+
+class FakeDb:
+    """users table stand-in; records the ids each query asked for"""
+
+    def __init__(self, zones):
+        self.zones = zones
+        self.queries = []
+        self.read_bind = self
+
+    def execute(self, query, params):
+        self.queries.append(list(params['user_ids']))
+        return self
+
+    def fetchall(self):
+        return [(u, self.zones[u]) for u in self.queries[-1] if u in self.zones]
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    """Pin the clock used by local_today to a given UTC instant"""
+    def freeze(instant):
+        class FrozenDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return instant.astimezone(tz)
+        monkeypatch.setattr(user_time, 'datetime', FrozenDatetime)
+    return freeze
+
+
+@pytest.mark.parametrize('name', ['Bad/Zone', '', None, '../../etc/passwd'])
+def test_invalid_timezone_falls_back_to_default(name):
+    assert valid_timezone(name) == settings.default_timezone
+
+
+def test_valid_timezone_is_kept():
+    assert valid_timezone('America/Los_Angeles') == 'America/Los_Angeles'
+
+
+def test_get_many_batches_misses_and_caches_them():
+    db = FakeDb({'a': 'Asia/Tokyo', 'b': 'Nope/Nowhere'})
+    zones = UserTimezones(ttl_seconds=60)
+
+    default = settings.default_timezone
+    assert zones.get_many(db, ['a', 'b', 'c']) == {'a': 'Asia/Tokyo', 'b': default, 'c': default}
+    assert db.queries == [['a', 'b', 'c']]
+
+    # Cached users (unknown ones included) are not re-queried; only new ones are
+    assert zones.get_many(db, ['a', 'c', 'd']) == {'a': 'Asia/Tokyo', 'c': default, 'd': default}
+    assert db.queries == [['a', 'b', 'c'], ['d']]
+    assert zones.stats() == {'entries': 4, 'hits': 2, 'misses': 4}
+
+    zones.invalidate('a')
+    zones.get(db, 'a')
+    assert db.queries[-1] == ['a']
+
+
+def test_expired_entries_are_reloaded():
+    db = FakeDb({'a': 'Asia/Tokyo'})
+    zones = UserTimezones(ttl_seconds=0)
+    zones.get(db, 'a')
+    zones.get(db, 'a')
+    assert db.queries == [['a'], ['a']]
+
+
+def test_local_today_differs_from_utc_date(frozen_now):
+    frozen_now(datetime(2025, 1, 16, 7, 30, tzinfo=timezone.utc))
+    assert local_today('UTC') == date(2025, 1, 16)
+    assert local_today('America/Los_Angeles') == date(2025, 1, 15)
+
+
+def test_late_evening_streak_counts_on_the_local_day(frozen_now, monkeypatch):
+    # 23:00 in Los Angeles (UTC-8) is 07:00 the next day in UTC
+    tz = 'America/Los_Angeles'
+    logged = pd.Series(pd.to_datetime(['2025-01-13 07:00', '2025-01-14 07:00', '2025-01-15 07:00'], utc=True))
+    local_dates = sorted(set(logged.dt.tz_convert(tz).dt.date), reverse=True)
+    assert local_dates == [date(2025, 1, 14), date(2025, 1, 13), date(2025, 1, 12)]
+
+    # 23:30 local on the 15th: the last log was yesterday, locally
+    frozen_now(datetime(2025, 1, 16, 7, 30, tzinfo=timezone.utc))
+    db = FakeDb({'u': tz})
+    analyzer = ConsistencyAnalyzer(db)
+    monkeypatch.setattr('app.services.consistency_analyzer.user_timezones', UserTimezones(60))
+    monkeypatch.setattr(pd, 'read_sql', lambda query, bind, params: pd.DataFrame({'metric_date': local_dates}))
+
+    assert analyzer._get_current_streak('u') == 3
+    # Against the UTC date the same history looks broken
+    assert analyzer._streak_from_dates(pd.Series(local_dates), date(2025, 1, 16)) == 0
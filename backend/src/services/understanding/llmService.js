@@ -22,20 +22,33 @@ class LLMService {
     async evaluateNovelty(newPattern, historyContext, timezone = 'UTC') {
         const timeService = (await import('../time/timeService.js')).default;
 
+        // Analytics buckets hours in the user's timezone and names it in
+        // evidence.timezone; patterns without it are UTC and converted here
+        const isLocal = Boolean(newPattern.evidence?.timezone);
+
         // Helper: Pre-calculate local time if pattern has time data
         let timeContext = "";
         if (newPattern.evidence?.peak_hour) {
             // Construct a dummy date at peak_hour UTC today
             const now = new Date();
             now.setUTCHours(newPattern.evidence.peak_hour, 0, 0, 0);
-            const localTime = await timeService.formatTimeForUser(timezone, now, 'h:mm a');
-            console.log(`   🕒 Time Logic: Peak ${newPattern.evidence.peak_hour} UTC -> ${localTime} (${timezone})`);
-            timeContext = `(HINT: The pattern peak hour ${newPattern.evidence.peak_hour}:00 UTC corresponds to **${localTime}** in the user's timezone. Use this!)`;
+            const localTime = await timeService.formatTimeForUser(isLocal ? 'UTC' : timezone, now, 'h:mm a');
+            if (isLocal) {
+                console.log(`   🕒 Time Logic: Peak ${localTime} local (${newPattern.evidence.timezone})`);
+                timeContext = `(HINT: The pattern peak hour is **${localTime}** in the user's timezone. Use this!)`;
+            } else {
+                console.log(`   🕒 Time Logic: Peak ${newPattern.evidence.peak_hour} UTC -> ${localTime} (${timezone})`);
+                timeContext = `(HINT: The pattern peak hour ${newPattern.evidence.peak_hour}:00 UTC corresponds to **${localTime}** in the user's timezone. Use this!)`;
+            }
         }
 
-        const prompt = `
-You are a "Novelty Engine" for a personal AI. 
-
+        const timeInstructions = isLocal ? `
+CRITICAL INSTRUCTION: LOCAL TIME
+- The user is in: **${timezone}**.
+- The data below is already in the user's local time.
+${timeContext}
+- Do NOT convert any times.
+- NEVER say "UTC" in the final insight.` : `
 CRITICAL INSTRUCTION: TIMEZONE CONVERSION
 - The user is in: **${timezone}**.
 - The data below is in **UTC**.
@@ -43,19 +56,23 @@ ${timeContext}
 - You MUST convert all times from UTC to **${timezone}** in your response.
 - You MUST convert all times from UTC to **${timezone}** in your response.
 - Example: If data says "08:00 UTC" and user is "America/New_York" (UTC-5), you must say "3:00 AM".
-- NEVER say "UTC" in the final insight.
+- NEVER say "UTC" in the final insight.`;
+
+        const prompt = `
+You are a "Novelty Engine" for a personal AI. 
+${timeInstructions}
 
 CONTEXT (Recent History):
 ${historyContext || "No recent history."}
 
-NEW PATTERN DETECTED (Data is UTC):
+NEW PATTERN DETECTED (Data is ${isLocal ? 'local time' : 'UTC'}):
 - Description: ${newPattern.description}
 - Stats: ${JSON.stringify(newPattern.evidence || {})}
 
 TASK:
 1. Is this Novel?
 2. If YES, write a friendly insight.
-   - **Check**: Did you convert the time to ${timezone}? if not, fix it.
+   - **Check**: ${isLocal ? 'Did you keep the local time as given?' : `Did you convert the time to ${timezone}? if not, fix it.`}
 3. If NOT NOVEL: Return null.
 
 OUTPUT JSON ONLY: